@@ -1,22 +1,52 @@
-from typing import List
-from device import load_json, save_json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+from device import load_json, save_json, current_timestamp
+from device_network import DeviceNetwork
+from device_registry import DeviceRegistry
+import device_events as events
 from bulb import Bulb  #Importing bulbs from bulb.py
+from metrics import timed
 
+# Upper bound of threads used by fan_out().
+MAX_WORKERS = 8
 
-class BulbNetwork:
-    def __init__(self):
-        self.bulbs: List[Bulb] = []
+# Per-bulb outcomes reported by set_power().
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+NOT_FOUND = "not_found"
 
+# Fields shown by display_all_statuses(), read with a single get_many() call per bulb.
+STATUS_FIELDS = [
+    'name', 'brand', 'model',
+    'status.power', 'status.brightness', 'status.color_temp', 'status.rgb',
+]
+
+
+class BulbNetwork(DeviceNetwork):
+    """
+    `DeviceNetwork` of bulbs, with bulk power control.
+    """
+
+    def __init__(self, registry: DeviceRegistry | None = None):
+        super().__init__(registry, device_types=('bulb',))
+
+    @property
+    def bulbs(self) -> List[Bulb]:
+        return self.devices()
+
+    @bulbs.setter
+    def bulbs(self, bulbs: List[Bulb]) -> None:
+        self.clear()
+        for bulb in bulbs:
+            self.add(bulb)
+
+    @timed("device_operation_seconds")
     def load_bulbs(self) -> None:
         """
-        Load all bulb devices from the JSON data and initialize Bulbs.
+        Load all bulb devices from the registry and initialize Bulbs.
         """
-        json_data = load_json()
-        for device in json_data.get('devices', []):
-            if device.get("type") == "light":  #Only devices with "light" are loaded
-                bulb = Bulb(device['device_id'], "Bulb")
-                self.bulbs.append(bulb)
-        print(f"{len(self.bulbs)} bulbs loaded into the network.")
+        self.load()
+        print(f"{len(self)} bulbs loaded into the network.")
 
     def find_bulb_by_id(self, device_id: str) -> Bulb:
         """
@@ -25,37 +55,99 @@ class BulbNetwork:
         device_id: The ID of the bulb to find.
         return: Bulb if found, else None.
         """
-        for bulb in self.bulbs:
-            if bulb.device_id == device_id:
-                return bulb
-        print(f"Bulb with ID {device_id} not found.")
-        return None
+        bulb = self.get(device_id)
+        if bulb is None:
+            print(f"Bulb with ID {device_id} not found.")
+        return bulb
+
+    def turn_all_on_off(self, state: str) -> dict[str, str]:
+        """
+        Turns all bulbs in the network on or off in a single commit.
+
+        state: Desired state, "ON" or "OFF".
+        return: The outcome for every bulb, see set_power().
+        """
+        return self.set_power(state)
+
+    def select(self, location: str | None = None, power: str | None = None) -> List[Bulb]:
+        """
+        Returns the bulbs in the given location and/or current power state ("on"/"off", any case).
+        """
+        return self.find(location=location, power=power)
 
-    def turn_all_on_off(self, state: str) -> None:
+    @timed("device_operation_seconds")
+    def set_power(self, state: str, location: str | None = None, power: str | None = None) -> dict[str, str]:
         """
-        Turns all bulbs in the network on or off.
+        Sets the power of the matching bulbs in memory and commits all changes at once.
+
+        Bulbs already in the requested state are left untouched. Every changed bulb gets
+        the same 'last_updated' timestamp. If the commit fails, no bulb is changed.
 
         state: Desired state, "ON" or "OFF".
+        location: Only bulbs in this location, e.g. "Kitchen".
+        power: Only bulbs currently in this power state, e.g. "on".
+        return: CHANGED, UNCHANGED or NOT_FOUND for every targeted bulb, keyed by device_id.
         """
         if state.upper() not in ["ON", "OFF"]:
             raise ValueError("State must be 'ON' or 'OFF'")
 
-        for bulb in self.bulbs:
-            bulb.turn_on_off(state)
+        registry = self.registry
+        timestamp = current_timestamp()
+        results = {}
+        changed = []
+        with registry.batch():
+            for bulb in self.select(location, power):
+                device = registry.get(bulb.device_id)
+                if device is None:
+                    results[bulb.device_id] = NOT_FOUND
+                    continue
+                if str(device.get_path('status.power', '')).upper() == state.upper():
+                    results[bulb.device_id] = UNCHANGED
+                    continue
+                registry.update(bulb.device_id, {'status.power': state, 'last_updated': timestamp})
+                bulb.invalidate_snapshot()
+                results[bulb.device_id] = CHANGED
+                changed.append(bulb)
+
+        for bulb in changed:
+            bulb.emit(events.PowerChanged(bulb.device_id, state))
+        return results
+
+    @timed("device_operation_seconds")
+    def fan_out(self, action: Callable[[Bulb], object], bulbs: List[Bulb] | None = None,
+                max_workers: int = MAX_WORKERS) -> dict[str, object]:
+        """
+        Calls `action(bulb)` for every bulb on a pool of at most `max_workers` threads.
 
+        Meant for per-bulb work that waits on I/O, such as talking to the physical devices;
+        changes to the registry are cheaper through set_power().
+
+        bulbs: Bulbs to run the action for, e.g. from select(); all bulbs by default.
+        return: The result of every call keyed by device_id, or the exception it raised.
+        """
+        bulbs = self.bulbs if bulbs is None else bulbs
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {bulb.device_id: executor.submit(action, bulb) for bulb in bulbs}
+        return {
+            device_id: future.exception() or future.result()
+            for device_id, future in futures.items()
+        }
+
+    @timed("device_operation_seconds")
     def display_all_statuses(self) -> None:
         """
         Displays the status of each bulb in the network.
         """
         for bulb in self.bulbs:
+            info = bulb.get_many(STATUS_FIELDS)
             print(f"Bulb ID: {bulb.device_id}")
-            print(f"  Name: {bulb.get_name()}")
-            print(f"  Brand: {bulb.get_brand()}")
-            print(f"  Model: {bulb.get_model()}")
-            print(f"  Power: {bulb.get_power()}")
-            print(f"  Brightness: {bulb.get_brightness()}")
-            print(f"  Color Temperature: {bulb.get_color_temp()}")
-            print(f"  RGB: {bulb.get_rgb()}")
+            print(f"  Name: {info['name']}")
+            print(f"  Brand: {info['brand']}")
+            print(f"  Model: {info['model']}")
+            print(f"  Power: {info['status.power']}")
+            print(f"  Brightness: {info['status.brightness']}")
+            print(f"  Color Temperature: {info['status.color_temp']}")
+            print(f"  RGB: {info['status.rgb']}")
             print()  #Separator 
 
 
@@ -1,75 +1,76 @@
 from device import NotCompatibleDevice, Device, load_json, save_json
+from device_registry import DeviceRegistry
 
 
 class LawnMower(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
     def get_name(self) -> str | None:
         """
         Get the name of the lawn mower.
         """
-        return self.load_device_info().get('name', None)
+        return self.get_field('name')
 
     def get_brand(self) -> str | None:
         """
         Get the brand of the lawn mower.
         """
-        return self.load_device_info().get('brand', None)
+        return self.get_field('brand')
 
     def get_model(self) -> str | None:
         """
         Get the model of the lawn mower.
         """
-        return self.load_device_info().get('model', None)
+        return self.get_field('model')
 
     def get_power(self) -> str | None:
         """
         Get the current power status of the lawn mower (on or off).
         """
-        return self.load_device_info().get('status', {}).get('power', None)
+        return self.get_field('status.power')
 
     def get_battery_percent(self) -> int | None:
         """
         Get the battery percentage of the lawn mower.
         """
-        return self.load_device_info().get('status', {}).get('battery_percent', None)
+        return self.get_field('status.battery_percent')
 
     def get_cutting_mode(self) -> str | None:
         """
         Get the cutting mode of the lawn mower (e.g., auto or manual).
         """
-        return self.load_device_info().get('status', {}).get('cutting_mode', None)
+        return self.get_field('status.cutting_mode')
 
     def get_cutting_height(self) -> int | None:
         """
         Get the cutting height of the lawn mower in millimeters.
         """
-        return self.load_device_info().get('status', {}).get('cutting_height_mm', None)
+        return self.get_field('status.cutting_height_mm')
 
     def get_current_area(self) -> float | None:
         """
         Get the current area being mowed in square meters.
         """
-        return self.load_device_info().get('status', {}).get('current_area_m2', None)
+        return self.get_field('status.current_area_m2')
 
     def get_total_cutting_time(self) -> int | None:
         """
         Get the total cutting time in minutes.
         """
-        return self.load_device_info().get('status', {}).get('total_cutting_time_minutes', None)
+        return self.get_field('status.total_cutting_time_minutes')
 
     def get_location(self) -> str | None:
         """
         Get the location of the lawn mower.
         """
-        return self.load_device_info().get('location', None)
+        return self.get_field('location')
 
     def get_last_updated(self) -> str | None:
         """
         Get the last updated time of the lawn mower.
         """
-        return self.load_device_info().get('last_updated', None)
+        return self.get_field('last_updated')
 
 if __name__ == "__main__":
     lawn_mower_device = LawnMower("mower98765", "LawnMower")
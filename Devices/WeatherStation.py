@@ -1,69 +1,70 @@
 from device import NotCompatibleDevice, Device, load_json, save_json
+from device_registry import DeviceRegistry
 
 
 class WeatherStation(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
     def get_name(self) -> str:
         """
         Get the name of the weather station.
         """
-        return self.load_device_info().get('name', None)
+        return self.get_field('name')
 
     def get_brand(self) -> str:
         """
         Get the brand of the weather station.
         """
-        return self.load_device_info().get('brand', None)
+        return self.get_field('brand')
 
     def get_model(self) -> str:
         """
         Get the model of the weather station.
         """
-        return self.load_device_info().get('model', None)
+        return self.get_field('model')
 
     def get_temperature(self) -> float:
         """
         Get the current temperature in Celsius.
         """
-        return self.load_device_info().get('status', {}).get('temperature_c', None)
+        return self.get_field('status.temperature_c')
 
     def get_humidity(self) -> float:
         """
         Get the current humidity percentage.
         """
-        return self.load_device_info().get('status', {}).get('humidity_percent', None)
+        return self.get_field('status.humidity_percent')
 
     def get_pressure(self) -> float:
         """
         Get the atmospheric pressure in hPa.
         """
-        return self.load_device_info().get('status', {}).get('pressure_hpa', None)
+        return self.get_field('status.pressure_hpa')
 
     def get_wind_speed(self) -> float:
         """
         Get the current wind speed in km/h.
         """
-        return self.load_device_info().get('status', {}).get('wind_speed_kmh', None)
+        return self.get_field('status.wind_speed_kmh')
 
     def get_rainfall(self) -> float:
         """
         Get the rainfall measurement in millimeters.
         """
-        return self.load_device_info().get('status', {}).get('rainfall_mm', None)
+        return self.get_field('status.rainfall_mm')
 
     def get_location(self) -> str:
         """
         Get the location of the weather station.
         """
-        return self.load_device_info().get('location', None)
+        return self.get_field('location')
 
     def get_last_updated(self) -> str:
         """
         Get the last updated timestamp of the weather station.
         """
-        return self.load_device_info().get('last_updated', None)
+        return self.get_field('last_updated')
 
 if __name__ == "__main__":
     weather_station_device = WeatherStation("weatherstation56789", "WeatherStation")
@@ -0,0 +1,396 @@
+import math
+import os
+import sys
+import threading
+import uuid
+from collections import deque
+
+sys.path.append(os.path.abspath('..'))
+from clock import Clock, get_clock
+from json_cache import load_json_cached, copy_json
+from logging_config import get_logger
+from metrics import count
+from device_records import DeviceRecord
+from device_registry import DeviceRegistry, get_registry, FILE_PATH, save_json
+from scenes import Scene, SceneEngine
+
+AUTOMATIONS_PATH = os.path.join(os.path.dirname(FILE_PATH), "automations.json")
+
+# Trigger conditions.
+ABOVE = "above"
+BELOW = "below"
+EQUALS = "equals"
+
+
+class Trigger:
+    """
+    Condition on one field of the devices of one type, e.g. a weather station's wind speed above 40.
+
+    With `hysteresis`, a trigger that has fired only re-arms once the value is back past the
+    threshold by that margin: a wind speed trigger above 40 with a hysteresis of 5 fires at
+    41, and not again before the speed has dropped below 35.
+
+    Args:
+        device_type (str): `type` of the devices the trigger watches, e.g. "weather_station".
+        field (str): Dotted path of the watched value, e.g. "status.wind_speed_kmh".
+        condition (str): `ABOVE`, `BELOW` or `EQUALS`.
+        value: Threshold, or the value to equal.
+        hysteresis (float): Margin past the threshold that re-arms the trigger.
+        location (str | None): Only watch devices in this location.
+        device_id (str | None): Only watch this device; its type and location are then not checked.
+    """
+
+    def __init__(self, device_type: str, field: str, condition: str, value, hysteresis: float = 0.0,
+                 location: str | None = None, device_id: str | None = None):
+        if condition not in (ABOVE, BELOW, EQUALS):
+            raise ValueError(f"Unknown trigger condition: {condition!r}")
+        self.device_type = device_type
+        self.field = field
+        self.condition = condition
+        self.value = value
+        self.hysteresis = hysteresis
+        self.location = location
+        self.device_id = device_id
+
+    def matches(self, value) -> bool:
+        try:
+            if self.condition == ABOVE:
+                return value > self.value
+            if self.condition == BELOW:
+                return value < self.value
+        except TypeError:
+            return False
+        return value == self.value
+
+    def clears(self, value) -> bool:
+        """
+        Returns True if `value` re-arms the trigger after it has fired.
+        """
+        try:
+            if self.condition == ABOVE:
+                return value < self.value - self.hysteresis
+            if self.condition == BELOW:
+                return value > self.value + self.hysteresis
+        except TypeError:
+            return False
+        return value != self.value
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'Trigger':
+        condition = next((key for key in (ABOVE, BELOW, EQUALS) if key in data), None)
+        if condition is None:
+            raise ValueError(f"Trigger has no condition: {data!r}")
+        return cls(data['type'], data['field'], condition, data[condition], data.get('hysteresis', 0.0),
+                   data.get('location'), data.get('device_id'))
+
+    def to_json(self) -> dict:
+        data = {"type": self.device_type, "field": self.field, self.condition: self.value}
+        if self.hysteresis:
+            data['hysteresis'] = self.hysteresis
+        if self.location is not None:
+            data['location'] = self.location
+        if self.device_id is not None:
+            data['device_id'] = self.device_id
+        return data
+
+
+class AutomationRule:
+    """
+    Applies `actions`, targets in the format of `Scene` targets, whenever `trigger` fires.
+
+    The trigger is tracked per watched device. `debounce` is the shortest time in seconds
+    between two firings for the same device; firings in between are dropped.
+    """
+
+    def __init__(self, rule_id: str, trigger: Trigger, actions: list[dict], debounce: float = 0.0):
+        self.rule_id = rule_id
+        self.trigger = trigger
+        self.scene = Scene(rule_id, actions)
+        self.debounce = debounce
+
+    @classmethod
+    def from_json(cls, rule_id: str, data: dict) -> 'AutomationRule':
+        return cls(rule_id, Trigger.from_json(data['when']), copy_json(data['then']), data.get('debounce', 0.0))
+
+    def to_json(self) -> dict:
+        data = {"when": self.trigger.to_json(), "then": self.scene.to_json()['targets']}
+        if self.debounce:
+            data['debounce'] = self.debounce
+        return data
+
+    def __repr__(self) -> str:
+        return f"AutomationRule({self.rule_id!r}, {self.trigger.to_json()})"
+
+
+class AutomationEngine:
+    """
+    Runs automation rules on device state changes.
+
+    The engine follows every change made through the registry. Rules are indexed by the
+    (device type, location) and field of their trigger, or by the device_id and field if the
+    trigger watches a single device, so a change only evaluates the rules watching that field
+    of that very device; changes of other fields cost a single dict lookup. A change of a
+    whole subtree, e.g. "status", evaluates the rules watching fields inside it.
+
+    Evaluation runs as the change is made; the actions of fired rules are queued and applied
+    by `run_pending()`, or by a worker thread after `start()`, each rule as one scene activation
+    (one commit). Changes made by actions can fire further rules.
+
+    Rules fired by changes inside a registry `batch()` are held until the batch commits; if it
+    rolls back, they are dropped and the triggers are back in the state they had before it.
+
+    Args:
+        registry (DeviceRegistry | None): Registry to follow; the default one if None.
+        clock (Clock | None): Clock for debouncing; the default clock if None.
+        automations_path (str): File `load()` and `save()` use.
+    """
+
+    def __init__(self, registry: DeviceRegistry | None = None, clock: Clock | None = None,
+                 automations_path: str = AUTOMATIONS_PATH):
+        self.registry = registry or get_registry()
+        self.clock = clock if clock is not None else get_clock()
+        self.automations_path = automations_path
+        self.scenes = SceneEngine(self.registry)
+        self.logger = get_logger()
+        self._rules: dict[str, AutomationRule] = {}
+        # (scope, field) -> rules watching the field; {rule_id: rule}, for O(1) removal. The scope
+        # is the watched device_id, or the (device type, location) pair, location None for any.
+        self._index: dict[tuple, dict[str, AutomationRule]] = {}
+        # (scope, parent path) -> rules watching a field inside the parent, e.g. "status".
+        self._nested: dict[tuple, dict[str, AutomationRule]] = {}
+        # Every path some rule reacts to, to reject other changes before reading the device.
+        self._paths: dict[str, int] = {}
+        # (rule_id, device_id) of triggers that fired and have not re-armed yet.
+        self._active: set[tuple[str, str]] = set()
+        self._last_fired: dict[tuple[str, str], float] = {}
+        self._pending: deque[tuple[AutomationRule, str]] = deque()
+        # Firings inside the open registry batch, or None outside of one, and the
+        # (key, was active, last fired) of every trigger they changed, to undo a rollback.
+        self._held: list[tuple[AutomationRule, str]] | None = None
+        self._held_undo: list[tuple[tuple[str, str], bool, float | None]] = []
+        self._condition = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+        self.registry.subscribe(self._on_change)
+        self.registry.subscribe_batches(self._on_batch_end)
+
+    def _keys(self, rule: AutomationRule) -> list[tuple[dict, tuple]]:
+        trigger = rule.trigger
+        if trigger.device_id is not None:
+            scope = trigger.device_id
+        else:
+            scope = (trigger.device_type, trigger.location)
+        keys = [(self._index, (scope, trigger.field))]
+        parts = trigger.field.split('.')
+        for end in range(1, len(parts)):
+            keys.append((self._nested, (scope, '.'.join(parts[:end]))))
+        return keys
+
+    def add_rule(self, rule: AutomationRule) -> None:
+        """
+        Adds a rule, replacing a rule with the same `rule_id`.
+        """
+        with self._condition:
+            if rule.rule_id in self._rules:
+                self._remove(rule.rule_id)
+            self._rules[rule.rule_id] = rule
+            for index, key in self._keys(rule):
+                index.setdefault(key, {})[rule.rule_id] = rule
+                self._paths[key[1]] = self._paths.get(key[1], 0) + 1
+
+    def create_rule(self, trigger: Trigger, actions: list[dict], debounce: float = 0.0) -> AutomationRule:
+        """
+        Adds a rule with a new `rule_id`, e.g.
+        ``create_rule(Trigger("plug", "status.energy_consumption.current_power_w", ABOVE, 2000),
+        [{"type": "lawn_mower", "set": {"status.power": "off"}}])``.
+        """
+        rule = AutomationRule(uuid.uuid4().hex[:16], trigger, actions, debounce)
+        self.add_rule(rule)
+        return rule
+
+    def remove_rule(self, rule_id: str) -> bool:
+        """
+        Removes a rule. Returns False if there was no such rule.
+        """
+        with self._condition:
+            return self._remove(rule_id)
+
+    def _remove(self, rule_id: str) -> bool:
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return False
+        for index, key in self._keys(rule):
+            rules = index[key]
+            del rules[rule_id]
+            if not rules:
+                del index[key]
+            self._paths[key[1]] -= 1
+            if not self._paths[key[1]]:
+                del self._paths[key[1]]
+        self._active = {key for key in self._active if key[0] != rule_id}
+        return True
+
+    def rules(self) -> list[AutomationRule]:
+        with self._condition:
+            return list(self._rules.values())
+
+    def load(self) -> None:
+        """
+        Replaces the rules with the ones stored in `automations_path`, if it exists.
+        """
+        document = load_json_cached(self.automations_path) if os.path.exists(self.automations_path) else {}
+        rules = [AutomationRule.from_json(rule_id, data) for rule_id, data in document.get('rules', {}).items()]
+        with self._condition:
+            for rule_id in list(self._rules):
+                self._remove(rule_id)
+            for rule in rules:
+                self.add_rule(rule)
+
+    def save(self) -> None:
+        with self._condition:
+            document = {"rules": {rule_id: rule.to_json() for rule_id, rule in self._rules.items()}}
+        save_json(document, self.automations_path)
+
+    def _on_change(self, device: DeviceRecord, path: str, old_value, new_value) -> None:
+        if path not in self._paths:
+            return
+        device_type = device.get_path('type')
+        location = device.get_path('location')
+        if location is None:
+            scopes = (device.device_id, (device_type, None))
+        else:
+            scopes = (device.device_id, (device_type, None), (device_type, location))
+        with self._condition:
+            if self.registry.in_batch:
+                if self._held is None:
+                    self._held = []
+            elif self._held is not None:
+                # A batch is rolling back changes that were evaluated as they were made.
+                return
+            for scope in scopes:
+                rules = self._index.get((scope, path))
+                if rules:
+                    for rule in rules.values():
+                        self._evaluate(rule, device, new_value)
+                rules = self._nested.get((scope, path))
+                if rules:
+                    for rule in rules.values():
+                        self._evaluate(rule, device, device.get_path(rule.trigger.field))
+
+    def _evaluate(self, rule: AutomationRule, device: DeviceRecord, value) -> None:
+        trigger = rule.trigger
+        key = (rule.rule_id, device.device_id)
+        if key in self._active:
+            if trigger.clears(value):
+                self._hold_undo(key)
+                self._active.discard(key)
+            return
+        if not trigger.matches(value):
+            return
+        now = self.clock.time()
+        if now - self._last_fired.get(key, -math.inf) < rule.debounce:
+            count("automation_rules_total", result="debounced")
+            return
+        self._hold_undo(key)
+        self._active.add(key)
+        self._last_fired[key] = now
+        if self._held is not None:
+            self._held.append((rule, device.device_id))
+        else:
+            self._pending.append((rule, device.device_id))
+            self._condition.notify()
+
+    def _hold_undo(self, key: tuple[str, str]) -> None:
+        if self._held is not None:
+            self._held_undo.append((key, key in self._active, self._last_fired.get(key)))
+
+    def _on_batch_end(self, committed: bool) -> None:
+        with self._condition:
+            if self._held is None:
+                return
+            held, undo = self._held, self._held_undo
+            self._held, self._held_undo = None, []
+            if committed:
+                self._pending.extend(held)
+                if held:
+                    self._condition.notify()
+                return
+            for key, active, last_fired in reversed(undo):
+                if active:
+                    self._active.add(key)
+                else:
+                    self._active.discard(key)
+                if last_fired is None:
+                    self._last_fired.pop(key, None)
+                else:
+                    self._last_fired[key] = last_fired
+
+    def run_pending(self) -> int:
+        """
+        Applies the actions of every fired rule on the calling thread.
+
+        Returns:
+            int: The number of rule firings applied.
+        """
+        applied = 0
+        while True:
+            with self._condition:
+                if not self._pending:
+                    return applied
+                rule, device_id = self._pending.popleft()
+            self._apply(rule, device_id)
+            applied += 1
+
+    def _apply(self, rule: AutomationRule, device_id: str) -> None:
+        try:
+            changes = self.scenes.activate(rule.scene)
+            count("automation_rules_total", result="fired")
+            self.logger.info(f"Automation {rule.rule_id} triggered by device {device_id} changed {len(changes)} devices.")
+        except Exception:
+            count("automation_rules_total", result="failed")
+            self.logger.exception(f"Automation {rule.rule_id} triggered by device {device_id} failed.")
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not self._pending:
+                    self._condition.wait()
+                if not self._running:
+                    return
+                rule, device_id = self._pending.popleft()
+            self._apply(rule, device_id)
+
+    def start(self) -> None:
+        """
+        Starts a worker thread applying the actions of fired rules as they come.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._work, name="automation", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self) -> None:
+        """
+        Stops the worker thread and stops following registry changes.
+        """
+        self.stop()
+        self.registry.unsubscribe(self._on_change)
+        self.registry.unsubscribe_batches(self._on_batch_end)
+
+
+if __name__ == '__main__':
+    engine = AutomationEngine()
+    engine.load()
+    print('====List of automations====\n')
+    for rule in engine.rules():
+        print(rule)
@@ -1,9 +1,10 @@
 from device import NotCompatibleDevice, Device, load_json, save_json
+from device_registry import DeviceRegistry
 
 
 class Bulb(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
     def get_name(self) -> str | None:
         """
@@ -11,7 +12,7 @@ class Bulb(Device):
 
         The name of the bulb as a string, or None if not found.
         """
-        return self.load_device_info().get('name', None)
+        return self.get_field('name')
 
     def get_brand(self) -> str | None:
         """
@@ -19,7 +20,7 @@ class Bulb(Device):
 
         The brand of the bulb as a string, or None if not found.
         """
-        return self.load_device_info().get('brand', None)
+        return self.get_field('brand')
 
     def get_model(self) -> str | None:
         """
@@ -27,7 +28,7 @@ class Bulb(Device):
 
         The model of the bulb as a string, or None if not found.
         """
-        return self.load_device_info().get('model', None)
+        return self.get_field('model')
 
     def get_power(self) -> str | None:
         """
@@ -35,7 +36,7 @@ class Bulb(Device):
 
         The power status as a string, or None if not found.
         """
-        return self.load_device_info().get('status', {}).get('power', None)
+        return self.get_field('status.power')
 
     def get_brightness(self) -> int | None:
         """
@@ -43,7 +44,7 @@ class Bulb(Device):
 
         The brightness level as an integer, or None if not found.
         """
-        return self.load_device_info().get('status', {}).get('brightness', None)
+        return self.get_field('status.brightness')
 
     def get_color_temp(self) -> int | None:
         """
@@ -51,7 +52,7 @@ class Bulb(Device):
 
         The color temperature as an integer, or None if not found.
         """
-        return self.load_device_info().get('status', {}).get('color_temp', None)
+        return self.get_field('status.color_temp')
 
     def get_rgb(self) -> dict | None:
         """
@@ -59,7 +60,11 @@ class Bulb(Device):
 
         A dictionary with 'red', 'green', 'blue' values, or None if not found.
         """
-        return self.load_device_info().get('status', {}).get('rgb', None)
+        values = self.get_many(['status.rgb.red', 'status.rgb.green', 'status.rgb.blue'])
+        rgb = {path.rsplit('.', 1)[1]: value for path, value in values.items()}
+        if None in rgb.values():
+            return self.get_field('status.rgb')
+        return rgb
 
 if __name__ == '__main__':
     bulb_device = Bulb("1234567890abcdef", "Bulb")
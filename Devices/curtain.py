@@ -1,39 +1,36 @@
 from device import NotCompatibleDevice, Device, load_json
+from device_registry import DeviceRegistry
 
 class Curtain(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
 
     def get_current_position(self) -> float | None:
         """
         Get the current position of the curtain.
 
-        Loads the JSON data, searches for the device with the matching device_id,
-        and returns the current position of the curtain.
+        Looks up the device in the registry and returns the current position of the curtain.
 
         :return: The current position of the curtain as a float, or None if not found.
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return float(device['status'].get('position', None))
-        return None
+        value = self.get_field('status.position')
+        if value is None:
+            return None
+        return float(value)
 
     def get_open_percentage(self) -> float | None:
         """
         Get the open percentage of the curtain.
 
-        Loads the JSON data, searches for the device with the matching device_id,
-        and returns the open percentage of the curtain.
+        Looks up the device in the registry and returns the open percentage of the curtain.
 
         :return: The open percentage of the curtain as a float, or None if not found.
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return float(device['status'].get('open_percent'))
-        return None
+        value = self.get_field('status.open_percent')
+        if value is None:
+            return None
+        return float(value)
 
 
 if __name__ == "__main__":
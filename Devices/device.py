@@ -2,25 +2,32 @@ from abc import ABC
 import json
 import sys
 import os
-from datetime import datetime
+import time
 from colorama import Fore, init
 
 sys.path.append(os.path.abspath('..'))
 from logging_config import get_logger
+from metrics import timed, count
+from clock import get_clock
+from device_registry import FILE_PATH, load_json, save_json, get_registry, DeviceRegistry, STATE_FIELDS
+from device_records import get_path, set_path
+import device_events as events
+from device_events import EventSink, get_default_sink
 
-FILE_PATH = "../devices.json"
 MAX_ATTEMPTS = 3
+# Seconds a snapshot may be reused by getters; 0 reads the registry on every call.
+SNAPSHOT_TTL = 0.0
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_MISSING = object()
 # Initialize Colorama (necessary for Windows compatibility)
 init(autoreset=True)
 
-def load_json(file_path = FILE_PATH):
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-    return data
-
-def save_json(data, file_path = FILE_PATH):
-    with open(file_path, 'w') as file:
-        json.dump(data, file, indent=4)
+def current_timestamp() -> str:
+    """
+    Returns the current time of the clock set with `clock.set_clock()`, in the format of the
+    devices' 'last_updated' field.
+    """
+    return get_clock().now().strftime(TIMESTAMP_FORMAT)
 
 class NotCompatibleDevice(Exception):
     """
@@ -40,31 +47,60 @@ class ToManyAttempts(Exception):
 class Device(ABC):
     """
     Abstract class for all devices
+
+    Args:
+        device_id (str): Id of the device in the registry.
+        device_type (str): Name of the device type.
+        registry (DeviceRegistry | None): Registry holding the device's record; the default one if None.
     """
 
-    def __init__(self, device_id: str, device_type: str):
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
         self.device_id = device_id
         self.device_type = device_type
         self.connected = False
         self.logger = get_logger()
+        self.registry = registry or get_registry()
+        self.snapshot_ttl = SNAPSHOT_TTL
+        self._snapshot: dict | None = None
+        self._snapshot_time = 0.0
+        self.sink: EventSink | None = None
+
+    def emit(self, event: events.DeviceEvent) -> None:
+        """
+        Hands `event` to the device's own sink, or to the default sink if it has none.
+        """
+        (self.sink or get_default_sink()).emit(event)
 
+    def transaction(self):
+        """
+        Returns a context manager that commits every change made inside it to this device's
+        registry at once, and rolls them back if the block raises.
+
+        Example:
+            with bulb.transaction():
+                bulb.turn_on_off("off")
+                plug.turn_on_off("off")
+        """
+        return self.registry.batch()
+
+    @timed("device_operation_seconds")
     def connect_to_device(self) -> None:
         """
         Connects to the device if compatible with the current class.
         """
-        print(f"{Fore.YELLOW}Connecting to device {self.device_id}...")
+        self.emit(events.Connecting(self.device_id))
         self.logger.info(f"Connecting to device {self.device_id}...")
 
         if self.device_type.lower() != self.__class__.__name__.lower():
-            print(f"{Fore.RED}Connection error: Device {self.device_id} is not compatible.")
+            self.emit(events.NotCompatible(self.device_id))
             self.logger.error(f"Connection error: Device {self.device_id} is not compatible.")
             raise NotCompatibleDevice
         if self.__login_to_device():
             self.connected = True
-            print(f"{Fore.GREEN}Successfully connected to device {self.device_id}.")
+            self.emit(events.Connected(self.device_id))
             self.logger.info(f"Successfully connected to device {self.device_id}.")
         else:
-            print(f"{Fore.RED}Wrong password, failed to connect to device {self.device_id}.")
+            self.emit(events.WrongPassword(self.device_id))
             self.logger.error(f"Wrong password, failed to connect to device {self.device_id}.")
             raise CantConnectToDevice
 
@@ -83,20 +119,18 @@ class Device(ABC):
         """
         Retrieves the device secret key from the JSON data.
         """
-        device_secret_key = None
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                device_secret_key = device['device_secret_key']
-                break
-        return device_secret_key
+        device = self.registry.get(self.device_id)
+        if device is None:
+            return None
+        return device.device_secret_key
 
+    @timed("device_operation_seconds")
     def change_device_password(self) -> bool:
         """
         Changes the password for the device if connected.
         """
         if not self.connected:
-            print(f"{Fore.RED}Cannot change password. Device {self.device_id} is not connected.")
+            self.emit(events.NotConnected(self.device_id, "change password"))
             self.logger.error(f"Cannot change password. Device {self.device_id} is not connected.")
             return False
 
@@ -107,7 +141,7 @@ class Device(ABC):
             counter += 1
             if counter >= MAX_ATTEMPTS:
                 raise ToManyAttempts
-            print(f"{Fore.RED}Incorrect password. Please try again.")
+            self.emit(events.IncorrectPassword(self.device_id))
 
         counter = 0
         prompt_new_password = f"Enter new password for device {self.device_id}: "
@@ -115,56 +149,52 @@ class Device(ABC):
         while (new_password:= input(prompt_new_password)) != input(prompt_confirm_password):
             counter += 1
             if counter > MAX_ATTEMPTS:
-                print(f"{Fore.RED}Too many attempts. Please try again later.")
+                self.emit(events.TooManyAttempts(self.device_id))
                 return False
-            print(f"{Fore.RED}Incorrect password. Please try again.")
-
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                device['device_secret_key'] = new_password
-                save_json(json_data)
-                print(f"{Fore.GREEN}Password changed successfully for device {self.device_id}.")
-                self.logger.info(f"Password changed for device {self.device_id}.")
-                return True
-        print(f"{Fore.RED}Failed to change password for device {self.device_id}.")
+            self.emit(events.IncorrectPassword(self.device_id))
+
+        if self.registry.update(self.device_id, {'device_secret_key': new_password}):
+            self.invalidate_snapshot()
+            self.registry.save()
+            self.emit(events.PasswordChanged(self.device_id))
+            self.logger.info(f"Password changed for device {self.device_id}.")
+            return True
+        self.emit(events.PasswordChangeFailed(self.device_id))
         self.logger.error(f"Failed to change password for device {self.device_id}.")
         return False
 
 
+    @timed("device_operation_seconds")
     def disconnect_from_device(self) -> None:
         """
         Disconnects from the device if currently connected.
         """
-        print(f"{Fore.YELLOW}Disconnecting from device {self.device_id}...")
+        self.emit(events.Disconnecting(self.device_id))
 
         if self.connected:
             self.connected = False
-            print(f"{Fore.GREEN}Successfully disconnected from device {self.device_id}.")
+            self.emit(events.Disconnected(self.device_id))
             self.logger.info(f"disconnected from device {self.device_id}.")
         else:
-            print(f"{Fore.YELLOW}Device {self.device_id} was not connected.")
+            self.emit(events.WasNotConnected(self.device_id))
 
+    @timed("device_operation_seconds")
     def turn_on_off(self, new_state: str) -> None:
         """
         Updates the device's power status to the specified state.
 
-        Loads the JSON data, finds the device by `device_id`, updates its 'power' status,
-        modifies the 'last_updated' timestamp, and saves the updated JSON data.
+        Looks up the device in the registry, updates its 'power' status,
+        modifies the 'last_updated' timestamp, and saves the registry.
 
         Args:
             new_state (str): The new power state to set for the device ('on' or 'off').
         """
-        json_data = load_json()
-
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                device['status']['power'] = new_state
-                self.modify_last_updated(json_data)
-                print(f"{Fore.GREEN}Device {self.device_id} power set to {new_state}.")
-                self.logger.info(f"Device {self.device_id} power set to {new_state}.")
-                break
+        if self.registry.update(self.device_id, {'status.power': new_state}):
+            self.modify_last_updated()
+            self.emit(events.PowerChanged(self.device_id, new_state))
+            self.logger.info(f"Device {self.device_id} power set to {new_state}.")
 
+    @timed("device_operation_seconds")
     def reboot(self) -> bool:
         """
         Reboots the device by turning it off and then on, updating the 'last_updated' timestamp.
@@ -173,19 +203,21 @@ class Device(ABC):
             bool: True if reboot was successful, False otherwise.
         """
         if not self.connected:
-            print(f"{Fore.RED}Cannot perform reboot. Device {self.device_id} is not connected.")
+            self.emit(events.NotConnected(self.device_id, "perform reboot"))
             return False
 
-        print(f"{Fore.YELLOW}Rebooting device {self.device_id}...")
+        self.emit(events.Rebooting(self.device_id))
         self.logger.info(f"Rebooting device {self.device_id}...")
         
-        self.turn_on_off("off")
-        self.turn_on_off("on")
+        with self.registry.batch():
+            self.turn_on_off("off")
+            self.turn_on_off("on")
         
-        print(f"{Fore.GREEN}Device {self.device_id} is back online.")
+        self.emit(events.BackOnline(self.device_id))
         self.logger.info(f"Device {self.device_id} is back online.")
         return True
 
+    @timed("device_operation_seconds")
     def get_status(self) -> str | None:
         """
         Retrieves the status of the device if connected.
@@ -194,32 +226,30 @@ class Device(ABC):
             str | None: The status of the device in JSON format if connected, None otherwise.
         """
         if not self.connected:
-            print(f"{Fore.RED}Cannot get status. Device {self.device_id} is not connected.")
+            self.emit(events.NotConnected(self.device_id, "get status"))
             self.logger.error(f"Cannot get status. Device {self.device_id} is not connected.")
             return None
 
-        print(f"{Fore.GREEN}Getting status for device {self.device_id}")
+        self.emit(events.StatusRequested(self.device_id))
         self.logger.info(f"Getting status for device {self.device_id}")
 
-        json_data = load_json()
-        device_status = next(
-            (device['status'] for device in json_data['devices'] if device['device_id'] == self.device_id),
-            None
-        )
+        device = self.registry.get(self.device_id)
+        device_status = device.status.to_json() if device is not None else None
 
         if device_status is not None:
             return f"{Fore.BLUE}{json.dumps(device_status, indent=4)}"
         else:
-            print(f"{Fore.RED}Status not found for device {self.device_id}.")
+            self.emit(events.StatusNotFound(self.device_id))
             self.logger.error(f"Status not found for device {self.device_id}.")
             return None
 
+    @timed("device_operation_seconds")
     def change_device_name(self, name: str) -> bool:
         """
         Changes the name of the device if connected.
 
-        This method checks if the user is connected to the device, then loads the JSON data, finds the device by ID,
-        and updates the 'name' attribute. It also updates the 'last_updated' timestamp and saves the modified JSON data.
+        This method checks if the user is connected to the device, then finds the device in the registry
+        and updates the 'name' attribute. It also updates the 'last_updated' timestamp and saves the registry.
 
         Args:
             name (str): The new name for the device.
@@ -228,64 +258,154 @@ class Device(ABC):
             bool: True if the name was successfully changed, False otherwise.
         """
         if not self.connected:
-            print(f"{Fore.RED}Cannot change device name. Device {self.device_id} is not connected.")
+            self.emit(events.NotConnected(self.device_id, "change device name"))
             self.logger.error(f"Cannot change device name. Device {self.device_id} is not connected.")
             return False
 
-        json_data = load_json()
-        
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                device['name'] = name
-                self.modify_last_updated(json_data)
-                print(f"{Fore.GREEN}Device name changed successfully. New name: {name}")
-                self.logger.info(f"Device name changed successfully. New name: {name}")
-                return True
-
-        print(f"{Fore.RED}Failed to change device name. Device {self.device_id} not found.")
+        if self.registry.update(self.device_id, {'name': name}):
+            self.modify_last_updated()
+            self.emit(events.NameChanged(self.device_id, name))
+            self.logger.info(f"Device name changed successfully. New name: {name}")
+            return True
+
+        self.emit(events.NameChangeFailed(self.device_id))
         self.logger.error(f"Failed to change device name. Device {self.device_id} not found.")
         return False
 
+    @timed("device_operation_seconds")
     def load_device_info(self) -> dict | None:
         """
-        Load the JSON data and retrieve the information for this specific device.
+        Retrieve the information for this specific device from the registry.
 
         A dictionary containing the device's information, or an empty dictionary if not found.
         """
         if not self.connected:
-            print(f"{Fore.RED}Cannot change device name. Device {self.device_id} is not connected.")
-            self.logger.error(f"Cannot change device name. Device {self.device_id} is not connected.")
+            self.emit(events.NotConnected(self.device_id, "load device information"))
+            self.logger.error(f"Cannot load device information. Device {self.device_id} is not connected.")
+            return None
+
+        device = self.registry.get(self.device_id)
+        if device is None:
+            return {}
+        return device.to_json()
+
+    @timed("device_operation_seconds")
+    def snapshot(self) -> dict | None:
+        """
+        Returns all information of this device as a dict, read in one go.
+
+        Hot numeric status values are taken from the registry's state table when one is attached,
+        so values written by other processes are visible. With `snapshot_ttl` set above zero the
+        snapshot is reused for that many seconds; changes made through this device drop it at once.
+
+        Returns:
+            dict | None: The device record, or None if the device is not found.
+        """
+        if self._snapshot is not None and time.monotonic() - self._snapshot_time < self.snapshot_ttl:
+            count("device_snapshot_cache_total", result="hit")
+            return self._snapshot
+        if self.snapshot_ttl > 0:
+            count("device_snapshot_cache_total", result="miss")
+        device = self.registry.get(self.device_id)
+        if device is None:
             return None
+        snapshot = device.to_json()
+        table = self.registry.state_table
+        if table is not None:
+            for path in STATE_FIELDS:
+                value = table.read(self.device_id, path, _MISSING)
+                if value is not _MISSING:
+                    set_path(snapshot, path, value)
+        if self.snapshot_ttl > 0:
+            self._snapshot = snapshot
+            self._snapshot_time = time.monotonic()
+        return snapshot
+
+    def invalidate_snapshot(self) -> None:
+        """
+        Drops the cached snapshot, so the next read goes to the registry.
+        """
+        self._snapshot = None
 
-        json_data = load_json()
-        for device in json_data.get('devices', []):
-            if device['device_id'] == self.device_id:
-                return device
-        return {}
+    @timed("device_operation_seconds")
+    def get_many(self, fields: list[str], default=None) -> dict:
+        """
+        Returns several values of this device at once, e.g. ``get_many(["name", "status.power"])``.
+
+        Without a snapshot TTL the values are read straight from the registry record and the
+        state table, without building a snapshot; otherwise they come from `snapshot()`.
 
+        Args:
+            fields (list[str]): Dotted paths into the device record.
+            default: Value used for every field that is not found.
+
+        Returns:
+            dict: The values keyed by their paths.
+        """
+        if self.snapshot_ttl > 0:
+            snapshot = self.snapshot() or {}
+            return {path: get_path(snapshot, path, default) for path in fields}
+
+        device = self.registry.get(self.device_id)
+        table = self.registry.state_table
+        values = {}
+        for path in fields:
+            value = _MISSING
+            if table is not None:
+                value = table.read(self.device_id, path, _MISSING)
+            if value is _MISSING:
+                value = device.get_path(path, default) if device is not None else default
+            values[path] = value
+        return values
+
+    def get_field(self, path: str, default=None):
+        """
+        Returns a single value of this device, e.g. ``get_field("status.brightness")``.
+
+        Args:
+            path (str): Dotted path into the device record.
+            default: Value returned when the device or the value is not found.
+        """
+        return self.get_many([path], default)[path]
+
+    def get_history(self, metric: str, start: float | None = None, end: float | None = None):
+        """
+        Returns the recorded readings of one metric of this device, e.g. ``get_history("temperature_c")``.
+
+        Readings are recorded by processes that called `telemetry.start_recording()`.
+
+        Args:
+            metric (str): Metric name from `telemetry.TELEMETRY_FIELDS`.
+            start (float | None): Earliest timestamp, in seconds since the epoch.
+            end (float | None): Timestamp the readings end before.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Timestamps and values, oldest first.
+        """
+        # Imported here, so using devices does not load NumPy.
+        from telemetry import get_telemetry
+        return get_telemetry().range(self.device_id, metric, start, end)
+
+    @timed("device_operation_seconds")
     def display_device_info(self) -> None:
         """
         Display the information for this specific device.
         """
         device_info = self.load_device_info()
         if device_info:
-            print(f"{Fore.BLUE}{json.dumps(device_info, indent=4)}")
+            self.emit(events.DeviceInfo(self.device_id, device_info))
         else:
-            print(f"{Fore.RED}Device information not found for device {self.device_id}.")
+            self.emit(events.DeviceInfoNotFound(self.device_id))
 
-    def modify_last_updated(self, json_data) -> None:
+    @timed("device_operation_seconds")
+    def modify_last_updated(self) -> None:
         """
-        Updates the 'last_updated' timestamp for the device in the JSON data.
-
-        Finds the device with the matching `device_id` and updates its 'last_updated' 
-        field with the current date and time, then saves the updated JSON data.
+        Updates the 'last_updated' timestamp for the device in the registry.
 
-        Args:
-            json_data (dict): The JSON data containing device information.
+        Sets the device's 'last_updated' field to the current date and time,
+        then saves the registry.
         """
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                device['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                save_json(json_data, FILE_PATH)
-                break
+        self.invalidate_snapshot()
+        if self.registry.update(self.device_id, {'last_updated': current_timestamp()}):
+            self.registry.save()
 
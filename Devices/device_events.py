@@ -0,0 +1,289 @@
+import json
+import sys
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, ClassVar
+
+from colorama import Fore
+
+# Event kinds and the colour the console renders them in.
+PROGRESS = "progress"
+SUCCESS = "success"
+ERROR = "error"
+DATA = "data"
+
+COLORS = {
+    PROGRESS: Fore.YELLOW,
+    SUCCESS: Fore.GREEN,
+    ERROR: Fore.RED,
+    DATA: Fore.BLUE,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceEvent(ABC):
+    """
+    Something that happened to a device, e.g. a power change or a failed login.
+
+    Events carry data, not text; `message()` renders them for people. Every event type
+    defines its own message.
+    """
+    KIND: ClassVar[str] = PROGRESS
+    device_id: str
+
+    @property
+    def kind(self) -> str:
+        return self.KIND
+
+    @abstractmethod
+    def message(self) -> str:
+        """
+        Returns the event as a sentence for the console or a log.
+        """
+
+
+@dataclass(frozen=True, slots=True)
+class Connecting(DeviceEvent):
+    def message(self) -> str:
+        return f"Connecting to device {self.device_id}..."
+
+
+@dataclass(frozen=True, slots=True)
+class Connected(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+
+    def message(self) -> str:
+        return f"Successfully connected to device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class NotCompatible(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Connection error: Device {self.device_id} is not compatible."
+
+
+@dataclass(frozen=True, slots=True)
+class WrongPassword(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Wrong password, failed to connect to device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class NotConnected(DeviceEvent):
+    """
+    An `action` (e.g. ``"get status"``) was refused because the device is not connected.
+    """
+    KIND: ClassVar[str] = ERROR
+    action: str
+
+    def message(self) -> str:
+        return f"Cannot {self.action}. Device {self.device_id} is not connected."
+
+
+@dataclass(frozen=True, slots=True)
+class IncorrectPassword(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return "Incorrect password. Please try again."
+
+
+@dataclass(frozen=True, slots=True)
+class TooManyAttempts(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return "Too many attempts. Please try again later."
+
+
+@dataclass(frozen=True, slots=True)
+class PasswordChanged(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+
+    def message(self) -> str:
+        return f"Password changed successfully for device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class PasswordChangeFailed(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Failed to change password for device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class Disconnecting(DeviceEvent):
+    def message(self) -> str:
+        return f"Disconnecting from device {self.device_id}..."
+
+
+@dataclass(frozen=True, slots=True)
+class Disconnected(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+
+    def message(self) -> str:
+        return f"Successfully disconnected from device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class WasNotConnected(DeviceEvent):
+    def message(self) -> str:
+        return f"Device {self.device_id} was not connected."
+
+
+@dataclass(frozen=True, slots=True)
+class PowerChanged(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+    state: str
+
+    def message(self) -> str:
+        return f"Device {self.device_id} power set to {self.state}."
+
+
+@dataclass(frozen=True, slots=True)
+class Rebooting(DeviceEvent):
+    def message(self) -> str:
+        return f"Rebooting device {self.device_id}..."
+
+
+@dataclass(frozen=True, slots=True)
+class BackOnline(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+
+    def message(self) -> str:
+        return f"Device {self.device_id} is back online."
+
+
+@dataclass(frozen=True, slots=True)
+class StatusRequested(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+
+    def message(self) -> str:
+        return f"Getting status for device {self.device_id}"
+
+
+@dataclass(frozen=True, slots=True)
+class StatusNotFound(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Status not found for device {self.device_id}."
+
+
+@dataclass(frozen=True, slots=True)
+class NameChanged(DeviceEvent):
+    KIND: ClassVar[str] = SUCCESS
+    name: str
+
+    def message(self) -> str:
+        return f"Device name changed successfully. New name: {self.name}"
+
+
+@dataclass(frozen=True, slots=True)
+class NameChangeFailed(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Failed to change device name. Device {self.device_id} not found."
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceInfo(DeviceEvent):
+    KIND: ClassVar[str] = DATA
+    info: dict = field(hash=False)
+
+    def message(self) -> str:
+        return json.dumps(self.info, indent=4)
+
+
+@dataclass(frozen=True, slots=True)
+class DeviceInfoNotFound(DeviceEvent):
+    KIND: ClassVar[str] = ERROR
+
+    def message(self) -> str:
+        return f"Device information not found for device {self.device_id}."
+
+
+class EventSink(ABC):
+    """
+    Receives the `DeviceEvent`s emitted by devices.
+    """
+
+    @abstractmethod
+    def emit(self, event: DeviceEvent) -> None:
+        pass
+
+
+class ConsoleSink(EventSink):
+    """
+    Prints every event in its colour, as devices always did.
+
+    Args:
+        stream: Text stream to write to; defaults to the current `sys.stdout`.
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def emit(self, event: DeviceEvent) -> None:
+        print(f"{COLORS[event.kind]}{event.message()}", file=self.stream or sys.stdout)
+
+
+class NullSink(EventSink):
+    """
+    Drops every event; for batch jobs and web workers that have no console.
+    """
+
+    def emit(self, event: DeviceEvent) -> None:
+        pass
+
+
+class BufferSink(EventSink):
+    """
+    Keeps events in memory, the oldest ones dropped beyond `max_events`.
+    """
+
+    def __init__(self, max_events: int | None = None):
+        self.events: deque[DeviceEvent] = deque(maxlen=max_events)
+
+    def emit(self, event: DeviceEvent) -> None:
+        self.events.append(event)
+
+    def clear(self) -> list[DeviceEvent]:
+        """
+        Removes and returns all buffered events.
+        """
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+class CallbackSink(EventSink):
+    """
+    Passes every event to `callback`, e.g. to forward it to a GUI or a websocket.
+    """
+
+    def __init__(self, callback: Callable[[DeviceEvent], None]):
+        self.callback = callback
+
+    def emit(self, event: DeviceEvent) -> None:
+        self.callback(event)
+
+
+_default_sink: EventSink = ConsoleSink()
+
+def set_default_sink(sink: EventSink) -> None:
+    """
+    Sets the sink used by every device that has no sink of its own.
+    """
+    global _default_sink
+    _default_sink = sink
+
+def get_default_sink() -> EventSink:
+    return _default_sink
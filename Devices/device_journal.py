@@ -0,0 +1,197 @@
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: the lock only orders the threads of this process.
+    fcntl = None
+
+sys.path.append(os.path.abspath('..'))
+from clock import get_clock
+from logging_config import get_logger
+from metrics import count
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class DeviceJournal:
+    """
+    Append-only log of device mutations kept next to the devices file.
+
+    Every line is one compact JSON record ``{"ts": ..., "ops": [[device_id, path, value], ...]}``.
+    Operations are plain assignments, so replaying a record twice gives the same result.
+
+    The journal remembers how far it has been read (`offset`), so records appended by other
+    processes since then can be replayed with `replay_tail()`. Appends and compaction are
+    serialized across processes by an exclusive lock on a file next to the journal, see `locked()`.
+    """
+
+    def __init__(self, devices_file_path: str):
+        self.path = devices_file_path + JOURNAL_SUFFIX
+        self.lock_path = self.path + LOCK_SUFFIX
+        self.record_count = 0
+        # Bytes of the journal file `_inode` read or written by this process.
+        self.offset = 0
+        self._inode: int | None = None
+        self._mutex = threading.RLock()
+        self._lock_file = None
+        self._lock_depth = 0
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the exclusive journal lock for the block; nested use by the same thread is allowed.
+        """
+        with self._mutex:
+            if not self._lock_depth:
+                self._lock_file = open(self.lock_path, 'a')
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if not self._lock_depth:
+                    # Closing the file releases the lock.
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _stat(self) -> os.stat_result | None:
+        try:
+            return os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+    def append(self, ops: list) -> None:
+        """
+        Appends one record holding `ops` to the journal and syncs it to disk.
+
+        If the file does not end in a newline (a writer died mid-append), the record starts
+        on a new line, so the torn line cannot swallow it.
+
+        Args:
+            ops (list): List of ``[device_id, path, value]`` operations.
+        """
+        record = {"ts": get_clock().now().strftime(TIMESTAMP_FORMAT), "ops": ops}
+        line = (json.dumps(record, separators=(',', ':')) + "\n").encode('utf-8')
+        with self.locked():
+            with open(self.path, 'ab+') as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_size:
+                    file.seek(-1, os.SEEK_END)
+                    if file.read(1) != b"\n":
+                        line = b"\n" + line
+                file.write(line)
+                file.flush()
+                os.fsync(file.fileno())
+            # Only move the offset on if nothing unread was in front of this record.
+            if stat.st_size == self.offset and self._inode in (None, stat.st_ino):
+                self._inode = stat.st_ino
+                self.offset += len(line)
+        self.record_count += 1
+        count("json_bytes_written_total", len(line), target="journal")
+
+    def _read(self, start: int) -> list:
+        """
+        Returns the operations of the records from byte `start` on and moves `offset` past them.
+
+        Lines that are not valid JSON are logged and skipped. A last line without a newline
+        may still be being written, so it is left for the next read.
+        """
+        ops = []
+        with open(self.path, 'rb') as file:
+            self._inode = os.fstat(file.fileno()).st_ino
+            file.seek(start)
+            position = start
+            for line in file:
+                if not line.endswith(b"\n"):
+                    break
+                position += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    ops.extend(json.loads(line)['ops'])
+                except (ValueError, KeyError, TypeError):
+                    get_logger().warning(f"Skipped unreadable journal record at byte {position - len(line)} of {self.path}.")
+                    continue
+                self.record_count += 1
+        count("json_bytes_read_total", position - start, source="journal")
+        self.offset = position
+        return ops
+
+    def replay(self) -> list:
+        """
+        Reads the whole journal and returns its operations in the order they were written.
+        """
+        self.record_count = 0
+        self.offset = 0
+        self._inode = None
+        if not os.path.exists(self.path):
+            return []
+        return self._read(0)
+
+    def rewritten(self) -> bool:
+        """
+        Returns True if the journal was replaced or cut since this process last read it,
+        i.e. another process compacted the store.
+        """
+        stat = self._stat()
+        if stat is None:
+            return self.offset > 0
+        if self._inode is None:
+            return False
+        return stat.st_ino != self._inode or stat.st_size < self.offset
+
+    def unread(self) -> bool:
+        """
+        Returns True if the journal holds records this process has not read.
+        """
+        stat = self._stat()
+        size = stat.st_size if stat is not None else 0
+        return self.rewritten() or size != self.offset
+
+    def replay_tail(self) -> list:
+        """
+        Returns the operations appended since the journal was last read, in order.
+
+        Only valid while `rewritten()` is False.
+        """
+        if not os.path.exists(self.path):
+            return []
+        return self._read(self.offset)
+
+    def size(self) -> int:
+        """
+        Returns the current size of the journal file in bytes.
+        """
+        stat = self._stat()
+        return stat.st_size if stat is not None else 0
+
+    def discard_until(self, offset: int) -> None:
+        """
+        Drops the first `offset` bytes of the journal, keeping anything appended after them.
+
+        Used after compaction, once the records up to `offset` are part of the snapshot.
+        Call it with the journal `locked()`, so no append is lost.
+        """
+        try:
+            with open(self.path, 'rb') as file:
+                file.seek(offset)
+                rest = file.read()
+        except FileNotFoundError:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(rest)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._inode = os.stat(self.path).st_ino
+        self.offset = max(self.offset - offset, 0)
+        self.record_count = rest.count(b"\n")
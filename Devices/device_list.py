@@ -1,22 +1,26 @@
-import json
+import os
+import sys
 from pprint import pprint
+
+sys.path.append(os.path.abspath('..'))
+from json_cache import load_json_cached
+from device_registry import get_registry
+
 FILE_PATH = "../devices.json"
 
 def load_json(file_path = FILE_PATH) -> dict:
-    with open(file_path, 'r') as file:
-        data = json.load(file)
-    return data
+    return load_json_cached(file_path, copy=True)
 
 
 def get_device_list() -> list:
     """
-    This method loads the JSON data from the file, iterates through the devices, and returns the list of them
+    This method streams the devices from the store, so it runs in bounded memory on large files,
+    and returns the list of them
     """
 
-    json_data = load_json()
     devices_in_network = []
-    for device in json_data['devices']:
-        device_list = device['device_id'], device['name']
+    for device in get_registry().iter_devices():
+        device_list = device.device_id, device.get_path('name')
         devices_in_network.append(device_list)
     return devices_in_network
 
@@ -0,0 +1,218 @@
+import threading
+from typing import Iterator
+
+from device import Device
+from device_records import DeviceRecord
+from device_registry import DeviceRegistry, get_registry
+from bulb import Bulb
+from plug import Plug
+from thermostat import Thermostat
+from curtain import Curtain
+from WeatherStation import WeatherStation
+from LawnMower import LawnMower
+
+# Device `type` values as stored in devices.json and the class handling them.
+DEVICE_CLASSES: dict[str, type[Device]] = {
+    'bulb': Bulb,
+    'plug': Plug,
+    'thermostat': Thermostat,
+    'curtain': Curtain,
+    'weather_station': WeatherStation,
+    'lawn_mower': LawnMower,
+}
+
+# Record paths whose change moves a device between index entries.
+_INDEXED_KEYS = frozenset(('type', 'location', 'status'))
+
+
+def _index_key(device: DeviceRecord | None) -> tuple:
+    """
+    Returns the (type, location, power) entries a device record is indexed under; power is lower-cased.
+    """
+    if device is None:
+        return None, None, None
+    power = device.get_path('status.power')
+    return (
+        device.get_path('type'),
+        device.get_path('location'),
+        power.lower() if isinstance(power, str) else power,
+    )
+
+
+class DeviceNetwork:
+    """
+    Group of devices of any type with a hash index by `device_id` and a secondary index by
+    (type, location, power).
+
+    The secondary index maps every (type, location, power) combination present in the
+    network to its devices. A group query such as ``find(type="plug", location="Kitchen",
+    power="on")`` reads the matching combinations only, never the whole fleet.
+
+    The indexes follow the registry: every change applied through it moves the device to
+    its new combination. If the registry reloads the fleet, the indexes are rebuilt on the
+    next query.
+
+    Args:
+        registry (DeviceRegistry | None): Registry the devices live in; the default one if None.
+        device_types (tuple[str, ...] | None): `type` values `load()` picks up; every known type if None.
+    """
+
+    def __init__(self, registry: DeviceRegistry | None = None, device_types: tuple[str, ...] | None = None):
+        self.registry = registry or get_registry()
+        self.device_types = device_types
+        self._devices: dict[str, Device] = {}
+        self._keys: dict[str, tuple] = {}
+        # (type, location, power) -> {device_id: None}, used as an ordered set.
+        self._groups: dict[tuple, dict[str, None]] = {}
+        self._generation = self.registry.generation
+        self._lock = threading.Lock()
+        self.registry.subscribe(self._on_change)
+
+    def load(self) -> None:
+        """
+        Replaces the devices of the network with every device of `device_types` in the registry.
+        """
+        if self.device_types is None:
+            records = [record for record in self.registry.devices() if record.get_path('type') in DEVICE_CLASSES]
+        else:
+            records = [record for device_type in self.device_types for record in self.registry.find(type=device_type)]
+        with self._lock:
+            self._clear()
+            for record in records:
+                if record.device_id not in self._devices:
+                    device_class = DEVICE_CLASSES[record.get_path('type')]
+                    self._add(device_class(record.device_id, device_class.__name__, self.registry), record)
+
+    def add(self, device: Device) -> None:
+        """
+        Adds a device object, e.g. a `Bulb`, to the network, replacing one with the same `device_id`.
+        """
+        record = self.registry.get(device.device_id)
+        with self._lock:
+            self._add(device, record)
+
+    def remove(self, device_id: str) -> Device | None:
+        """
+        Removes the device with `device_id` from the network and returns it, or None if it was not in it.
+        """
+        with self._lock:
+            device = self._devices.pop(device_id, None)
+            if device is not None:
+                self._unindex(device_id)
+            return device
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._devices = {}
+        self._keys = {}
+        self._groups = {}
+
+    def _add(self, device: Device, record: DeviceRecord | None) -> None:
+        if device.device_id in self._devices:
+            self._unindex(device.device_id)
+        self._devices[device.device_id] = device
+        self._index(device.device_id, _index_key(record))
+
+    def _index(self, device_id: str, key: tuple) -> None:
+        self._keys[device_id] = key
+        self._groups.setdefault(key, {})[device_id] = None
+
+    def _unindex(self, device_id: str) -> None:
+        key = self._keys.pop(device_id)
+        group = self._groups[key]
+        del group[device_id]
+        if not group:
+            del self._groups[key]
+
+    def _on_change(self, device: DeviceRecord, path: str, old_value, new_value) -> None:
+        if path.partition('.')[0] not in _INDEXED_KEYS:
+            return
+        with self._lock:
+            if device.device_id in self._devices:
+                key = _index_key(device)
+                if key != self._keys[device.device_id]:
+                    self._unindex(device.device_id)
+                    self._index(device.device_id, key)
+
+    def _sync(self) -> None:
+        """
+        Re-indexes every device if the registry has reloaded the fleet since the indexes were built.
+        """
+        if self._generation == self.registry.generation:
+            return
+        generation = self.registry.generation
+        records = {device_id: self.registry.get(device_id) for device_id in list(self._devices)}
+        with self._lock:
+            devices = self._devices
+            self._clear()
+            for device_id, device in devices.items():
+                self._add(device, records.get(device_id))
+            self._generation = generation
+
+    def get(self, device_id: str) -> Device | None:
+        """
+        Returns the device with `device_id`, or None if it is not in the network.
+        """
+        return self._devices.get(device_id)
+
+    def find(self, type: str | None = None, location: str | None = None, power: str | None = None) -> list[Device]:
+        """
+        Returns the devices matching every given filter, e.g. ``find(type="plug", location="Kitchen", power="on")``.
+
+        Power is matched regardless of case.
+        """
+        self._sync()
+        wanted = (type, location, power.lower() if isinstance(power, str) else power)
+        with self._lock:
+            if wanted == (None, None, None):
+                return list(self._devices.values())
+            if None not in wanted:
+                return [self._devices[device_id] for device_id in self._groups.get(wanted, ())]
+            devices = self._devices
+            found = []
+            for key, group in self._groups.items():
+                if all(value is None or value == part for value, part in zip(wanted, key)):
+                    found.extend([devices[device_id] for device_id in group])
+            return found
+
+    def count(self, type: str | None = None, location: str | None = None, power: str | None = None) -> int:
+        """
+        Returns the number of devices `find()` would return for the same filters, without listing them.
+        """
+        self._sync()
+        wanted = (type, location, power.lower() if isinstance(power, str) else power)
+        with self._lock:
+            return sum(
+                len(group) for key, group in self._groups.items()
+                if all(value is None or value == part for value, part in zip(wanted, key))
+            )
+
+    def locations(self) -> list[str]:
+        """
+        Returns every location that has at least one device in the network.
+        """
+        self._sync()
+        with self._lock:
+            return list(dict.fromkeys(key[1] for key in self._groups if key[1] is not None))
+
+    def devices(self) -> list[Device]:
+        with self._lock:
+            return list(self._devices.values())
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._devices
+
+    def __iter__(self) -> Iterator[Device]:
+        return iter(self.devices())
+
+    def close(self) -> None:
+        """
+        Stops following registry changes.
+        """
+        self.registry.unsubscribe(self._on_change)
@@ -0,0 +1,340 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath('..'))
+from json_cache import copy_json
+
+_MISSING = object()
+
+
+def set_path(record: dict, path: str, value) -> None:
+    """
+    Sets `value` under a dotted `path` in a nested dict, creating intermediate dicts as needed.
+    """
+    *parents, key = path.split('.')
+    for part in parents:
+        record = record.setdefault(part, {})
+    record[key] = value
+
+
+def get_path(record: dict, path: str, default=None):
+    """
+    Returns the value under a dotted `path` in a nested dict, or `default` if any part is missing.
+    """
+    for part in path.split('.'):
+        if not isinstance(record, dict) or part not in record:
+            return default
+        record = record[part]
+    return record
+
+
+def del_path(record: dict, path: str) -> None:
+    """
+    Removes the key under a dotted `path` in a nested dict, if present.
+    """
+    *parents, key = path.split('.')
+    for part in parents:
+        record = record.get(part, {})
+    record.pop(key, None)
+
+
+class DeviceState:
+    """
+    Compact `status` of a device.
+
+    `FIELDS` maps the dotted JSON path of every known status value to the slot holding it,
+    in the order they are written back. Unknown values are kept in `extra` under their dotted
+    path, so a record always converts back to the JSON it was read from. Slots that were not
+    present in the JSON stay unset and are left out of `to_json()`.
+    """
+    __slots__ = ('extra',)
+    FIELDS: dict[str, str] = {}
+
+    @classmethod
+    def from_json(cls, status: dict) -> 'DeviceState':
+        state = cls.__new__(cls)
+        state.extra = None
+        fields = cls.FIELDS
+        for key, value in status.items():
+            if isinstance(value, dict) and key in cls._GROUPS:
+                for sub_key, sub_value in value.items():
+                    path = f"{key}.{sub_key}"
+                    if path in fields:
+                        setattr(state, fields[path], sub_value)
+                    else:
+                        state._set_extra(path, sub_value)
+            elif key in fields:
+                setattr(state, fields[key], value)
+            else:
+                state._set_extra(key, value)
+        return state
+
+    def to_json(self) -> dict:
+        status = {}
+        for path, slot in self.FIELDS.items():
+            value = getattr(self, slot, _MISSING)
+            if value is _MISSING:
+                continue
+            if '.' in path:
+                set_path(status, path, value)
+            else:
+                status[path] = value
+        if self.extra:
+            for path, value in self.extra.items():
+                set_path(status, path, value)
+        return status
+
+    def _set_extra(self, path: str, value) -> None:
+        if self.extra is None:
+            self.extra = {}
+        self.extra[path] = copy_json(value)
+
+    def get(self, path: str, default=None):
+        """
+        Returns the status value under a dotted `path`, e.g. ``"brightness"`` or ``"rgb.red"``.
+
+        A group path such as ``"rgb"`` returns the group as a dict.
+        """
+        slot = self.FIELDS.get(path)
+        if slot is not None:
+            return getattr(self, slot, default)
+        if path in self._GROUPS:
+            group = self.to_json().get(path)
+            return default if group is None else group
+        if self.extra:
+            if path in self.extra:
+                return self.extra[path]
+            value = get_path(self.to_json(), path, _MISSING)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def set(self, path: str, value) -> None:
+        """
+        Sets the status value under a dotted `path`. Setting a group replaces all of its values.
+        """
+        slot = self.FIELDS.get(path)
+        if slot is not None:
+            setattr(self, slot, value)
+        elif path in self._GROUPS and isinstance(value, dict):
+            self.delete(path)
+            for sub_key, sub_value in value.items():
+                self.set(f"{path}.{sub_key}", sub_value)
+        else:
+            self._set_extra(path, value)
+
+    def delete(self, path: str) -> None:
+        """
+        Removes the status value (or group of values) under a dotted `path`, if present.
+        """
+        slot = self.FIELDS.get(path)
+        if slot is not None:
+            if hasattr(self, slot):
+                delattr(self, slot)
+            return
+        prefix = path + "."
+        for field_path, field_slot in self.FIELDS.items():
+            if field_path.startswith(prefix) and hasattr(self, field_slot):
+                delattr(self, field_slot)
+        if self.extra:
+            for extra_path in [key for key in self.extra if key == path or key.startswith(prefix)]:
+                del self.extra[extra_path]
+
+    def __eq__(self, other) -> bool:
+        return type(self) is type(other) and self.to_json() == other.to_json()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_json()!r})"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._GROUPS = frozenset(path.split('.')[0] for path in cls.FIELDS if '.' in path)
+
+
+DeviceState._GROUPS = frozenset()
+
+
+class BulbState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'brightness': 'brightness',
+        'color_temp': 'color_temp',
+        'rgb.red': 'red',
+        'rgb.green': 'green',
+        'rgb.blue': 'blue',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class PlugState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'energy_consumption.current_power_w': 'current_power_w',
+        'energy_consumption.total_energy_kwh': 'total_energy_kwh',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class ThermostatState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'target_temperature_c': 'target_temperature_c',
+        'current_temperature_c': 'current_temperature_c',
+        'humidity': 'humidity',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class CurtainState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'position': 'position',
+        'open_percent': 'open_percent',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class WeatherStationState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'temperature_c': 'temperature_c',
+        'humidity_percent': 'humidity_percent',
+        'pressure_hpa': 'pressure_hpa',
+        'wind_speed_kmh': 'wind_speed_kmh',
+        'rainfall_mm': 'rainfall_mm',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class LawnMowerState(DeviceState):
+    FIELDS = {
+        'power': 'power',
+        'battery_percent': 'battery_percent',
+        'cutting_mode': 'cutting_mode',
+        'cutting_height_mm': 'cutting_height_mm',
+        'current_area_m2': 'current_area_m2',
+        'total_cutting_time_minutes': 'total_cutting_time_minutes',
+    }
+    __slots__ = tuple(FIELDS.values())
+
+
+class GenericState(DeviceState):
+    """
+    Status of a device type without a dedicated state class; only `power` gets a slot.
+    """
+    FIELDS = {'power': 'power'}
+    __slots__ = tuple(FIELDS.values())
+
+
+# Device `type` values as stored in devices.json.
+STATE_TYPES: dict[str, type[DeviceState]] = {
+    'bulb': BulbState,
+    'plug': PlugState,
+    'thermostat': ThermostatState,
+    'curtain': CurtainState,
+    'weather_station': WeatherStationState,
+    'lawn_mower': LawnMowerState,
+}
+
+# Values shared by many devices are interned, so every record points to the same string.
+_INTERNED_FIELDS = frozenset(('type', 'brand', 'model', 'location'))
+
+
+class DeviceRecord:
+    """
+    Compact in-memory form of one devices.json entry.
+
+    Top-level values live in slots and `status` is a typed `DeviceState`. Values are
+    addressed by the same dotted paths used in the journal, e.g. ``"status.power"``.
+    """
+    FIELDS = (
+        'device_id', 'device_secret_key', 'name', 'type', 'brand', 'model',
+        'status', 'location', 'connected', 'last_updated',
+    )
+    __slots__ = FIELDS + ('extra',)
+    _FIELD_SET = frozenset(FIELDS)
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'DeviceRecord':
+        record = cls.__new__(cls)
+        record.extra = None
+        for key, value in data.items():
+            if key == 'status':
+                value = STATE_TYPES.get(data.get('type'), GenericState).from_json(value or {})
+            elif key in _INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            elif key not in cls._FIELD_SET:
+                if record.extra is None:
+                    record.extra = {}
+                record.extra[key] = copy_json(value)
+                continue
+            setattr(record, key, value)
+        return record
+
+    def to_json(self) -> dict:
+        data = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                continue
+            data[key] = value.to_json() if key == 'status' else value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def get_path(self, path: str, default=None):
+        """
+        Returns the value under a dotted `path`, e.g. ``"name"`` or ``"status.rgb.red"``.
+        """
+        key, _, rest = path.partition('.')
+        if key == 'status':
+            status = getattr(self, 'status', None)
+            if status is None:
+                return default
+            return status.get(rest, default) if rest else status.to_json()
+        if key in self._FIELD_SET:
+            value = getattr(self, key, default)
+            return get_path(value, rest, default) if rest else value
+        if self.extra and key in self.extra:
+            return get_path(self.extra, path, default)
+        return default
+
+    def set_path(self, path: str, value) -> None:
+        """
+        Sets the value under a dotted `path`.
+        """
+        key, _, rest = path.partition('.')
+        if key == 'status':
+            if not rest:
+                state_type = STATE_TYPES.get(getattr(self, 'type', None), GenericState)
+                self.status = state_type.from_json(value or {})
+                return
+            if not hasattr(self, 'status'):
+                self.status = STATE_TYPES.get(getattr(self, 'type', None), GenericState).from_json({})
+            self.status.set(rest, value)
+        elif key in self._FIELD_SET and not rest:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            set_path(self.extra, path, value)
+
+    def del_path(self, path: str) -> None:
+        """
+        Removes the value under a dotted `path`, if present.
+        """
+        key, _, rest = path.partition('.')
+        if key == 'status' and rest:
+            if hasattr(self, 'status'):
+                self.status.delete(rest)
+        elif key in self._FIELD_SET and not rest:
+            if hasattr(self, key):
+                delattr(self, key)
+        elif self.extra:
+            del_path(self.extra, path)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DeviceRecord) and self.to_json() == other.to_json()
+
+    def __repr__(self) -> str:
+        return f"DeviceRecord({getattr(self, 'device_id', None)!r}, type={getattr(self, 'type', None)!r})"
@@ -0,0 +1,419 @@
+import os
+import threading
+import time
+import types
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from device_records import DeviceRecord
+from state_table import StateTable, FIELDS as STATE_FIELDS
+from device_storage import (
+    FILE_PATH, DeviceStorage, open_storage, load_json, save_json, check_filters, matches,
+)
+from metrics import timed
+
+_MISSING = object()
+# Seconds between checks whether another writer changed the storage; 0 checks on every read.
+REFRESH_INTERVAL = 0.5
+
+
+class DeviceRegistry:
+    """
+    In-memory index of `DeviceRecord`s keyed by `device_id`, backed by a `DeviceStorage`.
+
+    A record is read from storage once and every lookup afterwards is a dict hit. Reads
+    check at most every `refresh_interval` seconds whether another writer changed the
+    storage, and reload the registry if so; not while changes are staged, which a reload
+    would drop. Mutations are staged with `update()` and persisted by `save()`, which hands them
+    to the storage backend as a single commit.
+
+    Inside `batch()` every `save()` is deferred, so any number of changes across any
+    number of devices is committed at once.
+
+    A `StateTable` is opt-in: registries start without one, including those returned by
+    `get_registry()`. With a table attached, hot numeric status values are also written
+    through to the shared memory-mapped table, where `Device` getters read them from.
+
+    Listeners added with `subscribe()` are told about every change as it is applied. When
+    the whole fleet is read again, `generation` is increased instead.
+    """
+
+    def __init__(self, storage: DeviceStorage | str = FILE_PATH, refresh_interval: float = REFRESH_INTERVAL):
+        if isinstance(storage, str):
+            storage = open_storage(storage)
+        self.storage = storage
+        self.refresh_interval = refresh_interval
+        self._checked_at = time.monotonic()
+        self._index: dict[str, DeviceRecord] = {}
+        self._all: list[DeviceRecord] | None = None
+        self._pending: list = []
+        self._undo: list = []
+        self._batch_depth = 0
+        self._batch_start = 0
+        self.state_table: StateTable | None = None
+        self.generation = 0
+        self._listeners: list[Callable[[], Callable | None]] = []
+        self._batch_listeners: list[Callable[[], Callable | None]] = []
+        self._lock = threading.RLock()
+
+    @timed("storage_operation_seconds")
+    def load(self) -> None:
+        """
+        Drops every cached record and reads the whole fleet from storage again.
+        """
+        with self._lock:
+            self.storage.reload()
+            self._index = {}
+            self._all = None
+            self._pending = []
+            self.generation += 1
+            self._all = self._merge(self.storage.load())
+            self._checked_at = time.monotonic()
+
+    def refresh(self) -> bool:
+        """
+        Reloads the registry if another writer changed the storage since it was read.
+
+        Returns:
+            bool: True if the registry was reloaded, False if it was already up to date.
+        """
+        with self._lock:
+            if not self.storage.changed():
+                return False
+            self.load()
+            return True
+
+    def _check_storage(self) -> None:
+        """
+        Reloads the registry if another writer changed the storage, checking at most every
+        `refresh_interval` seconds. Skipped while changes are staged or a batch is open.
+        """
+        if self._batch_depth or self._pending:
+            return
+        now = time.monotonic()
+        if now - self._checked_at < self.refresh_interval:
+            return
+        self._checked_at = now
+        if self.storage.changed():
+            self.load()
+
+    def document(self) -> dict:
+        """
+        Returns a private copy of the whole store in the shape of devices.json.
+
+        Staged changes are saved and the registry is refreshed first, so the copy includes
+        changes other processes committed.
+        """
+        with self._lock:
+            self.save()
+            self.refresh()
+            return self.storage.document()
+
+    def replace_document(self, document: dict) -> None:
+        """
+        Replaces the whole store with `document` in one write and reloads the registry.
+
+        For editors that add or remove devices; staged changes are saved first. Not allowed
+        inside `batch()`.
+        """
+        with self._lock:
+            if self._batch_depth:
+                raise RuntimeError("The store cannot be replaced inside a batch.")
+            self.save()
+            self.storage.replace_document(document)
+            self.load()
+
+    def get(self, device_id: str) -> DeviceRecord | None:
+        """
+        Returns the record of the device with the given `device_id`, or None if not found.
+        """
+        with self._lock:
+            self._check_storage()
+            device = self._index.get(device_id)
+            if device is None and self._all is None:
+                device = self.storage.get(device_id)
+                if device is not None:
+                    self._remember(device)
+            return device
+
+    def __contains__(self, device_id: str) -> bool:
+        return self.get(device_id) is not None
+
+    def devices(self) -> list[DeviceRecord]:
+        """
+        Returns all device records in storage order.
+        """
+        with self._lock:
+            self._check_storage()
+            if self._all is None:
+                self._all = self._merge(self.storage.load())
+            return list(self._all)
+
+    def iter_devices(self) -> Iterator[DeviceRecord]:
+        """
+        Yields all device records lazily, without caching them, unless the whole fleet is already loaded.
+
+        Use it for one-off scans of very large fleets; cached records are yielded in place of
+        their stored copies, so pending changes are visible.
+        """
+        with self._lock:
+            self._check_storage()
+            if self._all is not None:
+                return iter(list(self._all))
+            records = self.storage.iter_devices()
+            cached = dict(self._index)
+        return (cached.get(record.device_id, record) for record in records)
+
+    def find(self, **filters) -> list[DeviceRecord]:
+        """
+        Returns the records matching all `filters`, e.g. ``find(type="plug", location="Kitchen")``.
+
+        Supported filters are `type`, `location` and `power`.
+        """
+        with self._lock:
+            self._check_storage()
+            if self._all is not None:
+                check_filters(filters)
+                return [device for device in self._all if matches(device, filters)]
+            return [device for device in self._merge(self.storage.find(**filters)) if matches(device, filters)]
+
+    def _merge(self, records: list[DeviceRecord]) -> list[DeviceRecord]:
+        """
+        Swaps records that are already cached for the cached objects, which may hold pending changes.
+        """
+        merged = []
+        seen = set()
+        for record in records:
+            device_id = record.device_id
+            if device_id in seen:
+                merged.append(record)
+                continue
+            seen.add(device_id)
+            merged.append(self._index.get(device_id) or self._remember(record))
+        return merged
+
+    def _remember(self, record: DeviceRecord) -> DeviceRecord:
+        """
+        Caches `record` and copies its values into its state table slot.
+
+        Records are remembered when they are read from storage, so the slot is reseeded on
+        every reload; values other processes changed in storage without the table, e.g. by
+        replacing the devices file, do not linger in it.
+        """
+        self._index[record.device_id] = record
+        if self.state_table is not None:
+            self.state_table.store_record(record)
+        return record
+
+    def attach_state_table(self, table: StateTable) -> None:
+        """
+        Starts writing hot status values through to `table` and seeds it with the cached records.
+
+        Getters then read those values from the table, which other processes attached to the
+        same table update in place. Worth it for processes that read hot values far more often
+        than the registry reloads; a plain registry is faster to load.
+
+        Example:
+            registry.attach_state_table(StateTable.for_store("../devices.json"))
+        """
+        with self._lock:
+            self.state_table = table
+            for record in self._index.values():
+                self._remember(record)
+
+    def _sync_state(self, device: DeviceRecord, path: str) -> None:
+        """
+        Copies the state table fields at or below `path` from `device` into the table.
+        """
+        prefix = path + "."
+        for field in STATE_FIELDS:
+            if field == path or field.startswith(prefix):
+                self.state_table.write(device.device_id, field, device.get_path(field))
+
+    @staticmethod
+    def _reference(listener: Callable) -> Callable[[], Callable | None]:
+        if isinstance(listener, types.MethodType):
+            return weakref.WeakMethod(listener)
+        return lambda: listener
+
+    def subscribe(self, listener: Callable[[DeviceRecord, str, object, object], None]) -> None:
+        """
+        Calls ``listener(device, path, old_value, new_value)`` after every change, including rollbacks.
+
+        Missing values are passed as None. Listeners run with the registry lock held and must
+        not block. A bound Python method is held weakly, so subscribing does not keep its object alive.
+        """
+        with self._lock:
+            self._listeners.append(self._reference(listener))
+
+    def unsubscribe(self, listener: Callable) -> None:
+        with self._lock:
+            self._listeners = [ref for ref in self._listeners if ref() not in (None, listener)]
+
+    def subscribe_batches(self, listener: Callable[[bool], None]) -> None:
+        """
+        Calls ``listener(committed)`` when the outermost `batch()` ends: with True once its
+        changes are saved, with False if they were rolled back (after the rollback's changes
+        were reported to `subscribe()` listeners) or could not be saved.
+
+        Listeners run with the registry lock held and are held like those of `subscribe()`.
+        """
+        with self._lock:
+            self._batch_listeners.append(self._reference(listener))
+
+    def unsubscribe_batches(self, listener: Callable) -> None:
+        with self._lock:
+            self._batch_listeners = [ref for ref in self._batch_listeners if ref() not in (None, listener)]
+
+    @property
+    def in_batch(self) -> bool:
+        """
+        True while a `batch()` is open.
+        """
+        return self._batch_depth > 0
+
+    def _notify(self, device: DeviceRecord, path: str, old_value, new_value) -> None:
+        if old_value is _MISSING:
+            old_value = None
+        if new_value is _MISSING:
+            new_value = None
+        dead = False
+        for ref in self._listeners:
+            listener = ref()
+            if listener is None:
+                dead = True
+            else:
+                listener(device, path, old_value, new_value)
+        if dead:
+            self._listeners = [ref for ref in self._listeners if ref() is not None]
+
+    def update(self, device_id: str, changes: dict) -> bool:
+        """
+        Applies `changes` to the device record in memory and stages them for `save()`.
+
+        Keys are dotted paths into the record, e.g. ``{"status.power": "on", "name": "Lamp"}``.
+
+        Returns:
+            bool: True if the device was found and updated, False otherwise.
+        """
+        with self._lock:
+            device = self.get(device_id)
+            if device is None:
+                return False
+            for path, value in changes.items():
+                old_value = _MISSING
+                if self._batch_depth or self._listeners:
+                    old_value = device.get_path(path, _MISSING)
+                if self._batch_depth:
+                    self._undo.append((device, path, old_value))
+                device.set_path(path, value)
+                if self.state_table is not None:
+                    self._sync_state(device, path)
+                self._pending.append([device_id, path, value])
+                if self._listeners:
+                    self._notify(device, path, old_value, value)
+            return True
+
+    @timed("storage_operation_seconds")
+    def save(self) -> None:
+        """
+        Commits the staged changes to storage in one go.
+
+        Does nothing inside `batch()`; the batch saves once when it ends.
+        """
+        with self._lock:
+            if self._batch_depth or not self._pending:
+                return
+            self.storage.commit(self._pending)
+            self._pending = []
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups every change made inside the block into a single commit.
+
+        Reads inside the block see the pending changes. The registry lock is held for the
+        whole block, so other threads cannot interleave their own changes. If the block
+        raises or its changes cannot be saved, the changes made inside it are rolled back.
+        Nested batches join the outermost one.
+        """
+        with self._lock:
+            if not self._batch_depth:
+                self._batch_start = len(self._pending)
+            self._batch_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._rollback()
+                    self._end_batch(False)
+                raise
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                try:
+                    self.save()
+                except BaseException:
+                    self._rollback()
+                    self._end_batch(False)
+                    raise
+                self._undo = []
+                self._end_batch(True)
+
+    def _end_batch(self, committed: bool) -> None:
+        listeners = [ref() for ref in self._batch_listeners]
+        for listener in listeners:
+            if listener is not None:
+                listener(committed)
+        if None in listeners:
+            self._batch_listeners = [ref for ref in self._batch_listeners if ref() is not None]
+
+    def _rollback(self) -> None:
+        for device, path, old_value in reversed(self._undo):
+            current_value = device.get_path(path, _MISSING)
+            if old_value is _MISSING:
+                device.del_path(path)
+            else:
+                device.set_path(path, old_value)
+            if self.state_table is not None:
+                self._sync_state(device, path)
+            if self._listeners:
+                self._notify(device, path, current_value, old_value)
+        self._undo = []
+        del self._pending[self._batch_start:]
+
+    def compact(self, background: bool = False) -> None:
+        """
+        Asks the storage backend to compact itself. Skipped while a batch is open.
+        """
+        with self._lock:
+            if not self._batch_depth:
+                self.storage.compact(background=background)
+
+
+_registries: dict[str, DeviceRegistry] = {}
+_registries_lock = threading.Lock()
+_default_store = FILE_PATH
+
+def use_store(path: str) -> None:
+    """
+    Sets the store (devices.json or a SQLite database) used by `get_registry()` without arguments.
+    """
+    global _default_store
+    _default_store = path
+
+def get_registry(path: str | None = None) -> DeviceRegistry:
+    """
+    Returns the process-wide registry for `path`, creating it on first use.
+
+    Args:
+        path (str | None): Devices file or SQLite database; defaults to the store set by `use_store()`.
+    """
+    path = path or _default_store
+    key = os.path.abspath(path)
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = DeviceRegistry(path)
+        return registry
@@ -0,0 +1,564 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+sys.path.append(os.path.abspath('..'))
+from json_cache import json_cache, load_json_cached, copy_json
+from metrics import count
+from device_journal import DeviceJournal
+from device_records import DeviceRecord
+from device_stream import iter_devices, find_device
+
+FILE_PATH = "../devices.json"
+COMPACT_THRESHOLD = 500
+# Files at least this large are streamed for single lookups instead of being loaded whole.
+STREAM_THRESHOLD = 32 * 1024 * 1024
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+
+# Filters accepted by `DeviceStorage.find`, mapped to their dotted path in a device record.
+FILTER_PATHS = {
+    'type': 'type',
+    'location': 'location',
+    'power': 'status.power',
+}
+
+
+def load_json(file_path = FILE_PATH):
+    """
+    Returns a private copy of the devices file, parsed at most once per change of the file.
+    """
+    return load_json_cached(file_path, copy=True)
+
+def save_json(data, file_path = FILE_PATH):
+    """
+    Writes `data` to `file_path` atomically: a crash mid-write leaves the old file intact.
+    """
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(data, file, indent=4)
+        file.flush()
+        os.fsync(file.fileno())
+        count("json_bytes_written_total", os.fstat(file.fileno()).st_size, target="snapshot")
+    os.replace(tmp_path, file_path)
+
+
+def check_filters(filters: dict) -> None:
+    """
+    Raises ValueError if `filters` names a field that is not in `FILTER_PATHS`.
+    """
+    unknown = set(filters) - set(FILTER_PATHS)
+    if unknown:
+        raise ValueError(f"Unknown device filter(s): {', '.join(sorted(unknown))}")
+
+
+def matches(record: DeviceRecord, filters: dict) -> bool:
+    """
+    Checks whether a device record matches every filter (see `FILTER_PATHS`).
+    """
+    return all(record.get_path(FILTER_PATHS[name]) == value for name, value in filters.items())
+
+
+class DeviceStorage(ABC):
+    """
+    Abstract persistence backend for device records.
+
+    Records are handed out as `DeviceRecord`s and stored in the shape of the devices.json entries.
+    Changes are persisted as lists of ``[device_id, dotted_path, value]`` operations.
+    """
+
+    @abstractmethod
+    def load(self) -> list[DeviceRecord]:
+        """
+        Returns every device record in storage order.
+        """
+
+    @abstractmethod
+    def get(self, device_id: str) -> DeviceRecord | None:
+        """
+        Returns the record with the given `device_id`, or None if not found.
+        """
+
+    @abstractmethod
+    def find(self, **filters) -> list[DeviceRecord]:
+        """
+        Returns the records matching all `filters`, e.g. ``find(type="plug", power="on")``.
+        """
+
+    @abstractmethod
+    def commit(self, ops: list) -> None:
+        """
+        Persists a list of ``[device_id, path, value]`` operations as one unit.
+        """
+
+    def iter_devices(self) -> Iterator[DeviceRecord]:
+        """
+        Yields every device record lazily, in storage order.
+        """
+        return iter(self.load())
+
+    def document(self) -> dict:
+        """
+        Returns a private copy of the whole store in the shape of devices.json.
+        """
+        return {'devices': [copy_json(record.to_json()) for record in self.load()]}
+
+    @abstractmethod
+    def replace_document(self, document: dict) -> None:
+        """
+        Replaces the whole store with `document`, a dict in the shape of devices.json.
+
+        Used by editors that add or remove devices, which `commit()` cannot express.
+        """
+
+    def changed(self) -> bool:
+        """
+        Returns True if another writer changed the storage since it was read.
+        """
+        return False
+
+    def reload(self) -> None:
+        """
+        Drops anything the backend keeps in memory, so the next read goes to disk.
+        """
+
+    def compact(self, background: bool = False) -> None:
+        """
+        Rewrites the storage into its most compact form, if the backend supports it.
+        """
+
+    def close(self) -> None:
+        """
+        Releases any resources held by the backend.
+        """
+
+
+class JsonFileStorage(DeviceStorage):
+    """
+    devices.json snapshot plus an append-only journal of changes.
+
+    Each `commit()` appends one record to the journal next to the devices file. Once the
+    journal holds `compact_threshold` records it is folded into a fresh snapshot on a
+    background thread.
+
+    While the document is not loaded, files of `stream_threshold` bytes or more are
+    streamed for `get()` and `iter_devices()`, so they run in bounded memory.
+    """
+
+    def __init__(self, file_path: str = FILE_PATH, compact_threshold: int = COMPACT_THRESHOLD,
+                 stream_threshold: int = STREAM_THRESHOLD):
+        self.file_path = file_path
+        self.compact_threshold = compact_threshold
+        self.stream_threshold = stream_threshold
+        self.journal = DeviceJournal(file_path)
+        self._document: dict | None = None
+        self._records: list[DeviceRecord] = []
+        self._signature: tuple | None = None
+        # Signature of the snapshot when records were first streamed from it without loading it.
+        self._streamed: tuple | None = None
+        # Whether the files changed between two streamed reads.
+        self._stale = False
+        self._index: dict[str, DeviceRecord] = {}
+        self._lock = threading.RLock()
+        self._compaction: threading.Thread | None = None
+
+    def _read_disk(self) -> tuple[tuple, dict, list[DeviceRecord], dict[str, DeviceRecord]]:
+        """
+        Loads the snapshot as records, replays the journal on top of them and indexes them by `device_id`.
+
+        When a `device_id` occurs more than once, the first record wins, the same as a linear scan.
+        If another process compacts the store in between, the files are read again.
+
+        Returns:
+            tuple: The snapshot's signature, the snapshot, its records and the index.
+        """
+        while True:
+            signature = json_cache.signature(self.file_path)
+            document = load_json_cached(self.file_path)
+            records = [DeviceRecord.from_json(device) for device in document.get('devices', [])]
+            index = {}
+            for record in records:
+                index.setdefault(record.device_id, record)
+            for device_id, path, value in self.journal.replay():
+                if device_id in index:
+                    index[device_id].set_path(path, value)
+            if json_cache.signature(self.file_path) == signature:
+                return signature, document, records, index
+
+    def _ensure_loaded(self) -> None:
+        if self._document is not None:
+            return
+        self._signature, document, self._records, self._index = self._read_disk()
+        # Other top-level keys are kept as they are, `devices` is rebuilt from the records.
+        self._document = {key: None if key == 'devices' else copy_json(value) for key, value in document.items()}
+
+    def _should_stream(self) -> bool:
+        return self._document is None and os.path.getsize(self.file_path) >= self.stream_threshold
+
+    def _start_stream(self) -> None:
+        """
+        Notes that records are about to be streamed, so `changed()` covers them as well.
+        """
+        if self._streamed is None:
+            self._streamed = json_cache.signature(self.file_path)
+        elif self._disk_changed(self._streamed):
+            self._stale = True
+
+    def _journal_ops_by_device(self) -> dict[str, list]:
+        ops_by_device = {}
+        for device_id, path, value in self.journal.replay():
+            ops_by_device.setdefault(device_id, []).append((path, value))
+        return ops_by_device
+
+    def load(self) -> list[DeviceRecord]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._records)
+
+    def get(self, device_id: str) -> DeviceRecord | None:
+        with self._lock:
+            if self._should_stream():
+                self._start_stream()
+                device = find_device(self.file_path, device_id)
+                if device is None:
+                    return None
+                record = DeviceRecord.from_json(device)
+                for path, value in self._journal_ops_by_device().get(device_id, []):
+                    record.set_path(path, value)
+                return record
+            self._ensure_loaded()
+            return self._index.get(device_id)
+
+    def iter_devices(self) -> Iterator[DeviceRecord]:
+        """
+        Yields every device record with the journal applied, streaming the file if it is large.
+        """
+        with self._lock:
+            if not self._should_stream():
+                self._ensure_loaded()
+                return iter(list(self._records))
+            self._start_stream()
+            ops_by_device = self._journal_ops_by_device()
+
+        def stream():
+            seen = set()
+            for device in iter_devices(self.file_path):
+                record = DeviceRecord.from_json(device)
+                if record.device_id not in seen:
+                    seen.add(record.device_id)
+                    for path, value in ops_by_device.get(record.device_id, []):
+                        record.set_path(path, value)
+                yield record
+
+        return stream()
+
+    def find(self, **filters) -> list[DeviceRecord]:
+        check_filters(filters)
+        with self._lock:
+            self._ensure_loaded()
+            return [record for record in self._records if matches(record, filters)]
+
+    def commit(self, ops: list) -> None:
+        """
+        Applies `ops` to the loaded records and appends them to the journal as one record.
+
+        Records handed out by `get()`/`load()` are the storage's own objects, so ops the caller
+        already applied to them are simply applied again.
+        """
+        with self.journal.locked(), self._lock:
+            if self._document is not None:
+                for device_id, path, value in ops:
+                    if device_id in self._index:
+                        self._index[device_id].set_path(path, value)
+            self.journal.append(ops)
+            full = self.journal.record_count >= self.compact_threshold
+        if full:
+            self.compact(background=True)
+
+    def changed(self) -> bool:
+        """
+        Returns True if another process replaced the devices file or wrote to the journal since it was read.
+        """
+        with self._lock:
+            if self._document is not None:
+                return self._disk_changed(self._signature)
+            if self._streamed is not None:
+                return self._stale or self._disk_changed(self._streamed)
+            return False
+
+    def _disk_changed(self, signature: tuple) -> bool:
+        return json_cache.signature(self.file_path) != signature or self.journal.unread()
+
+    def reload(self) -> None:
+        with self._lock:
+            self._streamed = None
+            self._stale = False
+            self._document = None
+            self._records = []
+            self._index = {}
+
+    def document(self) -> dict:
+        with self._lock:
+            self._ensure_loaded()
+            devices = [copy_json(record.to_json()) for record in self._records]
+            document = {key: devices if key == 'devices' else copy_json(value) for key, value in self._document.items()}
+            document.setdefault('devices', devices)
+            return document
+
+    def replace_document(self, document: dict) -> None:
+        """
+        Writes `document` as the new snapshot and empties the journal, so no journal record
+        written before is replayed on top of it. The loaded records are dropped.
+        """
+        with self.journal.locked(), self._lock:
+            save_json(document, self.file_path)
+            self.journal.discard_until(self.journal.size())
+            self.reload()
+
+    def compact(self, background: bool = False) -> None:
+        """
+        Folds the journal into a fresh snapshot of the devices file.
+
+        The journal is locked for the whole compaction, so no other process appends to it or
+        compacts it meanwhile, and records other processes appended since it was last read
+        are replayed first. The snapshot is written atomically and only the journal records
+        it covers are dropped.
+
+        Args:
+            background (bool): If True, the snapshot is written on a separate thread.
+        """
+        with self._lock:
+            if self._compaction and self._compaction.is_alive():
+                return
+            if background:
+                self._compaction = threading.Thread(target=self._write_snapshot, daemon=True)
+                self._compaction.start()
+                return
+        self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        with self.journal.locked():
+            with self._lock:
+                current = (self._document is not None and not self.journal.rewritten()
+                           and json_cache.signature(self.file_path) == self._signature)
+                if current:
+                    for device_id, path, value in self.journal.replay_tail():
+                        if device_id in self._index:
+                            self._index[device_id].set_path(path, value)
+                    document, records = self._document, self._records
+                else:
+                    # Another process compacted the store, or it is not loaded: the snapshot
+                    # is built from the files, and the loaded records stay as they are until
+                    # `reload()`, which `changed()` keeps asking for.
+                    _, document, records, _ = self._read_disk()
+                devices = [record.to_json() for record in records]
+                snapshot = {
+                    key: devices if key == 'devices' else value for key, value in document.items()
+                }
+                snapshot.setdefault('devices', devices)
+                offset = self.journal.offset
+
+            save_json(snapshot, self.file_path)
+            self.journal.discard_until(offset)
+            if current:
+                with self._lock:
+                    self._signature = json_cache.signature(self.file_path)
+
+    def close(self) -> None:
+        """
+        Waits for a running background compaction to finish.
+        """
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+
+class SqliteStorage(DeviceStorage):
+    """
+    Embedded SQLite database holding one row per device.
+
+    `device_id`, `type`, `location` and `power` are indexed columns, so point lookups and
+    filtered scans stay fast with large fleets. The full record, including the nested
+    `status`, is kept as JSON and updated in place with SQLite's `json_set`. The database
+    runs in WAL mode, so readers are not blocked by a writer.
+
+    Commits of other connections are noticed through SQLite's `data_version`, which every
+    connection compares with the value it saw when it first read after a `reload()`.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS devices (
+            device_id TEXT PRIMARY KEY,
+            type TEXT,
+            location TEXT,
+            power TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_devices_type ON devices (type);
+        CREATE INDEX IF NOT EXISTS idx_devices_location ON devices (location);
+        CREATE INDEX IF NOT EXISTS idx_devices_power ON devices (power);
+    """
+
+    # Record paths mirrored into their own column.
+    COLUMN_PATHS = {'type': 'type', 'location': 'location', 'status.power': 'power'}
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection to the database, opening it on first use.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _data_version(self) -> int:
+        return self._connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def _reading(self) -> sqlite3.Connection:
+        """
+        Returns this thread's connection, noting the data version of the first read since `reload()`.
+        """
+        connection = self._connection()
+        if getattr(self._local, 'version', None) is None:
+            self._local.version = self._data_version()
+        return connection
+
+    def changed(self) -> bool:
+        """
+        Returns True if another connection committed since this thread first read after `reload()`.
+        """
+        version = getattr(self._local, 'version', None)
+        return version is not None and self._data_version() != version
+
+    def reload(self) -> None:
+        self._local.version = None
+
+    def load(self) -> list[DeviceRecord]:
+        rows = self._reading().execute("SELECT record FROM devices ORDER BY rowid")
+        return [DeviceRecord.from_json(json.loads(record)) for (record,) in rows]
+
+    def iter_devices(self) -> Iterator[DeviceRecord]:
+        rows = self._reading().execute("SELECT record FROM devices ORDER BY rowid")
+        return (DeviceRecord.from_json(json.loads(record)) for (record,) in rows)
+
+    def get(self, device_id: str) -> DeviceRecord | None:
+        row = self._reading().execute(
+            "SELECT record FROM devices WHERE device_id = ?", (device_id,)
+        ).fetchone()
+        return DeviceRecord.from_json(json.loads(row[0])) if row else None
+
+    def find(self, **filters) -> list[DeviceRecord]:
+        check_filters(filters)
+        where = " AND ".join(f"{name} = ?" for name in filters) or "1"
+        rows = self._reading().execute(
+            f"SELECT record FROM devices WHERE {where} ORDER BY rowid", tuple(filters.values())
+        )
+        return [DeviceRecord.from_json(json.loads(record)) for (record,) in rows]
+
+    @classmethod
+    def _overlapping_columns(cls, path: str) -> list[str]:
+        """
+        Returns the mirrored columns an assignment to `path` may change, other than the one
+        at exactly `path`: those below `path` (e.g. `power` for ``status``) or above it.
+        """
+        return [
+            column for column_path, column in cls.COLUMN_PATHS.items()
+            if column_path != path and (column_path.startswith(path + '.') or path.startswith(column_path + '.'))
+        ]
+
+    def commit(self, ops: list) -> None:
+        connection = self._connection()
+        # device_id -> mirrored columns to read back from the updated record.
+        rederive: dict[str, set[str]] = {}
+        with connection:
+            for device_id, path, value in ops:
+                assignments = "record = json_set(record, ?, json(?))"
+                params = [f"$.{path}", json.dumps(value)]
+                column = self.COLUMN_PATHS.get(path)
+                if column is not None:
+                    assignments += f", {column} = ?"
+                    params.append(value)
+                connection.execute(
+                    f"UPDATE devices SET {assignments} WHERE device_id = ?", (*params, device_id)
+                )
+                overlapping = self._overlapping_columns(path)
+                if overlapping:
+                    rederive.setdefault(device_id, set()).update(overlapping)
+            paths = {column: column_path for column_path, column in self.COLUMN_PATHS.items()}
+            for device_id, columns in rederive.items():
+                if columns:
+                    assignments = ", ".join(f"{column} = json_extract(record, '$.{paths[column]}')"
+                                            for column in sorted(columns))
+                    connection.execute(f"UPDATE devices SET {assignments} WHERE device_id = ?", (device_id,))
+
+    def replace_document(self, document: dict) -> None:
+        records = [DeviceRecord.from_json(device) for device in document.get('devices', [])]
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM devices")
+            self._insert(connection, records)
+
+    def import_records(self, records: list[DeviceRecord]) -> int:
+        """
+        Inserts device records, skipping any `device_id` that is already stored.
+
+        Returns:
+            int: Number of records inserted.
+        """
+        connection = self._connection()
+        with connection:
+            return self._insert(connection, records)
+
+    @staticmethod
+    def _insert(connection: sqlite3.Connection, records: list[DeviceRecord]) -> int:
+        cursor = connection.executemany(
+            "INSERT OR IGNORE INTO devices (device_id, type, location, power, record) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    record.device_id,
+                    record.get_path('type'),
+                    record.get_path('location'),
+                    record.get_path('status.power'),
+                    json.dumps(record.to_json()),
+                )
+                for record in records
+            ),
+        )
+        return cursor.rowcount
+
+    def close(self) -> None:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def open_storage(path: str) -> DeviceStorage:
+    """
+    Opens the storage backend matching the file extension of `path`.
+
+    ``.db``, ``.sqlite`` and ``.sqlite3`` files open as `SqliteStorage`, anything else as `JsonFileStorage`.
+    """
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return SqliteStorage(path)
+    return JsonFileStorage(path)
+
+
+if __name__ == '__main__':
+    # Migrates devices.json into a SQLite database: python device_storage.py ../devices.db
+    target = sys.argv[1] if len(sys.argv) > 1 else "../devices.db"
+    source = sys.argv[2] if len(sys.argv) > 2 else FILE_PATH
+    inserted = SqliteStorage(target).import_records(JsonFileStorage(source).load())
+    print(f"{inserted} devices imported into {target}.")
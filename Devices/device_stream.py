@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import sys
+from typing import Iterator
+
+sys.path.append(os.path.abspath('..'))
+from metrics import count
+
+CHUNK_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _Reader:
+    """
+    Incremental JSON value reader over a text file, holding only a small window in memory.
+    """
+
+    def __init__(self, file, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """
+        Drops the consumed part of the buffer and reads the next chunk. Returns False at end of file.
+        """
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        count("json_bytes_read_total", len(chunk), source="stream")
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def peek(self) -> str:
+        """
+        Skips whitespace and returns the next character without consuming it ('' at end of file).
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        """
+        Decodes the next complete JSON value, reading more of the file until it is complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the very end of the buffer may continue in the next chunk.
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_devices(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Yields the records of the top-level `devices` array one by one without loading the whole file.
+
+    Memory use is bounded by `chunk_size` plus the size of a single device record.
+
+    Args:
+        file_path (str): Path to the devices file.
+        chunk_size (int): Number of characters read from the file at a time.
+    """
+    with open(file_path, 'r') as file:
+        reader = _Reader(file, chunk_size)
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'devices':
+                reader.expect('[')
+                if reader.peek() == ']':
+                    return
+                while True:
+                    yield reader.value()
+                    if reader.peek() == ']':
+                        return
+                    reader.expect(',')
+            reader.value()
+            if reader.peek() == '}':
+                return
+            reader.expect(',')
+
+
+def find_device(file_path: str, device_id: str, chunk_size: int = CHUNK_SIZE) -> dict | None:
+    """
+    Streams the devices file and returns the first record with `device_id`, stopping as soon as it is found.
+    """
+    for device in iter_devices(file_path, chunk_size):
+        if device.get('device_id') == device_id:
+            return device
+    return None
@@ -1,40 +1,39 @@
 from device import NotCompatibleDevice, Device, load_json
+from device_registry import DeviceRegistry
 
 class Plug(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
     def get_current_power_usage(self) -> str:
         """
         Get the total power usage of the device.
 
-        This method loads the JSON data from the file, iterates through the devices,
-        and returns the total energy consumption in kWh for the device with the matching device_id.
+        This method looks up the device in the registry and returns the total energy
+        consumption in kWh for the device with the matching device_id.
 
         :return: The total energy consumption in kWh as a string. If the device is not found,
                  it returns "Power usage not available".
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return device['status']['energy_consumption']['current_power_w']
-        return "Power usage not available"
+        device = self.registry.get(self.device_id)
+        if device is None:
+            return "Power usage not available"
+        return device.status.get('energy_consumption.current_power_w')
 
     def get_total_power_usage(self) -> str:
         """
         Get the total power usage of the device.
 
-        This method loads the JSON data from the file, iterates through the devices,
-        and returns the total energy consumption in kWh for the device with the matching device_id.
+        This method looks up the device in the registry and returns the total energy
+        consumption in kWh for the device with the matching device_id.
 
         :return: The total energy consumption in kWh as a string. If the device is not found,
                  it returns "Power usage not available".
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return device['status']['energy_consumption']['total_energy_kwh']
-        return "Power usage not available"
+        device = self.registry.get(self.device_id)
+        if device is None:
+            return "Power usage not available"
+        return device.status.get('energy_consumption.total_energy_kwh')
 
 
 if __name__ == "__main__":
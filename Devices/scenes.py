@@ -0,0 +1,189 @@
+import os
+import sys
+
+sys.path.append(os.path.abspath('..'))
+from json_cache import load_json_cached, copy_json
+from device import current_timestamp
+from device_registry import DeviceRegistry, get_registry, FILE_PATH, save_json
+from device_storage import check_filters
+from metrics import timed
+
+SCENES_PATH = os.path.join(os.path.dirname(FILE_PATH), "scenes.json")
+
+_MISSING = object()
+
+
+class SceneNotFound(Exception):
+    """
+    Exception raised when a scene with the given name does not exist
+    """
+
+
+class Scene:
+    """
+    Named preset of target values for many devices.
+
+    Every target either names one device or selects a group of devices with the registry
+    filters (`type`, `location`, `power`), and maps dotted record paths to their values:
+
+        {"device_id": "1234567890abcdef", "set": {"status.brightness": 30}}
+        {"type": "curtain", "location": "Living Room", "set": {"status.position": 0}}
+
+    Targets are applied in order, so a later target overrides an earlier one for the same value.
+    """
+
+    def __init__(self, name: str, targets: list[dict]):
+        self.name = name
+        self.targets = targets
+        for target in targets:
+            check_filters({key: value for key, value in target.items() if key not in ('device_id', 'set')})
+
+    @classmethod
+    def from_json(cls, name: str, data: dict) -> 'Scene':
+        return cls(name, copy_json(data.get('targets', [])))
+
+    def to_json(self) -> dict:
+        return {"targets": copy_json(self.targets)}
+
+    def resolve(self, registry: DeviceRegistry) -> dict[str, dict]:
+        """
+        Returns the target values of every device the scene touches, keyed by `device_id`.
+
+        Devices that are not in the registry are left out.
+        """
+        values: dict[str, dict] = {}
+        for target in self.targets:
+            if 'device_id' in target:
+                device_ids = [target['device_id']] if target['device_id'] in registry else []
+            else:
+                filters = {key: value for key, value in target.items() if key != 'set'}
+                device_ids = [device.device_id for device in registry.find(**filters)]
+            for device_id in device_ids:
+                values.setdefault(device_id, {}).update(target.get('set', {}))
+        return values
+
+    def __repr__(self) -> str:
+        return f"Scene({self.name!r}, {len(self.targets)} targets)"
+
+
+class SceneEngine:
+    """
+    Stores scenes in scenes.json next to devices.json and applies them to the registry.
+
+    Activating a scene compares every target value with the device's current value and
+    applies only the differences, all inside one registry batch: the whole scene is one
+    commit (one journal append or one SQLite transaction) and every changed device gets
+    the same 'last_updated' stamp.
+    """
+
+    def __init__(self, registry: DeviceRegistry | None = None, scenes_path: str = SCENES_PATH):
+        self.registry = registry or get_registry()
+        self.scenes_path = scenes_path
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.scenes_path):
+            return {"scenes": {}}
+        return load_json_cached(self.scenes_path)
+
+    def scenes(self) -> dict[str, Scene]:
+        """
+        Returns every stored scene by name.
+        """
+        return {name: Scene.from_json(name, data) for name, data in self._load().get('scenes', {}).items()}
+
+    def get(self, name: str) -> Scene:
+        """
+        Returns the scene called `name`.
+
+        Raises:
+            SceneNotFound: If there is no such scene.
+        """
+        data = self._load().get('scenes', {}).get(name)
+        if data is None:
+            raise SceneNotFound(name)
+        return Scene.from_json(name, data)
+
+    def save_scene(self, scene: Scene) -> None:
+        """
+        Stores `scene`, replacing a scene with the same name.
+        """
+        document = copy_json(self._load())
+        document.setdefault('scenes', {})[scene.name] = scene.to_json()
+        save_json(document, self.scenes_path)
+
+    def delete_scene(self, name: str) -> bool:
+        """
+        Removes the scene called `name`. Returns False if there was no such scene.
+        """
+        document = copy_json(self._load())
+        if document.get('scenes', {}).pop(name, None) is None:
+            return False
+        save_json(document, self.scenes_path)
+        return True
+
+    def capture(self, name: str, device_ids: list[str], paths: list[str]) -> Scene:
+        """
+        Builds a scene holding the current values of `paths` of the given devices, e.g. to save
+        the current lighting as "evening". The scene is returned, not stored.
+        """
+        targets = []
+        for device_id in device_ids:
+            device = self.registry.get(device_id)
+            if device is None:
+                continue
+            values = {path: device.get_path(path, _MISSING) for path in paths}
+            targets.append({
+                "device_id": device_id,
+                "set": {path: value for path, value in values.items() if value is not _MISSING},
+            })
+        return Scene(name, targets)
+
+    def diff(self, scene: Scene | str) -> dict[str, dict]:
+        """
+        Returns the changes activating `scene` would make: for every device whose current
+        values differ from the scene, the differing paths and their target values.
+        """
+        if isinstance(scene, str):
+            scene = self.get(scene)
+        changes = {}
+        for device_id, values in scene.resolve(self.registry).items():
+            device = self.registry.get(device_id)
+            if device is None:
+                continue
+            differing = {
+                path: value for path, value in values.items()
+                if device.get_path(path, _MISSING) != value
+            }
+            if differing:
+                changes[device_id] = differing
+        return changes
+
+    @timed("device_operation_seconds")
+    def activate(self, scene: Scene | str) -> dict[str, dict]:
+        """
+        Applies `scene` (or the stored scene with that name) in a single commit.
+
+        Values that already match are skipped; if nothing differs, nothing is written.
+        If the commit fails, no device is changed.
+
+        Returns:
+            dict[str, dict]: The applied changes by `device_id`, as returned by `diff()`.
+        """
+        with self.registry.batch():
+            changes = self.diff(scene)
+            if changes:
+                timestamp = current_timestamp()
+                for device_id, values in changes.items():
+                    self.registry.update(device_id, {**values, 'last_updated': timestamp})
+        return changes
+
+
+if __name__ == '__main__':
+    engine = SceneEngine()
+    if len(sys.argv) > 1:
+        for scene_name in sys.argv[1:]:
+            print(f"{scene_name}: {engine.activate(scene_name)}")
+    else:
+        print('====List of scenes====\n')
+        for scene in engine.scenes().values():
+            print(scene)
@@ -0,0 +1,247 @@
+import math
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: slot allocation is only serialised within one process
+    fcntl = None
+
+STATE_SUFFIX = ".state"
+INDEX_SUFFIX = ".idx"
+INITIAL_CAPACITY = 1024
+
+_MISSING = object()
+_INT_UNSET = -2 ** 31
+_POWER_CODES = {"on": 1, "off": 2, "ON": 3, "OFF": 4}
+_POWER_VALUES = {code: value for value, code in _POWER_CODES.items()}
+
+# One fixed-size record per device: power code, int flags, six int32 and four float64 values,
+# padded to 64 bytes.
+RECORD = struct.Struct('<BB2x6i4d4x')
+
+_POWER = struct.Struct('<B')
+# Bit set per float field that holds an int in the device record, so it reads back as one.
+_INT_FLAGS = struct.Struct('<B')
+_INT_FLAGS_OFFSET = 1
+_INT = struct.Struct('<i')
+_FLOAT = struct.Struct('<d')
+
+# Record path -> (kind, byte offset inside the record).
+FIELDS = {
+    'status.power': ('power', 0),
+    'status.brightness': ('int', 4),
+    'status.color_temp': ('int', 8),
+    'status.rgb.red': ('int', 12),
+    'status.rgb.green': ('int', 16),
+    'status.rgb.blue': ('int', 20),
+    'status.battery_percent': ('int', 24),
+    'status.target_temperature_c': ('float', 28),
+    'status.current_temperature_c': ('float', 36),
+    'status.open_percent': ('float', 44),
+    'status.position': ('float', 52),
+}
+
+_FLOAT_BITS = {path: 1 << number for number, path in enumerate(path for path, (kind, _) in FIELDS.items() if kind == 'float')}
+# Largest int a float64 holds exactly.
+_MAX_EXACT_INT = 2 ** 53
+
+_EMPTY_RECORD = RECORD.pack(0, 0, *([_INT_UNSET] * 6), *([math.nan] * 4))
+
+
+class StateTable:
+    """
+    Memory-mapped table of the small numeric status values that getters read most often.
+
+    Every device gets one fixed-size record in `<path>` and the order in which devices got
+    their records is kept in `<path>.idx`, one `device_id` per line. Values are read and
+    written in place, so every process mapping the same file (terminal UI, GUI, scripts)
+    sees changes immediately without parsing or rewriting any JSON.
+
+    A value that cannot be stored exactly (an unknown power string, a fractional brightness)
+    is marked as unset, and readers fall back to the device store. Float fields read back
+    ints as ints, so values have the same type with or without the table.
+
+    Growing the file maps it again; earlier maps stay open until `close()`, so readers
+    still holding one never read from a closed map.
+    """
+
+    def __init__(self, path: str, initial_capacity: int = INITIAL_CAPACITY):
+        self.path = path
+        self.index_path = path + INDEX_SUFFIX
+        self._slots: dict[str, int] = {}
+        self._index_offset = 0
+        self._lock = threading.Lock()
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as file:
+                file.write(_EMPTY_RECORD * initial_capacity)
+        open(self.index_path, 'a').close()
+        self._file = open(path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._old_maps: list[mmap.mmap] = []
+        self._read_index()
+
+    @classmethod
+    def for_store(cls, store_path: str) -> 'StateTable':
+        """
+        Opens the table kept next to a device store, e.g. ``devices.json.state``.
+        """
+        return cls(store_path + STATE_SUFFIX)
+
+    def _read_index(self) -> None:
+        """
+        Picks up `device_id`s appended to the index file since it was last read.
+        """
+        if os.path.getsize(self.index_path) == self._index_offset:
+            return
+        with open(self.index_path, 'r') as file:
+            file.seek(self._index_offset)
+            for line in file:
+                if not line.endswith("\n"):
+                    break
+                self._slots.setdefault(line[:-1], len(self._slots))
+                self._index_offset += len(line.encode())
+
+    def _ensure_mapped(self, slot: int) -> None:
+        """
+        Grows the file (doubling it) and remaps it so that `slot` fits.
+        """
+        needed = (slot + 1) * RECORD.size
+        if needed <= len(self._map):
+            return
+        size = os.path.getsize(self.path)
+        if size < needed:
+            capacity = max(size, RECORD.size)
+            while capacity < needed:
+                capacity *= 2
+            self._file.seek(size)
+            self._file.write(_EMPTY_RECORD * ((capacity - size) // RECORD.size))
+            self._file.flush()
+        self._old_maps.append(self._map)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def slot(self, device_id: str) -> int | None:
+        """
+        Returns the slot of `device_id`, or None if the device has no record yet.
+        """
+        slot = self._slots.get(device_id)
+        if slot is None:
+            with self._lock:
+                self._read_index()
+                slot = self._slots.get(device_id)
+        return slot
+
+    def add(self, device_id: str) -> tuple[int, bool]:
+        """
+        Returns the slot of `device_id`, allocating an empty record if needed.
+
+        Returns:
+            tuple[int, bool]: The slot and whether it was created by this call.
+        """
+        slot = self._slots.get(device_id)
+        if slot is not None:
+            return slot, False
+        with self._lock, open(self.index_path, 'a') as index_file:
+            if fcntl is not None:
+                fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                self._read_index()
+                if device_id in self._slots:
+                    return self._slots[device_id], False
+                slot = len(self._slots)
+                self._ensure_mapped(slot)
+                self._map[slot * RECORD.size:(slot + 1) * RECORD.size] = _EMPTY_RECORD
+                line = device_id + "\n"
+                index_file.write(line)
+                index_file.flush()
+                self._slots[device_id] = slot
+                self._index_offset += len(line.encode())
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(index_file, fcntl.LOCK_UN)
+        return slot, True
+
+    def read(self, device_id: str, path: str, default=None):
+        """
+        Returns the value under record `path` for `device_id`, or `default` if it is unset or unknown.
+        """
+        field = FIELDS.get(path)
+        slot = self.slot(device_id)
+        if field is None or slot is None:
+            return default
+        kind, offset = field
+        start = slot * RECORD.size
+        mapping = self._map
+        if start + RECORD.size > len(mapping):
+            with self._lock:
+                self._ensure_mapped(slot)
+                mapping = self._map
+        position = start + offset
+        if kind == 'power':
+            return _POWER_VALUES.get(_POWER.unpack_from(mapping, position)[0], default)
+        if kind == 'int':
+            value = _INT.unpack_from(mapping, position)[0]
+            return default if value == _INT_UNSET else value
+        # Flags before the value: `write()` unsets the value before it changes the flags.
+        is_int = _INT_FLAGS.unpack_from(mapping, start + _INT_FLAGS_OFFSET)[0] & _FLOAT_BITS[path]
+        value = _FLOAT.unpack_from(mapping, position)[0]
+        if math.isnan(value):
+            return default
+        return int(value) if is_int else value
+
+    def write(self, device_id: str, path: str, value) -> bool:
+        """
+        Writes `value` under record `path` for `device_id` in place.
+
+        Returns:
+            bool: True if the value was stored, False if `path` is not a table field or the
+            value cannot be stored exactly (the field is then marked unset).
+        """
+        field = FIELDS.get(path)
+        if field is None:
+            return False
+        slot, _ = self.add(device_id)
+        kind, offset = field
+        start = slot * RECORD.size
+        mapping = self._map
+        position = start + offset
+        if kind == 'power':
+            code = _POWER_CODES.get(value, 0) if isinstance(value, str) else 0
+            _POWER.pack_into(mapping, position, code)
+            return code != 0
+        if kind == 'int':
+            stored = isinstance(value, int) and not isinstance(value, bool) and _INT_UNSET < value < 2 ** 31
+            _INT.pack_into(mapping, position, value if stored else _INT_UNSET)
+            return stored
+        is_int = isinstance(value, int) and not isinstance(value, bool)
+        stored = isinstance(value, float) or (is_int and abs(value) <= _MAX_EXACT_INT)
+        flags_position = start + _INT_FLAGS_OFFSET
+        flags = _INT_FLAGS.unpack_from(mapping, flags_position)[0]
+        flags = flags | _FLOAT_BITS[path] if is_int else flags & ~_FLOAT_BITS[path]
+        # Unset first, so a reader that sees the new flags never reads the old value with them.
+        _FLOAT.pack_into(mapping, position, math.nan)
+        _INT_FLAGS.pack_into(mapping, flags_position, flags)
+        _FLOAT.pack_into(mapping, position, float(value) if stored else math.nan)
+        return stored
+
+    def store_record(self, record) -> None:
+        """
+        Writes every table field of a `DeviceRecord` into the table.
+        """
+        for path in FIELDS:
+            self.write(record.device_id, path, record.get_path(path))
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._read_index()
+            return len(self._slots)
+
+    def close(self) -> None:
+        for mapping in self._old_maps:
+            mapping.close()
+        self._old_maps = []
+        self._map.close()
+        self._file.close()
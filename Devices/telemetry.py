@@ -0,0 +1,427 @@
+import atexit
+import math
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.abspath('..'))
+from clock import Clock, get_clock
+from metrics import count
+from device_records import DeviceRecord
+from device_registry import DeviceRegistry, FILE_PATH, get_registry
+
+TELEMETRY_DIR = os.path.join(os.path.dirname(FILE_PATH), "telemetry")
+SEGMENT_SIZE = 64 * 1024
+# Readings older than this many seconds are dropped by `apply_retention()`.
+RETENTION = 365 * 24 * 3600
+READING_DTYPE = np.dtype([('time', '<f8'), ('value', '<f8')])
+SEGMENT_SUFFIX = ".npy"
+
+# Recorded fields per device type: field path -> metric name.
+TELEMETRY_FIELDS = {
+    "weather_station": {
+        "status.temperature_c": "temperature_c",
+        "status.humidity_percent": "humidity_percent",
+        "status.pressure_hpa": "pressure_hpa",
+        "status.wind_speed_kmh": "wind_speed_kmh",
+        "status.rainfall_mm": "rainfall_mm",
+    },
+    "plug": {
+        "status.energy_consumption.current_power_w": "current_power_w",
+        "status.energy_consumption.total_energy_kwh": "total_energy_kwh",
+    },
+    "thermostat": {
+        "status.current_temperature_c": "current_temperature_c",
+        "status.target_temperature_c": "target_temperature_c",
+        "status.humidity": "humidity",
+    },
+}
+
+
+def _watched_paths() -> dict[str, tuple[str, ...]]:
+    """
+    Maps every recorded field, and every subtree holding one, to the recorded fields inside it.
+    """
+    watched: dict[str, set[str]] = {}
+    for fields in TELEMETRY_FIELDS.values():
+        for field in fields:
+            parts = field.split('.')
+            for end in range(1, len(parts) + 1):
+                watched.setdefault('.'.join(parts[:end]), set()).add(field)
+    return {path: tuple(sorted(fields)) for path, fields in watched.items()}
+
+_WATCHED = _watched_paths()
+
+
+class _Segment:
+    """
+    One `.npy` file of readings sorted by time, named ``<seq>_<first time>_<last time>.npy``.
+    """
+    __slots__ = ('path', 'seq', 'start', 'end')
+
+    def __init__(self, path: str, seq: int, start: float, end: float):
+        self.path = path
+        self.seq = seq
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def parse(cls, directory: str, name: str) -> '_Segment | None':
+        try:
+            seq, start, end = name[:-len(SEGMENT_SUFFIX)].split('_')
+            return cls(os.path.join(directory, name), int(seq), float(start), float(end))
+        except ValueError:
+            return None
+
+    def read(self) -> np.ndarray:
+        return np.load(self.path, mmap_mode='r')
+
+
+class _Series:
+    """
+    Readings of one metric of one device: stored segments plus the buffer of new readings.
+    """
+    __slots__ = ('directory', 'segments', 'times', 'values', 'next_seq')
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.segments: list[_Segment] = []
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(SEGMENT_SUFFIX):
+                    segment = _Segment.parse(directory, name)
+                    if segment is not None:
+                        self.segments.append(segment)
+        self.segments.sort(key=lambda segment: segment.seq)
+        self.next_seq = self.segments[-1].seq + 1 if self.segments else 0
+        self.times: list[float] = []
+        self.values: list[float] = []
+
+    def write(self, readings: np.ndarray) -> _Segment:
+        """
+        Writes sorted readings as a new segment.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        start, end = float(readings['time'][0]), float(readings['time'][-1])
+        name = f"{self.next_seq:08d}_{start!r}_{end!r}{SEGMENT_SUFFIX}"
+        path = os.path.join(self.directory, name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            np.save(file, readings)
+        os.replace(tmp_path, path)
+        segment = _Segment(path, self.next_seq, start, end)
+        self.next_seq += 1
+        count("telemetry_segments_written_total")
+        count("telemetry_bytes_written_total", readings.nbytes)
+        return segment
+
+    def take_buffer(self) -> np.ndarray:
+        """
+        Returns the buffered readings sorted by time and empties the buffer.
+        """
+        readings = np.empty(len(self.times), dtype=READING_DTYPE)
+        readings['time'] = self.times
+        readings['value'] = self.values
+        self.times = []
+        self.values = []
+        if len(readings) > 1 and np.any(np.diff(readings['time']) < 0):
+            readings = readings[np.argsort(readings['time'], kind='stable')]
+        return readings
+
+
+class TelemetryStore:
+    """
+    Append-only history of numeric device readings, one series per device and metric.
+
+    New readings are buffered in memory; every `segment_size` readings of a series are sorted
+    by time and written as one `.npy` segment of (time, value) records under
+    ``<directory>/<device_id>/<metric>/``. Segment file names carry the time range they cover,
+    so range queries only open (memory-map) the segments they need.
+
+    Args:
+        directory (str): Directory holding the segments.
+        segment_size (int): Readings per segment.
+        retention (float | None): Seconds of history kept by `apply_retention()`; None keeps everything.
+        clock (Clock | None): Clock timestamping readings recorded from registry changes;
+            the default clock if None.
+    """
+
+    def __init__(self, directory: str = TELEMETRY_DIR, segment_size: int = SEGMENT_SIZE,
+                 retention: float | None = RETENTION, clock: Clock | None = None):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.retention = retention
+        self.clock = clock if clock is not None else get_clock()
+        self._series: dict[tuple[str, str], _Series] = {}
+        self._registries: list[DeviceRegistry] = []
+        self._lock = threading.RLock()
+
+    def _get_series(self, device_id: str, metric: str) -> _Series:
+        series = self._series.get((device_id, metric))
+        if series is None:
+            series = self._series[(device_id, metric)] = _Series(os.path.join(self.directory, device_id, metric))
+        return series
+
+    def append(self, device_id: str, metric: str, timestamp: float, value: float) -> None:
+        """
+        Records one reading. Readings may arrive out of order.
+        """
+        with self._lock:
+            series = self._series.get((device_id, metric)) or self._get_series(device_id, metric)
+            series.times.append(timestamp)
+            series.values.append(value)
+            if len(series.times) >= self.segment_size:
+                series.segments.append(series.write(series.take_buffer()))
+
+    def append_many(self, device_id: str, metric: str, timestamps, values) -> None:
+        """
+        Records many readings of one series at once, e.g. a backfill from another system.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        if timestamps.shape != values.shape:
+            raise ValueError("timestamps and values differ in length")
+        with self._lock:
+            series = self._get_series(device_id, metric)
+            series.times.extend(timestamps.tolist())
+            series.values.extend(values.tolist())
+            while len(series.times) >= self.segment_size:
+                times, values = series.times, series.values
+                series.times, series.values = times[:self.segment_size], values[:self.segment_size]
+                readings = series.take_buffer()
+                series.times, series.values = times[self.segment_size:], values[self.segment_size:]
+                series.segments.append(series.write(readings))
+
+    def flush(self) -> None:
+        """
+        Writes every buffered reading to disk.
+
+        The new readings are merged into the last segment while they fit in one segment,
+        so frequent flushes do not leave many tiny segments behind.
+        """
+        with self._lock:
+            for series in self._series.values():
+                if not series.times:
+                    continue
+                readings = series.take_buffer()
+                last = series.segments[-1] if series.segments else None
+                if last is not None and len(last.read()) + len(readings) <= self.segment_size:
+                    readings = np.concatenate([last.read(), readings])
+                    readings = readings[np.argsort(readings['time'], kind='stable')]
+                    series.segments[-1] = series.write(readings)
+                    os.remove(last.path)
+                else:
+                    series.segments.append(series.write(readings))
+
+    def range(self, device_id: str, metric: str, start: float | None = None,
+              end: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the readings of one series with `start` <= time < `end`, sorted by time.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Timestamps and values.
+        """
+        low = -math.inf if start is None else start
+        high = math.inf if end is None else end
+        with self._lock:
+            series = self._get_series(device_id, metric)
+            parts = []
+            for segment in series.segments:
+                if segment.end < low or segment.start >= high:
+                    continue
+                readings = segment.read()
+                times = readings['time']
+                first = 0 if segment.start >= low else np.searchsorted(times, low, 'left')
+                last = len(times) if segment.end < high else np.searchsorted(times, high, 'left')
+                parts.append(np.array(readings[first:last]))
+            if series.times:
+                times = np.array(series.times)
+                mask = (times >= low) & (times < high)
+                buffered = np.empty(int(mask.sum()), dtype=READING_DTYPE)
+                buffered['time'] = times[mask]
+                buffered['value'] = np.array(series.values)[mask]
+                parts.append(buffered)
+        readings = np.concatenate(parts) if parts else np.empty(0, dtype=READING_DTYPE)
+        if len(readings) > 1 and np.any(np.diff(readings['time']) < 0):
+            readings = readings[np.argsort(readings['time'], kind='stable')]
+        count("telemetry_queries_total")
+        return readings['time'].copy(), readings['value'].copy()
+
+    def downsample(self, device_id: str, metric: str, interval: float, start: float | None = None,
+                   end: float | None = None) -> dict[str, np.ndarray]:
+        """
+        Aggregates the readings of one series into `interval`-second buckets.
+
+        Buckets are aligned to `start`, or to a multiple of `interval` if `start` is None;
+        buckets without readings are left out.
+
+        Returns:
+            dict[str, np.ndarray]: Bucket start times ("time") and the "min", "max", "mean"
+            and "count" of the readings in each bucket.
+        """
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        times, values = self.range(device_id, metric, start, end)
+        if not len(times):
+            empty = np.empty(0)
+            return {"time": empty, "min": empty, "max": empty, "mean": empty, "count": np.empty(0, dtype=np.int64)}
+        origin = float(start) if start is not None else math.floor(times[0] / interval) * interval
+        buckets = ((times - origin) // interval).astype(np.int64)
+        firsts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(firsts, len(times)))
+        return {
+            "time": origin + buckets[firsts] * interval,
+            "min": np.minimum.reduceat(values, firsts),
+            "max": np.maximum.reduceat(values, firsts),
+            "mean": np.add.reduceat(values, firsts) / counts,
+            "count": counts,
+        }
+
+    def devices(self) -> list[str]:
+        """
+        Returns the ids of the devices with recorded readings.
+        """
+        with self._lock:
+            device_ids = {device_id for (device_id, _), series in self._series.items() if series.times}
+        if os.path.isdir(self.directory):
+            device_ids.update(name for name in os.listdir(self.directory)
+                              if os.path.isdir(os.path.join(self.directory, name)))
+        return sorted(device_ids)
+
+    def metrics(self, device_id: str) -> list[str]:
+        """
+        Returns the metrics recorded for a device.
+        """
+        with self._lock:
+            names = {metric for (other_id, metric), series in self._series.items()
+                     if other_id == device_id and series.times}
+        device_dir = os.path.join(self.directory, device_id)
+        if os.path.isdir(device_dir):
+            names.update(name for name in os.listdir(device_dir) if os.path.isdir(os.path.join(device_dir, name)))
+        return sorted(names)
+
+    def apply_retention(self, now: float | None = None) -> int:
+        """
+        Drops the readings older than `retention` seconds before `now` (the clock time if None).
+
+        Whole segments are deleted; a segment straddling the cutoff is rewritten without its
+        old readings.
+
+        Returns:
+            int: The number of segments deleted or rewritten.
+        """
+        if self.retention is None:
+            return 0
+        cutoff = (self.clock.time() if now is None else now) - self.retention
+        changed = 0
+        with self._lock:
+            for device_id in self.devices():
+                for metric in self.metrics(device_id):
+                    series = self._get_series(device_id, metric)
+                    kept = []
+                    for segment in series.segments:
+                        if segment.end < cutoff:
+                            os.remove(segment.path)
+                            changed += 1
+                        elif segment.start < cutoff:
+                            readings = segment.read()
+                            kept.append(series.write(np.array(readings[np.searchsorted(readings['time'], cutoff):])))
+                            os.remove(segment.path)
+                            changed += 1
+                        else:
+                            kept.append(segment)
+                    kept.sort(key=lambda segment: segment.seq)
+                    series.segments = kept
+                    if series.times and min(series.times) < cutoff:
+                        readings = [(time, value) for time, value in zip(series.times, series.values) if time >= cutoff]
+                        series.times = [time for time, _ in readings]
+                        series.values = [value for _, value in readings]
+                    if not series.segments and not series.times:
+                        del self._series[(device_id, metric)]
+                        shutil.rmtree(series.directory, ignore_errors=True)
+                device_dir = os.path.join(self.directory, device_id)
+                if os.path.isdir(device_dir) and not os.listdir(device_dir):
+                    os.rmdir(device_dir)
+        return changed
+
+    def record_changes(self, registry: DeviceRegistry) -> None:
+        """
+        Records every change of a field in `TELEMETRY_FIELDS` made through `registry`,
+        timestamped with the store's clock. A registry already being recorded is skipped.
+        """
+        with self._lock:
+            if any(known is registry for known in self._registries):
+                return
+            self._registries.append(registry)
+        registry.subscribe(self._on_change)
+
+    def _on_change(self, device: DeviceRecord, path: str, old_value, new_value) -> None:
+        fields = _WATCHED.get(path)
+        if fields is None:
+            return
+        recorded = TELEMETRY_FIELDS.get(device.get_path('type'))
+        if not recorded:
+            return
+        now = self.clock.time()
+        for field in fields:
+            metric = recorded.get(field)
+            if metric is None:
+                continue
+            value = new_value if field == path else device.get_path(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.append(device.device_id, metric, now, value)
+
+    def close(self) -> None:
+        """
+        Stops recording registry changes and writes the buffered readings.
+        """
+        with self._lock:
+            registries, self._registries = self._registries, []
+        for registry in registries:
+            registry.unsubscribe(self._on_change)
+        self.flush()
+
+
+_stores: dict[str, TelemetryStore] = {}
+_stores_lock = threading.Lock()
+
+def get_telemetry(directory: str = TELEMETRY_DIR) -> TelemetryStore:
+    """
+    Returns the process-wide telemetry store for `directory`, creating it on first use.
+
+    Getting the store does not record anything; see `start_recording()`. Every store made
+    here is flushed when the process exits.
+    """
+    key = os.path.abspath(directory)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = TelemetryStore(directory)
+            atexit.register(store.flush)
+        return store
+
+
+def start_recording(registry: DeviceRegistry | None = None, directory: str = TELEMETRY_DIR) -> TelemetryStore:
+    """
+    Records the readings changed through `registry` (the default registry if None) in the
+    process-wide store for `directory` from now on, and returns the store.
+
+    Entry points of processes that change devices call this once at startup; changes made
+    before it are not recorded. Calling it again for the same registry does nothing.
+    """
+    store = get_telemetry(directory)
+    store.record_changes(registry or get_registry())
+    return store
+
+
+if __name__ == '__main__':
+    store = get_telemetry()
+    print('====Recorded telemetry====\n')
+    for device_id in store.devices():
+        for metric in store.metrics(device_id):
+            times, values = store.range(device_id, metric)
+            print(f"{device_id} {metric}: {len(values)} readings", end="")
+            print(f", last {values[-1]}" if len(values) else "")
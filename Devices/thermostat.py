@@ -1,54 +1,49 @@
 from device import NotCompatibleDevice, Device, load_json
+from device_registry import DeviceRegistry
 
 class Thermostat(Device):
-    def __init__(self, device_id: str, device_type: str):
-        super().__init__(device_id, device_type)
+    def __init__(self, device_id: str, device_type: str, registry: DeviceRegistry | None = None):
+        super().__init__(device_id, device_type, registry)
 
 
     def get_current_temperature(self) -> float:
         """
         Get the current temperature of the thermostat.
 
-        Loads the JSON data, searches for the device with the matching device_id,
-        and returns the current temperature in Celsius.
+        Looks up the device in the registry and returns the current temperature in Celsius.
 
         :return: The current temperature in Celsius as a float, or None if not found.
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return float(device['status'].get('current_temperature_c', None))
-        return None
+        value = self.get_field('status.current_temperature_c')
+        if value is None:
+            return None
+        return float(value)
 
     def get_target_temperature(self) -> float:
         """
         Get the target temperature of the thermostat.
 
-        Loads the JSON data, searches for the device with the matching device_id,
-        and returns the target temperature in Celsius.
+        Looks up the device in the registry and returns the target temperature in Celsius.
 
         :return: The target temperature in Celsius as a float, or None if not found.
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return float(device['status'].get('target_temperature_c', None))
-        return None
+        value = self.get_field('status.target_temperature_c')
+        if value is None:
+            return None
+        return float(value)
 
     def get_humidity(self) -> float:
         """
         Get the current humidity level of the thermostat.
 
-        Loads the JSON data, searches for the device with the matching device_id,
-        and returns the current humidity percentage.
+        Looks up the device in the registry and returns the current humidity percentage.
 
         :return: The current humidity percentage as a float, or None if not found.
         """
-        json_data = load_json()
-        for device in json_data['devices']:
-            if device['device_id'] == self.device_id:
-                return float(device['status'].get('humidity', None))
-        return None
+        device = self.registry.get(self.device_id)
+        if device is None:
+            return None
+        return float(device.status.get('humidity', None))
 
 
 if __name__ == "__main__":
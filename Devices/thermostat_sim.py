@@ -0,0 +1,292 @@
+import math
+import os
+import sys
+from datetime import datetime
+from typing import Callable
+
+import numpy as np
+
+sys.path.append(os.path.abspath('..'))
+from clock import get_clock
+from logging_config import get_logger
+from metrics import timed
+from device import current_timestamp
+from device_registry import DeviceRegistry, get_registry
+
+THERMOSTAT_TYPE = "thermostat"
+STEP = 60.0
+# Hours for the indoor temperature to close 63% of the gap to the outdoor temperature.
+TIME_CONSTANT_H = 8.0
+# Degrees per hour a heater at full power adds on top of the heat loss.
+HEATING_RATE_C_H = 3.0
+HEATER_KW = 5.0
+# Temperature within this many degrees of the target counts as reached.
+REACHED_C = 0.5
+DEFAULT_TARGET_C = 21.0
+
+
+class OnOffControl:
+    """
+    Bang-bang thermostat: heats at full power below `target - hysteresis` and stops above
+    `target + hysteresis`, keeping its previous state in between.
+    """
+
+    def __init__(self, hysteresis: float = 0.5):
+        self.hysteresis = hysteresis
+        self._heating: np.ndarray | None = None
+
+    def reset(self, count: int) -> None:
+        self._heating = np.zeros(count, dtype=bool)
+
+    def __call__(self, temperature: np.ndarray, target: np.ndarray, step: float) -> np.ndarray:
+        heating = self._heating
+        heating |= temperature < target - self.hysteresis
+        heating &= temperature <= target + self.hysteresis
+        return heating.astype(np.float64)
+
+
+class PidControl:
+    """
+    PID controller with a heater output between 0 and 1.
+
+    The integral only accumulates while the output is not saturated in the direction of the
+    error (anti-windup), and the derivative acts on the measured temperature, so a new target
+    does not kick the output.
+
+    Args:
+        kp (float): Output per degree of error.
+        ki (float): Output per degree-hour of accumulated error.
+        kd (float): Output per degree-per-hour change of the temperature.
+    """
+
+    def __init__(self, kp: float = 1.0, ki: float = 0.5, kd: float = 0.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self._integral: np.ndarray | None = None
+        self._previous: np.ndarray | None = None
+
+    def reset(self, count: int) -> None:
+        self._integral = np.zeros(count)
+        self._previous = None
+
+    def __call__(self, temperature: np.ndarray, target: np.ndarray, step: float) -> np.ndarray:
+        hours = step / 3600
+        error = target - temperature
+        if self._previous is None:
+            slope = np.zeros_like(temperature)
+        else:
+            slope = (temperature - self._previous) / hours
+        self._previous = temperature.copy()
+        raw = self.kp * error + self.ki * (self._integral + error * hours) - self.kd * slope
+        winding = ((raw < 1) | (error < 0)) & ((raw > 0) | (error > 0))
+        self._integral += np.where(winding, error * hours, 0.0)
+        output = self.kp * error + self.ki * self._integral - self.kd * slope
+        return np.clip(output, 0.0, 1.0, out=output)
+
+
+class SimulationResult:
+    """
+    Outcome of `ThermostatFleet.simulate()`.
+
+    Attributes:
+        times (np.ndarray): Time of every step, in seconds since the epoch.
+        demand_kw (np.ndarray): Heating power of the whole fleet at every step.
+        energy_kwh (np.ndarray): Energy every thermostat used.
+        duty (np.ndarray): Share of the time every heater ran, weighted by its output.
+        reached_after_s (np.ndarray): Seconds until every thermostat first came within
+            `REACHED_C` of its target; NaN if it never did.
+        temperatures (np.ndarray | None): Recorded temperatures, (samples x thermostats).
+        sample_times (np.ndarray | None): Time of every recorded sample.
+    """
+
+    def __init__(self, times, demand_kw, energy_kwh, duty, reached_after_s, temperatures, sample_times):
+        self.times = times
+        self.demand_kw = demand_kw
+        self.energy_kwh = energy_kwh
+        self.duty = duty
+        self.reached_after_s = reached_after_s
+        self.temperatures = temperatures
+        self.sample_times = sample_times
+
+    def peak_demand(self) -> tuple[float, float]:
+        """
+        Returns the time and the fleet heating power in kW of the step with the highest demand.
+        """
+        step = int(np.argmax(self.demand_kw))
+        return float(self.times[step]), float(self.demand_kw[step])
+
+
+class ThermostatFleet:
+    """
+    State of a fleet of thermostats held in NumPy arrays, one element per thermostat.
+
+    Rooms follow a first-order thermal model: the indoor temperature decays towards the
+    outdoor temperature with time constant `time_constant_h`, and a heater running at output
+    u (0..1) adds `u * heating_rate_c_h` degrees per hour. Every step uses the exact solution
+    of the model over the step, so it is stable for any step length, and steps all
+    thermostats at once.
+
+    Args:
+        device_ids (list[str]): Thermostat of every element.
+        temperature: Current indoor temperatures.
+        target: Target temperatures.
+        enabled: Whether every thermostat is on; thermostats that are off never heat.
+        time_constant_h: Thermal time constant of every room, in hours (scalar or array).
+        heating_rate_c_h: Heating rate at full power, in degrees per hour (scalar or array).
+        heater_kw: Heater power in kW (scalar or array).
+    """
+
+    def __init__(self, device_ids: list[str], temperature, target, enabled=True,
+                 time_constant_h=TIME_CONSTANT_H, heating_rate_c_h=HEATING_RATE_C_H, heater_kw=HEATER_KW):
+        count = len(device_ids)
+        self.device_ids = list(device_ids)
+        self.temperature = np.broadcast_to(np.asarray(temperature, dtype=np.float64), (count,)).copy()
+        self.target = np.broadcast_to(np.asarray(target, dtype=np.float64), (count,)).copy()
+        self.enabled = np.broadcast_to(np.asarray(enabled, dtype=bool), (count,)).copy()
+        self.time_constant_h = np.broadcast_to(np.asarray(time_constant_h, dtype=np.float64), (count,)).copy()
+        self.heating_rate_c_h = np.broadcast_to(np.asarray(heating_rate_c_h, dtype=np.float64), (count,)).copy()
+        self.heater_kw = np.broadcast_to(np.asarray(heater_kw, dtype=np.float64), (count,)).copy()
+        self.logger = get_logger()
+
+    @classmethod
+    def from_registry(cls, registry: DeviceRegistry | None = None, **parameters) -> 'ThermostatFleet':
+        """
+        Builds the fleet from the thermostats in the registry; `parameters` are passed on.
+        """
+        registry = registry or get_registry()
+        devices = registry.find(type=THERMOSTAT_TYPE)
+
+        def number(value, default: float) -> float:
+            return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else default
+
+        targets = [number(device.get_path('status.target_temperature_c'), DEFAULT_TARGET_C) for device in devices]
+        temperatures = [number(device.get_path('status.current_temperature_c'), target)
+                        for device, target in zip(devices, targets)]
+        enabled = [device.get_path('status.power') != "off" for device in devices]
+        return cls([device.device_id for device in devices], temperatures, targets, enabled, **parameters)
+
+    def __len__(self) -> int:
+        return len(self.device_ids)
+
+    @timed("thermostat_simulation_seconds")
+    def simulate(self, hours: float, controller: Callable | None = None, outdoor=5.0,
+                 step: float = STEP, start: float | None = None, targets=None,
+                 sample_every: int = 0) -> SimulationResult:
+        """
+        Runs the fleet for `hours`, updating `temperature` in place.
+
+        Args:
+            hours (float): Simulated time; at least one step.
+            controller: `OnOffControl`, `PidControl` or any object with ``reset(count)`` and
+                ``controller(temperature, target, step) -> output``; `OnOffControl()` if None.
+            outdoor: Outdoor temperature: a scalar or an array per thermostat, a (steps x
+                thermostats) or (steps x 1) array with one row per step, or a callable taking
+                the time of a step and returning a scalar or an array per thermostat.
+            step (float): Step length in seconds.
+            start (float | None): Time of the first step; the clock time if None.
+            targets: Targets as a (steps x thermostats) or (steps x 1) array, e.g. for night
+                setbacks; the fleet's `target` if None.
+            sample_every (int): Record the temperatures every this many steps; 0 records none.
+        """
+        controller = controller if controller is not None else OnOffControl()
+        steps = int(round(hours * 3600 / step))
+        if steps < 1:
+            raise ValueError(f"{hours} h is shorter than one step of {step} s")
+        count = len(self)
+        start = get_clock().time() if start is None else start
+        times = start + step * np.arange(steps)
+        controller.reset(count)
+
+        decay = np.exp(-step / (self.time_constant_h * 3600))
+        # Temperature a heater at full power would settle at above the outdoor temperature.
+        heater_gain = self.heating_rate_c_h * self.time_constant_h
+        enabled = self.enabled.astype(np.float64)
+        outdoor_steps = None if callable(outdoor) else np.asarray(outdoor, dtype=np.float64)
+        target_steps = None if targets is None else np.asarray(targets, dtype=np.float64)
+        if target_steps is not None and target_steps.ndim != 2:
+            raise ValueError("targets must have one row per step")
+
+        demand = np.empty(steps)
+        energy_kwh = np.zeros(count)
+        reached = np.full(count, np.nan)
+        samples = []
+        sample_times = []
+        temperature = self.temperature
+        equilibrium = np.empty(count)
+        for number in range(steps):
+            if outdoor_steps is None:
+                current_outdoor = np.asarray(outdoor(times[number]), dtype=np.float64)
+            else:
+                current_outdoor = outdoor_steps[number] if outdoor_steps.ndim == 2 else outdoor_steps
+            if target_steps is None:
+                target = self.target
+            else:
+                target = np.broadcast_to(target_steps[number], (count,))
+            if sample_every and number % sample_every == 0:
+                samples.append(temperature.astype(np.float32))
+                sample_times.append(times[number])
+
+            output = controller(temperature, target, step)
+            output *= enabled
+            np.multiply(output, heater_gain, out=equilibrium)
+            equilibrium += current_outdoor
+            # Exact solution over the step: T -> equilibrium + (T - equilibrium) * exp(-step / tau).
+            temperature -= equilibrium
+            temperature *= decay
+            temperature += equilibrium
+
+            power = output * self.heater_kw
+            demand[number] = power.sum()
+            energy_kwh += power * (step / 3600)
+            newly = np.isnan(reached) & (np.abs(temperature - target) <= REACHED_C)
+            if newly.any():
+                reached[newly] = (number + 1) * step
+
+        duty = energy_kwh / (self.heater_kw * steps * step / 3600)
+        self.logger.info(f"Simulated {count} thermostats for {hours} h in {steps} steps.")
+        return SimulationResult(times, demand, energy_kwh, duty, reached,
+                                np.array(samples) if sample_every else None,
+                                np.array(sample_times) if sample_every else None)
+
+    def write_back(self, registry: DeviceRegistry | None = None, decimals: int = 1) -> int:
+        """
+        Stores the simulated temperatures as the thermostats' current temperatures, in one commit.
+
+        Returns:
+            int: The number of thermostats updated.
+        """
+        registry = registry or get_registry()
+        temperatures = np.round(self.temperature, decimals).tolist()
+        timestamp = current_timestamp()
+        updated = 0
+        with registry.batch():
+            for device_id, temperature in zip(self.device_ids, temperatures):
+                if registry.update(device_id, {'status.current_temperature_c': temperature, 'last_updated': timestamp}):
+                    updated += 1
+        registry.save()
+        self.logger.info(f"Stored simulated temperatures of {updated} thermostats.")
+        return updated
+
+
+def daily_outdoor(mean: float = 5.0, amplitude: float = 5.0, coldest_hour: float = 5.0) -> Callable[[float], float]:
+    """
+    Returns an outdoor temperature following a daily sine wave, coldest at `coldest_hour` local time.
+    """
+    def outdoor(moment: float) -> float:
+        local = datetime.fromtimestamp(moment)
+        hour = local.hour + local.minute / 60 + local.second / 3600
+        return mean - amplitude * math.cos((hour - coldest_hour) / 24 * 2 * math.pi)
+    return outdoor
+
+
+if __name__ == '__main__':
+    fleet = ThermostatFleet.from_registry()
+    result = fleet.simulate(24, outdoor=daily_outdoor())
+    print('====Thermostat simulation, 24 h====\n')
+    for device_id, temperature, energy, reached in zip(fleet.device_ids, fleet.temperature,
+                                                       result.energy_kwh, result.reached_after_s):
+        reached_text = "never" if math.isnan(reached) else f"after {reached / 60:.0f} min"
+        print(f"{device_id}: {temperature:.1f} C, {energy:.1f} kWh, target reached {reached_text}")
+    moment, kilowatts = result.peak_demand()
+    print(f"\nPeak demand {kilowatts:.1f} kW at step {int((moment - result.times[0]) // STEP)}")
@@ -0,0 +1,417 @@
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.append(os.path.abspath('..'))
+from metrics import count
+from device_records import DeviceRecord
+from device_registry import DeviceRegistry
+from telemetry import TelemetryStore, TELEMETRY_FIELDS, get_telemetry
+
+STATION_TYPE = "weather_station"
+# Metrics of a weather station, in the column order of every array below.
+METRICS = tuple(TELEMETRY_FIELDS[STATION_TYPE].values())
+_FIELDS = {field: column for column, field in enumerate(TELEMETRY_FIELDS[STATION_TYPE])}
+WINDOW = 60
+# Readings a stream needs before its z-score is flagged; at most the window.
+MIN_READINGS = 10
+Z_THRESHOLD = 4.0
+# Largest plausible change between two readings of a metric; anything larger is a spike.
+MAX_STEP = {
+    "temperature_c": 5.0,
+    "humidity_percent": 20.0,
+    "pressure_hpa": 5.0,
+    "wind_speed_kmh": 50.0,
+    "rainfall_mm": 25.0,
+}
+# Physically possible range of every metric.
+VALID_RANGE = {
+    "temperature_c": (-60.0, 60.0),
+    "humidity_percent": (0.0, 100.0),
+    "pressure_hpa": (870.0, 1085.0),
+    "wind_speed_kmh": (0.0, 400.0),
+    "rainfall_mm": (0.0, 500.0),
+}
+# Anomaly flags, combined bitwise.
+FLAG_SPIKE = 1
+FLAG_OUTLIER = 2
+FLAG_OUT_OF_RANGE = 4
+
+_MAX_STEP = np.array([MAX_STEP[metric] for metric in METRICS])
+_LOW = np.array([VALID_RANGE[metric][0] for metric in METRICS])
+_HIGH = np.array([VALID_RANGE[metric][1] for metric in METRICS])
+
+
+def dew_point(temperature_c, humidity_percent):
+    """
+    Returns the dew point in Celsius (Magnus formula), element-wise.
+    """
+    temperature_c = np.asarray(temperature_c, dtype=np.float64)
+    humidity = np.clip(np.asarray(humidity_percent, dtype=np.float64), 1e-3, 100.0)
+    gamma = np.log(humidity / 100.0) + 17.62 * temperature_c / (243.12 + temperature_c)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+def heat_index(temperature_c, humidity_percent):
+    """
+    Returns the heat index in Celsius (NWS Rothfusz regression with its adjustments), element-wise.
+    """
+    t = np.asarray(temperature_c, dtype=np.float64) * 9 / 5 + 32
+    rh = np.asarray(humidity_percent, dtype=np.float64)
+    simple = 0.5 * (t + 61.0 + (t - 68.0) * 1.2 + rh * 0.094)
+    full = (-42.379 + 2.04901523 * t + 10.14333127 * rh - 0.22475541 * t * rh - 0.00683783 * t * t
+            - 0.05481717 * rh * rh + 0.00122874 * t * t * rh + 0.00085282 * t * rh * rh
+            - 0.00000199 * t * t * rh * rh)
+    dry = (rh < 13) & (t >= 80) & (t <= 112)
+    full = np.where(dry, full - (13 - rh) / 4 * np.sqrt(np.clip(17 - np.abs(t - 95), 0, None) / 17), full)
+    humid = (rh > 85) & (t >= 80) & (t <= 87)
+    full = np.where(humid, full + (rh - 85) / 10 * (87 - t) / 5, full)
+    index = np.where((simple + t) / 2 >= 80, full, simple)
+    return (index - 32) * 5 / 9
+
+
+def _window_extremes(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the minimum and maximum of the (up to) `window` values ending at every position,
+    in O(len(values)) with the van Herk/Gil-Werman block decomposition.
+    """
+    length = len(values)
+    blocks = -(-length // window)
+    results = []
+    for reduce, pad in ((np.minimum, np.inf), (np.maximum, -np.inf)):
+        padded = np.full(blocks * window, pad)
+        padded[:length] = values
+        shaped = padded.reshape(blocks, window)
+        prefix = reduce.accumulate(shaped, axis=1).ravel()
+        suffix = reduce.accumulate(shaped[:, ::-1], axis=1)[:, ::-1].ravel()
+        extreme = prefix[:length].copy()
+        start = np.arange(length) - window + 1
+        later = start >= 0
+        np.copyto(extreme, reduce(prefix[:length], suffix[np.where(later, start, 0)]), where=later)
+        results.append(extreme)
+    return results[0], results[1]
+
+
+def rolling_stats(values, window: int = WINDOW, metric: str | None = None) -> dict[str, np.ndarray]:
+    """
+    Computes, for a whole series at once, what `WeatherStatsProcessor` reports after every reading.
+
+    Args:
+        values: Readings of one metric, oldest first.
+        window (int): Readings in the sliding window.
+        metric (str | None): Metric of the readings, for the spike and range checks; only the
+            z-score is flagged if None.
+
+    Returns:
+        dict[str, np.ndarray]: "mean", "std", "min", "max" of the window ending at every
+        reading, and the anomaly "flags" of every reading.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    length = len(values)
+    if not length:
+        empty = np.empty(0)
+        return {"mean": empty, "std": empty, "min": empty, "max": empty, "flags": np.empty(0, dtype=np.int8)}
+    counts = np.minimum(np.arange(1, length + 1), window)
+    # Sums of the values shifted by the first one, which keeps the variance accurate.
+    shifted = values - values[0]
+    sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    first = np.arange(length) + 1 - counts
+    total = sums[1:] - sums[first]
+    mean = total / counts
+    variance = (squares[1:] - squares[first] - total * mean) / np.maximum(counts - 1, 1)
+    std = np.sqrt(np.clip(variance, 0, None))
+    low, high = _window_extremes(values, window)
+
+    flags = np.zeros(length, dtype=np.int8)
+    # Every reading is checked against the window before it.
+    previous_mean = np.concatenate(([values[0]], mean[:-1] + values[0]))
+    previous_std = np.concatenate(([0.0], std[:-1]))
+    enough = np.concatenate(([0], counts[:-1])) >= min(MIN_READINGS, window)
+    outlier = enough & (np.abs(values - previous_mean) > Z_THRESHOLD * np.maximum(previous_std, 1e-9))
+    flags[outlier] |= FLAG_OUTLIER
+    if metric is not None:
+        steps = np.abs(np.diff(values, prepend=values[0]))
+        flags[steps > MAX_STEP[metric]] |= FLAG_SPIKE
+        low_limit, high_limit = VALID_RANGE[metric]
+        flags[(values < low_limit) | (values > high_limit)] |= FLAG_OUT_OF_RANGE
+    return {"mean": mean + values[0], "std": std, "min": low, "max": high, "flags": flags}
+
+
+class WeatherStatsProcessor:
+    """
+    Streaming statistics of weather station readings, updated in O(1) per reading.
+
+    Every (station, metric) pair is one stream; the state of all streams lives in NumPy
+    arrays, so `update()` processes readings of many stations in a few vectorized operations.
+    Per stream it keeps, over the last `window` readings:
+
+    - the mean and variance, updated with the sliding-window form of Welford's algorithm;
+    - the minimum and maximum, from the running extremes of the current block of `window`
+      readings and the suffix extremes of the previous block (van Herk/Gil-Werman), so a
+      block is scanned once when it completes instead of the window on every reading.
+
+    Every reading is flagged as a spike (a jump larger than `MAX_STEP`), an outlier (more than
+    `Z_THRESHOLD` standard deviations from the window mean) or out of range (`VALID_RANGE`).
+    Dew point and heat index are derived from the latest temperature and humidity.
+
+    Args:
+        window (int): Readings in the sliding window.
+        station_ids (list[str] | None): Stations known from the start; others are added on
+            their first reading.
+    """
+
+    def __init__(self, window: int = WINDOW, station_ids: list[str] | None = None):
+        if window < 2:
+            raise ValueError("window must hold at least two readings")
+        self.window = window
+        self.station_ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._registries: list[DeviceRegistry] = []
+        self._lock = threading.RLock()
+        self._allocate(0)
+        for station_id in station_ids or []:
+            self._row(station_id)
+
+    def _allocate(self, capacity: int) -> None:
+        streams = capacity * len(METRICS)
+        old = getattr(self, '_count', None)
+        fields = {
+            '_count': np.zeros(streams, dtype=np.int64),
+            '_position': np.zeros(streams, dtype=np.int64),
+            '_mean': np.zeros(streams),
+            '_m2': np.zeros(streams),
+            '_last': np.full(streams, np.nan),
+            '_prefix_min': np.full(streams, np.inf),
+            '_prefix_max': np.full(streams, -np.inf),
+            '_min': np.full(streams, np.nan),
+            '_max': np.full(streams, np.nan),
+            '_flags': np.zeros(streams, dtype=np.int8),
+            '_block': np.zeros((streams, self.window)),
+            '_previous': np.zeros((streams, self.window)),
+            # Suffix extremes of the previous block; the extra column is the empty suffix.
+            '_suffix_min': np.full((streams, self.window + 1), np.inf),
+            '_suffix_max': np.full((streams, self.window + 1), -np.inf),
+        }
+        for name, array in fields.items():
+            if old is not None:
+                current = getattr(self, name)
+                array[:len(current)] = current
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def _row(self, station_id: str) -> int:
+        row = self._rows.get(station_id)
+        if row is None:
+            row = self._rows[station_id] = len(self.station_ids)
+            self.station_ids.append(station_id)
+            if row >= self._capacity:
+                self._allocate(max(16, 2 * self._capacity))
+        return row
+
+    def streams(self, station_ids: list[str], metric: str | None = None) -> np.ndarray:
+        """
+        Returns the stream numbers of `metric` of the given stations (all metrics, row by row,
+        if None), adding unknown stations. Pass them to `update()` to skip the lookups.
+        """
+        with self._lock:
+            rows = np.array([self._row(station_id) for station_id in station_ids], dtype=np.int64)
+        if metric is not None:
+            return rows * len(METRICS) + METRICS.index(metric)
+        return (rows[:, None] * len(METRICS) + np.arange(len(METRICS))).ravel()
+
+    def update(self, streams: np.ndarray, values) -> np.ndarray:
+        """
+        Adds one reading to each of the given streams, e.g. ``update(streams(ids), readings.ravel())``
+        for a (stations x `METRICS`) array of readings. A stream may appear only once per call.
+
+        Returns:
+            np.ndarray: The anomaly flags of the readings.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        window = self.window
+        with self._lock:
+            position = self._position[streams]
+            counts = self._count[streams]
+            mean = self._mean[streams]
+            m2 = self._m2[streams]
+            last = self._last[streams]
+
+            metric = streams % len(METRICS)
+            flags = np.zeros(len(streams), dtype=np.int8)
+            seen = counts > 0
+            flags[seen & (np.abs(values - last) > _MAX_STEP[metric])] |= FLAG_SPIKE
+            std = np.sqrt(np.clip(m2 / np.maximum(counts - 1, 1), 0, None))
+            flags[(counts >= min(MIN_READINGS, window)) & (np.abs(values - mean) > Z_THRESHOLD * np.maximum(std, 1e-9))] |= FLAG_OUTLIER
+            flags[(values < _LOW[metric]) | (values > _HIGH[metric])] |= FLAG_OUT_OF_RANGE
+
+            # Sliding Welford: a full window swaps its oldest reading for the new one.
+            full = counts >= window
+            leaving = self._previous[streams, position]
+            new_counts = np.where(full, window, counts + 1)
+            delta = np.where(full, values - leaving, values - mean)
+            new_mean = mean + delta / new_counts
+            m2 += np.where(full, delta * (values - new_mean + leaving - mean), delta * (values - new_mean))
+            self._mean[streams] = new_mean
+            self._m2[streams] = m2
+            self._count[streams] = new_counts
+            self._last[streams] = values
+
+            self._block[streams, position] = values
+            starting = position == 0
+            prefix_min = np.where(starting, values, np.minimum(self._prefix_min[streams], values))
+            prefix_max = np.where(starting, values, np.maximum(self._prefix_max[streams], values))
+            self._prefix_min[streams] = prefix_min
+            self._prefix_max[streams] = prefix_max
+            self._min[streams] = np.minimum(prefix_min, self._suffix_min[streams, position + 1])
+            self._max[streams] = np.maximum(prefix_max, self._suffix_max[streams, position + 1])
+            self._flags[streams] = flags
+
+            position += 1
+            completed = position == window
+            if completed.any():
+                done = streams[completed]
+                block = self._block[done]
+                self._previous[done] = block
+                self._suffix_min[done, :window] = np.minimum.accumulate(block[:, ::-1], axis=1)[:, ::-1]
+                self._suffix_max[done, :window] = np.maximum.accumulate(block[:, ::-1], axis=1)[:, ::-1]
+                position[completed] = 0
+            self._position[streams] = position
+        count("weather_readings_processed_total", len(streams))
+        return flags
+
+    def snapshot(self) -> dict[str, np.ndarray]:
+        """
+        Returns the current statistics of every station, in the row order of `station_ids`.
+
+        Returns:
+            dict[str, np.ndarray]: (stations x `METRICS`) arrays "last", "mean", "std", "min",
+            "max", "count" and "flags" (of the latest reading), and per-station "dew_point_c"
+            and "heat_index_c".
+        """
+        with self._lock:
+            shape = (len(self.station_ids), len(METRICS))
+            size = shape[0] * shape[1]
+            counts = self._count[:size].reshape(shape)
+            last = self._last[:size].reshape(shape).copy()
+            result = {
+                "last": last,
+                "mean": np.where(counts > 0, self._mean[:size].reshape(shape), np.nan),
+                "std": np.sqrt(np.clip(self._m2[:size].reshape(shape) / np.maximum(counts - 1, 1), 0, None)),
+                "min": self._min[:size].reshape(shape).copy(),
+                "max": self._max[:size].reshape(shape).copy(),
+                "count": counts.copy(),
+                "flags": self._flags[:size].reshape(shape).copy(),
+            }
+        temperature = last[:, METRICS.index("temperature_c")]
+        humidity = last[:, METRICS.index("humidity_percent")]
+        result["dew_point_c"] = dew_point(temperature, humidity)
+        result["heat_index_c"] = heat_index(temperature, humidity)
+        return result
+
+    def station(self, station_id: str) -> dict:
+        """
+        Returns the current statistics of one station, by metric, plus its derived values.
+        """
+        snapshot = self.snapshot()
+        row = self._rows[station_id]
+        stats = {metric: {key: snapshot[key][row, column].item()
+                          for key in ("last", "mean", "std", "min", "max", "count", "flags")}
+                 for column, metric in enumerate(METRICS)}
+        stats["dew_point_c"] = snapshot["dew_point_c"][row].item()
+        stats["heat_index_c"] = snapshot["heat_index_c"][row].item()
+        return stats
+
+    def backfill(self, store: TelemetryStore | None = None, station_ids: list[str] | None = None,
+                 start: float | None = None, end: float | None = None) -> int:
+        """
+        Rebuilds the state of the given stations (every known one if None) from their stored
+        history, replacing what they had.
+
+        Only the last `window` readings of every stream affect the state, so only those are
+        replayed, for all streams together, one vectorized step per reading.
+
+        Returns:
+            int: The number of readings replayed.
+        """
+        store = store or get_telemetry()
+        station_ids = list(self.station_ids) if station_ids is None else station_ids
+        streams = self.streams(station_ids)
+        histories = [store.range(station_id, metric, start, end)[1][-self.window:]
+                     for station_id in station_ids for metric in METRICS]
+        with self._lock:
+            self._reset(streams)
+            lengths = np.array([len(history) for history in histories], dtype=np.int64)
+            steps = int(lengths.max()) if len(lengths) else 0
+            # Aligned to the end: stream i replays its readings in the last lengths[i] steps.
+            matrix = np.full((len(histories), steps), np.nan)
+            for number, history in enumerate(histories):
+                if len(history):
+                    matrix[number, steps - len(history):] = history
+            for step in range(steps):
+                active = steps - step <= lengths
+                self.update(streams[active], matrix[active, step])
+        return int(lengths.sum()) if len(lengths) else 0
+
+    def _reset(self, streams: np.ndarray) -> None:
+        for name in ('_count', '_position', '_mean', '_m2', '_flags'):
+            getattr(self, name)[streams] = 0
+        for name in ('_last', '_min', '_max'):
+            getattr(self, name)[streams] = np.nan
+        self._prefix_min[streams] = np.inf
+        self._prefix_max[streams] = -np.inf
+        self._suffix_min[streams] = np.inf
+        self._suffix_max[streams] = -np.inf
+
+    def record_changes(self, registry: DeviceRegistry) -> None:
+        """
+        Processes every weather station reading made through `registry` as it is made.
+        """
+        with self._lock:
+            self._registries.append(registry)
+        registry.subscribe(self._on_change)
+
+    def _on_change(self, device: DeviceRecord, path: str, old_value, new_value) -> None:
+        if not path.startswith('status') or device.get_path('type') != STATION_TYPE:
+            return
+        columns, values = [], []
+        for field, column in _FIELDS.items():
+            if field == path:
+                value = new_value
+            elif field.startswith(path + '.'):
+                value = device.get_path(field)
+            else:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                columns.append(column)
+                values.append(value)
+        if columns:
+            first = self.streams([device.device_id])[0]
+            self.update(first + np.array(columns), values)
+
+    def close(self) -> None:
+        """
+        Stops processing registry changes.
+        """
+        with self._lock:
+            registries, self._registries = self._registries, []
+        for registry in registries:
+            registry.unsubscribe(self._on_change)
+
+
+if __name__ == '__main__':
+    from device_registry import get_registry
+    registry = get_registry()
+    stations = [device.device_id for device in registry.find(type=STATION_TYPE)]
+    processor = WeatherStatsProcessor(station_ids=stations)
+    processor.backfill()
+    print('====Weather station statistics====\n')
+    for station_id in stations:
+        stats = processor.station(station_id)
+        print(f"{station_id}: dew point {stats['dew_point_c']:.1f} C, heat index {stats['heat_index_c']:.1f} C")
+        for metric in METRICS:
+            values = stats[metric]
+            print(f"  {metric:17} mean {values['mean']:8.2f}  std {values['std']:7.2f}  "
+                  f"min {values['min']:8.2f}  max {values['max']:8.2f}  flags {values['flags']}")
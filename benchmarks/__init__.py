@@ -0,0 +1,5 @@
+"""
+Benchmarks for the Devices package.
+
+Run them from the repository root, e.g. ``python -m benchmarks.devices_bench``.
+"""
@@ -0,0 +1,180 @@
+"""
+Measures the cost of automation rule evaluation on device updates.
+
+Run from the repository root:
+    python -m benchmarks.automation_bench [--devices 10000] [--rules 10000] [--updates 20000] [--rate 1000]
+
+Generates `--rules` threshold rules over the numeric status fields of a generated fleet, most
+of them watching a single device and the rest every device of a type in one location, then
+times `--updates` random status updates made through the registry with no rules, with the
+indexed `AutomationEngine` and with an engine scanning every rule on every change. The cost
+is reported per update and as the CPU share taken at `--rate` updates per second; applying
+the actions of the rules that fired is timed separately.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from benchmarks.devices_bench import prepare_store
+from benchmarks.fleet import STATUS_RANGES
+from automation import AutomationEngine, AutomationRule, Trigger, ABOVE, BELOW
+from device_events import NullSink, set_default_sink, ConsoleSink
+from device_registry import get_registry, use_store
+from logging_config import configure_logging
+
+DEVICE_COUNT = 10_000
+RULE_COUNT = 10_000
+UPDATE_COUNT = 20_000
+RATE = 1_000
+# Share of the rules watching a single device; the others watch a type in one location.
+DEVICE_RULE_SHARE = 0.8
+
+
+class ScanEngine(AutomationEngine):
+    """
+    Engine without the trigger index: every change is checked against every rule.
+    """
+
+    def _on_change(self, device, path, old_value, new_value) -> None:
+        with self._condition:
+            for rule in self._rules.values():
+                trigger = rule.trigger
+                if trigger.device_id is not None:
+                    if trigger.device_id != device.device_id:
+                        continue
+                elif trigger.device_type != device.get_path('type') or \
+                        trigger.location not in (None, device.get_path('location')):
+                    continue
+                if trigger.field == path:
+                    self._evaluate(rule, device, new_value)
+                elif trigger.field.startswith(path + '.'):
+                    self._evaluate(rule, device, device.get_path(trigger.field))
+
+
+def numeric_fields(status: dict, prefix: str = "status") -> list[tuple[str, float, float]]:
+    """
+    Returns the dotted path and value range of every numeric status field of a device.
+    """
+    fields = []
+    for key, value in status.items():
+        path = f"{prefix}.{key}"
+        if isinstance(value, dict):
+            fields.extend(numeric_fields(value, path))
+        elif key in STATUS_RANGES and isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields.append((path, *STATUS_RANGES[key]))
+    return fields
+
+
+def make_rules(devices: list[dict], rule_count: int, seed: int = 0) -> list[AutomationRule]:
+    """
+    Returns threshold rules, each turning off one random device when it fires.
+    """
+    rng = random.Random(seed)
+    candidates = [(device, numeric_fields(device['status'])) for device in devices]
+    candidates = [(device, fields) for device, fields in candidates if fields]
+    rules = []
+    for index in range(rule_count):
+        device, fields = rng.choice(candidates)
+        path, low, high = rng.choice(fields)
+        threshold = rng.uniform(low, high)
+        condition = rng.choice([ABOVE, BELOW])
+        hysteresis = (high - low) * 0.05
+        if rng.random() < DEVICE_RULE_SHARE:
+            trigger = Trigger(device['type'], path, condition, threshold, hysteresis, device_id=device['device_id'])
+        else:
+            trigger = Trigger(device['type'], path, condition, threshold, hysteresis, location=device['location'])
+        target = rng.choice(devices)['device_id']
+        rules.append(AutomationRule(f"{index:08x}", trigger, [{"device_id": target, "set": {"status.power": "off"}}],
+                                    debounce=rng.choice([0, 60, 600])))
+    return rules
+
+
+def make_updates(devices: list[dict], update_count: int, seed: int = 0) -> list[tuple[str, dict]]:
+    """
+    Returns random single-field status updates of devices with numeric status fields.
+    """
+    rng = random.Random(seed + 1)
+    candidates = [(device['device_id'], numeric_fields(device['status'])) for device in devices]
+    candidates = [(device_id, fields) for device_id, fields in candidates if fields]
+    updates = []
+    for _ in range(update_count):
+        device_id, fields = rng.choice(candidates)
+        path, low, high = rng.choice(fields)
+        updates.append((device_id, {path: round(rng.uniform(low, high), 1)}))
+    return updates
+
+
+def run_mode(mode: str, store_path: str, rules: list[AutomationRule], updates: list[tuple[str, dict]]) -> dict:
+    """
+    Times the updates with one engine mode on a freshly loaded registry.
+    """
+    registry = get_registry(store_path)
+    registry.load()
+    engine = None
+    if mode != "none":
+        engine = (AutomationEngine if mode == "indexed" else ScanEngine)(registry)
+        for rule in rules:
+            engine.add_rule(rule)
+    # Warm up the records touched by the updates, so only evaluation differs between modes.
+    for device_id, _ in updates:
+        registry.get(device_id)
+
+    started = time.perf_counter()
+    for device_id, changes in updates:
+        registry.update(device_id, changes)
+    elapsed = time.perf_counter() - started
+    results = {"update_us": elapsed / len(updates) * 1e6, "fired": 0, "apply_ms": 0.0}
+
+    if engine is not None:
+        results["fired"] = len(engine._pending)
+        started = time.perf_counter()
+        engine.run_pending()
+        if results["fired"]:
+            results["apply_ms"] = (time.perf_counter() - started) / results["fired"] * 1000
+        engine.close()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark automation rule evaluation.")
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--rules", type=int, default=RULE_COUNT)
+    parser.add_argument("--updates", type=int, default=UPDATE_COUNT)
+    parser.add_argument("--rate", type=int, default=RATE, help="updates per second the CPU share is reported for")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    set_default_sink(NullSink())
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_logging(log_dir=work_dir)
+            store_path, devices = prepare_store(work_dir, args.devices, 'json', args.seed)
+            rules = make_rules(devices, args.rules, args.seed)
+            updates = make_updates(devices, args.updates, args.seed)
+            use_store(store_path)
+            print(f"{args.rules} rules over {args.devices} devices, {args.updates} updates")
+            baseline = None
+            for mode in ("none", "indexed", "scan"):
+                results = run_mode(mode, store_path, rules, updates)
+                if baseline is None:
+                    baseline = results["update_us"]
+                evaluation = results["update_us"] - baseline
+                line = (f"{mode:8} {results['update_us']:9.1f} us/update, evaluation {evaluation:9.1f} us/update, "
+                        f"{evaluation * args.rate / 1e4:6.2f}% CPU at {args.rate}/s")
+                if mode != "none":
+                    line += f", {results['fired']} fired, {results['apply_ms']:.3f} ms/firing applied"
+                print(line)
+            get_registry(store_path).storage.close()
+    finally:
+        set_default_sink(ConsoleSink())
+        configure_logging()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Times the main device operations on generated fleets and writes the results to a JSON file.
+
+Run from the repository root:
+    python -m benchmarks.devices_bench [--sizes 10 1000 10000 100000] [--backend json|sqlite]
+                                       [--output benchmarks/results/devices.json]
+
+Every operation is timed per call; the results hold ops/sec, p50/p99 latency and the peak
+memory allocated by one call of the operation, so runs of different versions can be compared
+with ``python -m benchmarks.devices_bench --compare old.json new.json``.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from benchmarks.fleet import FLEET_SIZES, write_fleet
+from device import Device
+from bulb import Bulb
+from BulbNetwork import BulbNetwork
+from device_list import get_device_list
+from device_records import DeviceRecord
+from device_registry import get_registry, use_store
+from device_storage import SqliteStorage
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+ITERATIONS = 1_000
+# Operations touching the whole fleet are far slower and run fewer times.
+FLEET_ITERATIONS = 3
+MEMORY_ITERATIONS = 20
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """
+    Returns the value below which `fraction` of the sorted values fall (nearest rank).
+    """
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def time_operation(operation, iterations: int) -> dict:
+    """
+    Calls `operation(i)` `iterations` times and returns throughput and latency figures.
+    """
+    latencies = []
+    started = time.perf_counter()
+    for number in range(iterations):
+        call_started = time.perf_counter()
+        operation(number)
+        latencies.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_sec": iterations / elapsed if elapsed else float('inf'),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def peak_memory(operation, iterations: int) -> int:
+    """
+    Returns the largest number of bytes allocated by a single call of `operation`.
+    """
+    peak = 0
+    tracemalloc.start()
+    try:
+        for number in range(iterations):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            operation(number)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def prepare_store(work_dir: str, device_count: int, backend: str, seed: int) -> tuple[str, list[dict]]:
+    """
+    Generates a fleet of `device_count` devices and stores it in a new store of the given backend.
+    """
+    json_path = os.path.join(work_dir, f"devices_{device_count}.json")
+    devices = write_fleet(json_path, device_count, seed)
+    if backend == 'json':
+        return json_path, devices
+    db_path = os.path.join(work_dir, f"devices_{device_count}.db")
+    storage = SqliteStorage(db_path)
+    storage.import_records([DeviceRecord.from_json(device) for device in devices])
+    storage.close()
+    return db_path, devices
+
+
+def build_operations(registry, devices: list[dict], seed: int) -> dict:
+    """
+    Returns the benchmarked operations by name, each with the number of iterations it runs.
+    """
+    rng = random.Random(seed)
+    device_ids = [device['device_id'] for device in devices]
+    handles = {}
+
+    def handle(device_id: str) -> Device:
+        device = handles.get(device_id)
+        if device is None:
+            device = handles[device_id] = Device(device_id, "Device")
+            device.connected = True
+        return device
+
+    def random_device() -> Device:
+        return handle(rng.choice(device_ids))
+
+    network = BulbNetwork()
+    network.bulbs = [Bulb(device.device_id, "Bulb") for device in registry.find(type='bulb')]
+
+    return {
+        "load": (lambda _: registry.load(), FLEET_ITERATIONS),
+        "lookup": (lambda _: registry.get(rng.choice(device_ids)), ITERATIONS),
+        "status_read": (lambda _: random_device().get_status(), ITERATIONS),
+        "power_toggle": (lambda number: random_device().turn_on_off("on" if number % 2 else "off"), ITERATIONS),
+        "rename": (lambda number: random_device().change_device_name(f"Device {number}"), ITERATIONS),
+        "bulk_on_off": (lambda number: network.turn_all_on_off("ON" if number % 2 else "OFF"), FLEET_ITERATIONS),
+        "list": (lambda _: get_device_list(), FLEET_ITERATIONS),
+    }
+
+
+def run_fleet(device_count: int, backend: str = 'json', seed: int = 0) -> list[dict]:
+    """
+    Benchmarks every operation on a freshly generated fleet of `device_count` devices.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+        store_path, devices = prepare_store(work_dir, device_count, backend, seed)
+        use_store(store_path)
+        registry = get_registry(store_path)
+        try:
+            with redirect_stdout(devnull):
+                operations = build_operations(registry, devices, seed)
+                for name, (operation, iterations) in operations.items():
+                    result = time_operation(operation, iterations)
+                    result["peak_memory_bytes"] = peak_memory(operation, min(iterations, MEMORY_ITERATIONS))
+                    results.append({"devices": device_count, "operation": name, **result})
+        finally:
+            registry.storage.close()
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes=FLEET_SIZES, backend: str = 'json', seed: int = 0) -> dict:
+    """
+    Runs the benchmark for every fleet size and returns the results with details of the run.
+    """
+    results = []
+    for device_count in sizes:
+        print(f"Benchmarking {device_count} devices ({backend})...")
+        for result in run_fleet(device_count, backend, seed):
+            results.append(result)
+            print(
+                f"  {result['operation']:<13} {result['ops_per_sec']:>12.1f} ops/s"
+                f"  p50 {result['p50_ms']:>9.3f} ms  p99 {result['p99_ms']:>9.3f} ms"
+                f"  peak {result['peak_memory_bytes'] / 1024:>10.1f} KiB"
+            )
+    return {
+        "run": {
+            "timestamp": datetime.now().isoformat(timespec='seconds'),
+            "revision": git_revision(),
+            "backend": backend,
+            "seed": seed,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """
+    Prints the ops/sec and p99 change of every operation between two results files.
+    """
+    with open(old_path, 'r') as file:
+        old = {(result['devices'], result['operation']): result for result in json.load(file)['results']}
+    with open(new_path, 'r') as file:
+        new = json.load(file)['results']
+    for result in new:
+        before = old.get((result['devices'], result['operation']))
+        if before is None:
+            continue
+        speedup = result['ops_per_sec'] / before['ops_per_sec'] if before['ops_per_sec'] else float('inf')
+        print(
+            f"{result['devices']:>7} {result['operation']:<13} {speedup:>8.2f}x ops/s"
+            f"  p99 {before['p99_ms']:.3f} -> {result['p99_ms']:.3f} ms"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark device operations on generated fleets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(FLEET_SIZES))
+    parser.add_argument("--backend", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/devices_<revision>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.sizes, args.backend, args.seed)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"devices_{report['run']['revision'] or 'unknown'}_{args.backend}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=4)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
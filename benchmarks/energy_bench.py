@@ -0,0 +1,88 @@
+"""
+Times building a plug energy report over a large fleet and a long period.
+
+Run from the repository root:
+    python -m benchmarks.energy_bench [--plugs 10000] [--days 365] [--interval 60]
+
+Every plug reports its power every `--interval` seconds; the readings come from a pool of
+synthetic year-long power profiles held in memory, so the run times the aggregation into
+hourly kWh per plug and per-location demand curves, and the reports built from them, not the
+reading of the telemetry store (see ``benchmarks.telemetry_bench`` for that).
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from benchmarks.fleet import LOCATIONS
+from energy import EnergyReport, BLOCK_READINGS, DAY
+
+PLUG_COUNT = 10_000
+DAYS = 365
+INTERVAL = 60.0
+PROFILES = 64
+OWNERS = 50
+START = datetime(2026, 1, 1).timestamp()
+
+
+def make_profiles(count: int, steps: int, interval: float, seed: int = 0) -> np.ndarray:
+    """
+    Returns `count` power curves in watts: a standby draw, a daily usage peak and noise.
+    """
+    rng = np.random.default_rng(seed)
+    hours = (np.arange(steps) * interval / 3600) % 24
+    profiles = np.empty((count, steps))
+    for number in range(count):
+        peak_hour = rng.uniform(6, 22)
+        usage = rng.uniform(100, 2000) * np.exp(-((hours - peak_hour) ** 2) / 2)
+        profiles[number] = rng.uniform(1, 20) + usage + rng.normal(0, 5, steps).clip(0)
+    return profiles
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark plug energy reports.")
+    parser.add_argument("--plugs", type=int, default=PLUG_COUNT)
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="seconds between power readings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    steps = int(args.days * DAY / args.interval)
+    end = START + args.days * DAY
+    rng = np.random.default_rng(args.seed)
+    times = START + args.interval * np.arange(steps)
+    profiles = make_profiles(PROFILES, steps, args.interval, args.seed)
+    choice = rng.integers(0, PROFILES, args.plugs)
+    plug_ids = [f"{index:016x}" for index in range(args.plugs)]
+    locations = [LOCATIONS[index] for index in rng.integers(0, len(LOCATIONS), args.plugs)]
+    owners = [f"user_{index}" for index in rng.integers(0, OWNERS, args.plugs)]
+    print(f"{args.plugs} plugs, {args.days} days of readings every {args.interval:g} s: "
+          f"{args.plugs * steps / 1e9:.2f} billion readings")
+
+    started = time.perf_counter()
+    report = EnergyReport(START, end, plug_ids, locations, owners)
+    block = max(1, BLOCK_READINGS // steps)
+    for first in range(0, args.plugs, block):
+        report.add_readings(first, [(times, profiles[choice[row]])
+                                    for row in range(first, min(first + block, args.plugs))])
+    elapsed = time.perf_counter() - started
+    print(f"aggregate:    {elapsed:7.2f} s, {args.plugs * steps / elapsed / 1e6:6.1f} M readings/s")
+
+    for name, build in (("daily", report.daily), ("by location", lambda: report.by_location("day")),
+                        ("by owner", lambda: report.by_owner("hour")), ("peaks", lambda: report.peak_windows(count=5))):
+        started = time.perf_counter()
+        result = build()
+        print(f"{name + ':':13} {time.perf_counter() - started:7.2f} s")
+    print(f"fleet total:  {report.hourly.sum(dtype=np.float64):,.0f} kWh")
+    for started, ended, kilowatts in result:
+        print(f"  peak {started:%Y-%m-%d %H:%M} - {ended:%H:%M}: {kilowatts:,.0f} kW")
+
+
+if __name__ == '__main__':
+    main()
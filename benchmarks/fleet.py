@@ -0,0 +1,125 @@
+"""
+Generates synthetic device fleets following `devices_template.json`.
+
+Run from the repository root to write a fleet to disk:
+    python -m benchmarks.fleet <device_count> <output_path>
+"""
+import json
+import os
+import sys
+
+from faker import Faker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from device import TIMESTAMP_FORMAT
+
+TEMPLATE_PATH = os.path.join(ROOT, "devices_template.json")
+FLEET_SIZES = (10, 1_000, 10_000, 100_000)
+LOCATIONS = (
+    "Living Room", "Kitchen", "Bedroom", "Bathroom", "Hallway", "Office", "Garage", "Garden",
+)
+POWER_STATES = ("on", "off")
+NAME_POOL_SIZE = 1_000
+
+# Realistic (low, high) bounds of numeric status values; other numbers range from 0 to twice the template value.
+STATUS_RANGES = {
+    'brightness': (0, 100),
+    'color_temp': (2700, 6500),
+    'red': (0, 255),
+    'green': (0, 255),
+    'blue': (0, 255),
+    'current_power_w': (0, 2500),
+    'total_energy_kwh': (0, 5000),
+    'target_temperature_c': (16, 28),
+    'current_temperature_c': (10, 30),
+    'humidity': (20, 80),
+    'position': (0, 100),
+    'open_percent': (0, 100),
+    'temperature_c': (-20, 40),
+    'humidity_percent': (0, 100),
+    'pressure_hpa': (960, 1050),
+    'wind_speed_kmh': (0, 120),
+    'rainfall_mm': (0, 50),
+    'battery_percent': (0, 100),
+    'cutting_height_mm': (20, 80),
+}
+
+
+def load_templates(template_path: str = TEMPLATE_PATH) -> list[dict]:
+    """
+    Returns one template device per device type, in the order they appear in the template file.
+    """
+    with open(template_path, 'r') as file:
+        devices = json.load(file)['devices']
+    templates = {}
+    for device in devices:
+        templates.setdefault(device['type'], device)
+    return list(templates.values())
+
+
+def _fake_value(fake: Faker, key: str, value):
+    """
+    Returns a random value of the same shape as the template `value`.
+    """
+    if isinstance(value, dict):
+        return {sub_key: _fake_value(fake, sub_key, sub_value) for sub_key, sub_value in value.items()}
+    if key == 'power':
+        return fake.random.choice(POWER_STATES)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return value
+    low, high = STATUS_RANGES.get(key, (0, max(100, value * 2)))
+    if isinstance(value, int):
+        return fake.random.randint(low, high)
+    return round(fake.random.uniform(low, high), 1)
+
+
+def generate_fleet(device_count: int, seed: int = 0, template_path: str = TEMPLATE_PATH) -> list[dict]:
+    """
+    Returns `device_count` devices cycling through the device types of the template.
+
+    Ids, names, secrets, locations and status values are random but repeatable for a given `seed`.
+    """
+    fake = Faker()
+    fake.seed_instance(seed)
+    templates = load_templates(template_path)
+    # Faker's name provider is slow, so names are drawn from a pool generated up front.
+    first_names = [fake.first_name() for _ in range(min(device_count, NAME_POOL_SIZE))]
+    device_ids = set()
+    devices = []
+    for number in range(device_count):
+        template = templates[number % len(templates)]
+        device_id = f"{fake.random.getrandbits(64):016x}"
+        while device_id in device_ids:
+            device_id = f"{fake.random.getrandbits(64):016x}"
+        device_ids.add(device_id)
+        devices.append({
+            "device_id": device_id,
+            "device_secret_key": fake.password(length=12),
+            "name": f"{fake.random.choice(first_names)}'s {template['name']}",
+            "type": template['type'],
+            "brand": template['brand'],
+            "model": template['model'],
+            "status": _fake_value(fake, 'status', template['status']),
+            "location": fake.random_element(LOCATIONS),
+            "connected": template['connected'],
+            "last_updated": fake.date_time_this_year().strftime(TIMESTAMP_FORMAT),
+        })
+    return devices
+
+
+def write_fleet(file_path: str, device_count: int, seed: int = 0) -> list[dict]:
+    """
+    Writes a generated fleet as a devices.json document and returns its devices.
+    """
+    devices = generate_fleet(device_count, seed)
+    with open(file_path, 'w') as file:
+        json.dump({"devices": devices}, file, indent=4)
+    return devices
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit("usage: python -m benchmarks.fleet <device_count> <output_path>")
+    write_fleet(sys.argv[2], int(sys.argv[1]))
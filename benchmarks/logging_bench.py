@@ -0,0 +1,95 @@
+"""
+Measures how INFO logging affects device operation throughput in each logging mode.
+
+Run from the repository root:
+    python -m benchmarks.logging_bench [--devices 1000] [--output benchmarks/results/logging.json]
+
+Modes:
+    off         INFO records are dropped (level WARNING).
+    sync        Every record is written and flushed on the calling thread, as the former FileHandler setup did.
+    queue       Records are written in batches on a background thread.
+    queue_json  As `queue`, writing JSON lines.
+    queue_lean  As `queue`, with `skip_caller_info`.
+
+Every mode but `queue_lean` keeps the logging module's caller, thread and process lookups,
+so `sync` and `queue` differ only in where and how often records are written.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.devices_bench import RESULTS_DIR, build_operations, prepare_store, time_operation
+from device_registry import get_registry, use_store
+from logging_config import configure_logging, stop_logging
+
+DEVICE_COUNT = 1_000
+ITERATIONS = 2_000
+OPERATIONS = ("status_read", "power_toggle", "rename")
+
+MODES = {
+    "off": dict(use_queue=False, level=logging.WARNING),
+    "sync": dict(use_queue=False, batch_size=1, max_bytes=0),
+    "queue": dict(use_queue=True),
+    "queue_json": dict(use_queue=True, json_lines=True),
+    "queue_lean": dict(use_queue=True, skip_caller_info=True),
+}
+
+
+def run(device_count: int = DEVICE_COUNT, iterations: int = ITERATIONS, seed: int = 0) -> list[dict]:
+    """
+    Times the device operations once per logging mode on the same fleet.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+        store_path, devices = prepare_store(work_dir, device_count, 'json', seed)
+        use_store(store_path)
+        registry = get_registry(store_path)
+        try:
+            for mode, options in MODES.items():
+                log_dir = os.path.join(work_dir, mode)
+                os.makedirs(log_dir)
+                configure_logging(log_dir=log_dir, **options)
+                with redirect_stdout(devnull):
+                    operations = build_operations(registry, devices, seed)
+                    for name in OPERATIONS:
+                        operation, _ = operations[name]
+                        result = time_operation(operation, iterations)
+                        results.append({"mode": mode, "operation": name, **result})
+                        print(
+                            f"{mode:<11} {name:<13} {result['ops_per_sec']:>10.1f} ops/s"
+                            f"  p50 {result['p50_ms']:.3f} ms  p99 {result['p99_ms']:.3f} ms",
+                            file=sys.__stdout__,
+                        )
+                stop_logging()
+        finally:
+            registry.storage.close()
+            stop_logging()
+            logger = logging.getLogger()
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark device operations under each logging mode.")
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "logging.json"))
+    args = parser.parse_args(argv)
+
+    results = run(args.devices, args.iterations)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump({"devices": args.devices, "results": results}, file, indent=4)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
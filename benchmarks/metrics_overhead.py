@@ -0,0 +1,87 @@
+"""
+Measures the cost of the metrics instrumentation, disabled and enabled.
+
+Run from the repository root:
+    python -m benchmarks.metrics_overhead [--devices 1000] [--iterations 20000]
+
+Reports the time added to a single call by `@timed` and how many power toggles per
+second a device manages with metrics off and on.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from benchmarks.devices_bench import build_operations, prepare_store, time_operation
+from device_registry import get_registry, use_store
+import metrics
+
+DEVICE_COUNT = 1_000
+ITERATIONS = 20_000
+
+
+def call_overhead(iterations: int) -> dict:
+    """
+    Returns the nanoseconds per call of a no-op function, bare and wrapped by `@timed`.
+    """
+    def bare():
+        pass
+
+    wrapped = metrics.timed("overhead_seconds")(bare)
+    results = {"bare_ns": timeit.timeit(bare, number=iterations) / iterations * 1e9}
+    metrics.disable()
+    results["disabled_ns"] = timeit.timeit(wrapped, number=iterations) / iterations * 1e9
+    metrics.enable()
+    results["enabled_ns"] = timeit.timeit(wrapped, number=iterations) / iterations * 1e9
+    metrics.disable()
+    metrics.metrics.reset()
+    return results
+
+
+def operation_throughput(device_count: int, iterations: int, seed: int = 0) -> dict:
+    """
+    Returns power toggles per second with metrics disabled and enabled.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir, open(os.devnull, 'w') as devnull:
+        store_path, devices = prepare_store(work_dir, device_count, 'json', seed)
+        use_store(store_path)
+        registry = get_registry(store_path)
+        try:
+            with redirect_stdout(devnull):
+                operation, _ = build_operations(registry, devices, seed)["power_toggle"]
+                time_operation(operation, iterations // 10)  # warm up
+                for mode in ("disabled", "enabled", "disabled_again"):
+                    if mode == "enabled":
+                        metrics.enable()
+                    else:
+                        metrics.disable()
+                    results[mode] = time_operation(operation, iterations)["ops_per_sec"]
+        finally:
+            metrics.disable()
+            registry.storage.close()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Measure the overhead of the metrics instrumentation.")
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    args = parser.parse_args(argv)
+
+    overhead = call_overhead(args.iterations * 50)
+    print(f"no-op call:        {overhead['bare_ns']:8.1f} ns")
+    print(f"@timed, disabled:  {overhead['disabled_ns']:8.1f} ns")
+    print(f"@timed, enabled:   {overhead['enabled_ns']:8.1f} ns")
+
+    throughput = operation_throughput(args.devices, args.iterations)
+    for mode, ops_per_sec in throughput.items():
+        print(f"power_toggle, metrics {mode:<15} {ops_per_sec:10.1f} ops/s")
+
+
+if __name__ == '__main__':
+    main()
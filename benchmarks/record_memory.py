@@ -0,0 +1,74 @@
+"""
+Compares the memory footprint of devices held as parsed JSON dicts and as `DeviceRecord`s.
+
+Run from the repository root:
+    python benchmarks/record_memory.py [device_count]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from device_records import DeviceRecord
+
+TEMPLATE_PATH = os.path.join(ROOT, "devices_template.json")
+DEFAULT_DEVICE_COUNT = 100_000
+
+
+def build_fleet_json(device_count: int) -> str:
+    """
+    Builds a devices.json document with `device_count` devices cycled from the template.
+    """
+    with open(TEMPLATE_PATH, 'r') as file:
+        templates = json.load(file)['devices']
+    devices = []
+    for number in range(device_count):
+        device = dict(templates[number % len(templates)])
+        device['device_id'] = f"{number:016x}"
+        device['name'] = f"{device['name']} {number}"
+        devices.append(device)
+    return json.dumps({"devices": devices})
+
+
+def measure(build) -> tuple[object, int]:
+    """
+    Returns the object created by `build()` and the number of bytes it keeps allocated.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main(device_count: int = DEFAULT_DEVICE_COUNT) -> dict:
+    text = build_fleet_json(device_count)
+
+    dicts, dict_bytes = measure(lambda: json.loads(text)['devices'])
+    del dicts
+    records, record_bytes = measure(
+        lambda: [DeviceRecord.from_json(device) for device in json.loads(text)['devices']]
+    )
+    del records
+
+    results = {
+        "devices": device_count,
+        "dict_bytes_per_device": dict_bytes / device_count,
+        "record_bytes_per_device": record_bytes / device_count,
+        "saving": 1 - record_bytes / dict_bytes,
+    }
+    print(f"Devices:              {device_count}")
+    print(f"dict bytes/device:    {results['dict_bytes_per_device']:.0f}")
+    print(f"record bytes/device:  {results['record_bytes_per_device']:.0f}")
+    print(f"Saving:               {results['saving']:.0%}")
+    return results
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_DEVICE_COUNT)
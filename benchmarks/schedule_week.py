@@ -0,0 +1,111 @@
+"""
+Runs a simulated week of recurring schedules over a generated fleet.
+
+Run from the repository root:
+    python -m benchmarks.schedule_week [--devices 10000] [--days 7] [--backend heap|wheel]
+
+Every device gets a working-day morning rule turning it on and a daily evening rule turning
+it off; every tenth device also an interval rule. A `SimulatedClock` jumps from one firing to
+the next, so the run takes as long as applying the firings to the device store.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from benchmarks.devices_bench import prepare_store
+from clock import SimulatedClock, set_clock, SystemClock
+from device_events import NullSink, set_default_sink, ConsoleSink
+from device_network import DeviceNetwork
+from device_registry import get_registry, use_store
+from device_storage import save_json
+from logging_config import configure_logging
+from schedule_rules import RecurringScheduler
+from schedule_timers import TaskHeap, TimingWheel
+
+DEVICE_COUNT = 10_000
+DAYS = 7
+# A Monday, so the simulated week starts with working days.
+START = datetime(2026, 1, 5)
+
+
+def write_rules(path: str, device_ids: list[str], seed: int = 0) -> int:
+    """
+    Writes the rules of every device to a schedules file and returns their number.
+    """
+    rng = random.Random(seed)
+    rules = {}
+    for index, device_id in enumerate(device_ids):
+        rules[f"{index:08x}-on"] = {
+            "device_id": device_id, "action": "on",
+            "weekdays": 0b0011111, "at": f"{rng.randint(6, 8)}:{rng.randrange(60):02d}",
+        }
+        rules[f"{index:08x}-off"] = {
+            "device_id": device_id, "action": "off",
+            "cron": f"{rng.randrange(60)} {rng.randint(17, 23)} * * *",
+        }
+        if index % 10 == 0:
+            rules[f"{index:08x}-interval"] = {
+                "device_id": device_id, "action": rng.choice(["on", "off"]),
+                "interval": 60 * rng.choice([30, 60, 120]), "start": START.timestamp(),
+            }
+    save_json({"rules": rules}, path)
+    return len(rules)
+
+
+def run_week(device_count: int, days: int, backend_name: str, seed: int = 0) -> dict:
+    clock = SimulatedClock(START)
+    set_clock(clock)
+    set_default_sink(NullSink())
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_logging(log_dir=work_dir)
+            store_path, _ = prepare_store(work_dir, device_count, 'json', seed)
+            use_store(store_path)
+            registry = get_registry(store_path)
+            network = DeviceNetwork(registry)
+            network.load()
+            rules_path = os.path.join(work_dir, "schedules.json")
+            results["rules"] = write_rules(rules_path, [device.device_id for device in network], seed)
+
+            backend = TaskHeap() if backend_name == "heap" else TimingWheel(60, start=clock.time())
+            engine = RecurringScheduler(network, backend, rules_path, clock)
+            started = time.perf_counter()
+            engine.load()
+            results["load_s"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            results["firings"] = engine.run_until(clock.time() + days * 24 * 3600)
+            results["run_s"] = time.perf_counter() - started
+            results["firings_per_sec"] = results["firings"] / results["run_s"]
+            results["simulated_days"] = (clock.time() - START.timestamp()) / (24 * 3600)
+            registry.storage.close()
+    finally:
+        set_clock(SystemClock())
+        set_default_sink(ConsoleSink())
+        configure_logging()
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Simulate a week of recurring device schedules.")
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--backend", choices=["heap", "wheel"], default="wheel")
+    args = parser.parse_args(argv)
+
+    results = run_week(args.devices, args.days, args.backend)
+    print(f"{results['rules']} rules over {args.devices} devices, {results['simulated_days']:.0f} simulated days")
+    print(f"load:  {results['load_s']:6.2f} s")
+    print(f"run:   {results['run_s']:6.2f} s, {results['firings']} firings ({results['firings_per_sec']:.0f}/s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Compares the scheduler's timer backends, `TaskHeap` and `TimingWheel`, on large schedules.
+
+Run from the repository root:
+    python -m benchmarks.scheduler_bench [--timers 1000000] [--devices 10000] [--resolution 60]
+
+Schedules `--timers` power toggles at minute granularity over one simulated day, then reports
+for every backend the time to add them, to cancel a tenth of them and to fire the rest while
+the clock advances minute by minute, re-arming every fired task for the next day as a
+recurring schedule would. Tasks are not executed on devices, so only the scheduler is timed.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from schedule_timers import Scheduler, TaskHeap, TimingWheel, Task
+
+TIMER_COUNT = 1_000_000
+DEVICE_COUNT = 10_000
+RESOLUTION = 60.0
+DAY = 24 * 60 * 60
+CANCEL_SHARE = 0.1
+START = 1_700_000_040.0
+
+
+def make_schedule(timer_count: int, device_count: int, seed: int = 0) -> tuple[list, list[float]]:
+    """
+    Returns device stand-ins and `timer_count` change times on minute boundaries within a day.
+    """
+    rng = random.Random(seed)
+    devices = [SimpleNamespace(device_id=f"{index:016x}") for index in range(device_count)]
+    times = [START + RESOLUTION * rng.randrange(1, DAY // int(RESOLUTION)) for _ in range(timer_count)]
+    return devices, times
+
+
+def run_backend(backend_name: str, devices: list, times: list[float], resolution: float, seed: int = 0) -> dict:
+    """
+    Times adding, cancelling, firing and re-arming every timer with one backend.
+    """
+    rng = random.Random(seed)
+    fired = 0
+
+    def rearm(tasks: list[Task]) -> None:
+        nonlocal fired
+        fired += len(tasks)
+        for task in tasks:
+            scheduler.add_task(task.change_time + DAY, task.change_action, task.device)
+
+    backend = TaskHeap() if backend_name == "heap" else TimingWheel(resolution, start=START)
+    scheduler = Scheduler(backend=backend, execute_batch=rearm)
+    device_count = len(devices)
+    results = {}
+    gc.collect()
+
+    started = time.perf_counter()
+    tasks = [
+        scheduler.add_task(change_time, "on" if index & 1 else "off", devices[index % device_count])
+        for index, change_time in enumerate(times)
+    ]
+    results["add_s"] = time.perf_counter() - started
+
+    cancelled = rng.sample(tasks, int(len(tasks) * CANCEL_SHARE))
+    del tasks
+    started = time.perf_counter()
+    for task in cancelled:
+        scheduler.cancel(task)
+    results["cancel_s"] = time.perf_counter() - started
+    del cancelled
+
+    slowest = 0.0
+    started = time.perf_counter()
+    for minute in range(1, DAY // int(RESOLUTION) + 1):
+        tick_started = time.perf_counter()
+        scheduler.check_tasks(START + minute * RESOLUTION)
+        slowest = max(slowest, time.perf_counter() - tick_started)
+    results["fire_and_rearm_s"] = time.perf_counter() - started
+    results["slowest_minute_ms"] = slowest * 1000
+    results["fired"] = fired
+    results["pending"] = len(scheduler)
+    timer_count = len(times)
+    results["add_per_sec"] = timer_count / results["add_s"]
+    results["fire_per_sec"] = fired / results["fire_and_rearm_s"] if fired else 0.0
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Compare the heap and timing wheel scheduler backends.")
+    parser.add_argument("--timers", type=int, default=TIMER_COUNT)
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--resolution", type=float, default=RESOLUTION,
+                        help="Timing wheel tick in seconds.")
+    parser.add_argument("--backends", nargs="+", default=["heap", "wheel"], choices=["heap", "wheel"])
+    args = parser.parse_args(argv)
+
+    devices, times = make_schedule(args.timers, args.devices)
+    print(f"{args.timers} timers over {args.devices} devices, one simulated day")
+    for backend_name in args.backends:
+        results = run_backend(backend_name, devices, times, args.resolution)
+        print(f"{backend_name:>5}: add {results['add_s']:6.2f} s ({results['add_per_sec']:9.0f}/s)"
+              f"  cancel {results['cancel_s']:5.2f} s"
+              f"  fire+re-arm {results['fire_and_rearm_s']:6.2f} s ({results['fire_per_sec']:9.0f}/s)"
+              f"  slowest minute {results['slowest_minute_ms']:7.1f} ms"
+              f"  fired {results['fired']}, pending {results['pending']}")
+
+
+if __name__ == '__main__':
+    main()
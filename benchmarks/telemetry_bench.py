@@ -0,0 +1,89 @@
+"""
+Measures telemetry ingest, range queries, downsampling and retention.
+
+Run from the repository root:
+    python -m benchmarks.telemetry_bench [--series 1000] [--readings 2000000] [--interval 60]
+
+Appends `--readings` readings one call at a time, spread over `--series` series as a fleet
+reporting every `--interval` seconds would, then flushes them and times a one-day range
+query and a downsampling to hourly buckets of one series, reading back the whole history of
+every series, and dropping the older half of the history with `apply_retention()`.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from telemetry import TelemetryStore, SEGMENT_SIZE
+
+SERIES_COUNT = 1_000
+READING_COUNT = 2_000_000
+INTERVAL = 60.0
+START = 1_700_000_000.0
+DAY = 24 * 3600
+QUERIES = 100
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the telemetry store.")
+    parser.add_argument("--series", type=int, default=SERIES_COUNT)
+    parser.add_argument("--readings", type=int, default=READING_COUNT)
+    parser.add_argument("--interval", type=float, default=INTERVAL, help="seconds between readings of a series")
+    parser.add_argument("--segment-size", type=int, default=SEGMENT_SIZE)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    series = [(f"{index:016x}", "temperature_c") for index in range(args.series)]
+    steps = args.readings // args.series
+    values = [rng.uniform(-20, 40) for _ in range(1024)]
+    end = START + steps * args.interval
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = TelemetryStore(work_dir, args.segment_size, retention=(end - START) / 2)
+        append = store.append
+        started = time.perf_counter()
+        for step in range(steps):
+            timestamp = START + step * args.interval
+            for number, (device_id, metric) in enumerate(series):
+                append(device_id, metric, timestamp, values[(step + number) & 1023])
+        elapsed = time.perf_counter() - started
+        readings = steps * args.series
+        print(f"{readings} readings over {args.series} series, {steps * args.interval / DAY:.1f} days")
+        print(f"append:     {elapsed:7.2f} s, {readings / elapsed:10.0f} readings/s")
+
+        started = time.perf_counter()
+        store.flush()
+        print(f"flush:      {time.perf_counter() - started:7.2f} s")
+
+        reopened = TelemetryStore(work_dir, args.segment_size, retention=(end - START) / 2)
+        started = time.perf_counter()
+        for _ in range(QUERIES):
+            device_id, metric = rng.choice(series)
+            day = START + rng.uniform(0, max(0.0, end - START - DAY))
+            times, _ = reopened.range(device_id, metric, day, day + DAY)
+        print(f"range 1 d:  {(time.perf_counter() - started) / QUERIES * 1000:7.2f} ms/query, {len(times)} readings")
+
+        started = time.perf_counter()
+        for _ in range(QUERIES):
+            device_id, metric = rng.choice(series)
+            buckets = reopened.downsample(device_id, metric, 3600)
+        print(f"hourly:     {(time.perf_counter() - started) / QUERIES * 1000:7.2f} ms/query, {len(buckets['time'])} buckets")
+
+        started = time.perf_counter()
+        total = sum(len(reopened.range(device_id, metric)[0]) for device_id, metric in series)
+        elapsed = time.perf_counter() - started
+        print(f"full scan:  {elapsed:7.2f} s, {total / elapsed:10.0f} readings/s")
+
+        started = time.perf_counter()
+        changed = reopened.apply_retention(end)
+        print(f"retention:  {time.perf_counter() - started:7.2f} s, {changed} segments dropped or trimmed")
+
+
+if __name__ == '__main__':
+    main()
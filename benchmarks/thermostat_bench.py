@@ -0,0 +1,95 @@
+"""
+Times the vectorized thermostat fleet simulation and writing its results back to the store.
+
+Run from the repository root:
+    python -m benchmarks.thermostat_bench [--thermostats 50000] [--hours 24] [--step 60] [--devices 10000]
+
+Simulates `--thermostats` rooms with randomized thermal parameters under both controllers,
+with a daily outdoor temperature wave and a night setback, then builds a fleet from the
+thermostats of a generated `--devices` store and times `write_back()` of its temperatures.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from benchmarks.devices_bench import prepare_store
+from device_events import NullSink, set_default_sink, ConsoleSink
+from device_registry import get_registry, use_store
+from logging_config import configure_logging
+from thermostat_sim import ThermostatFleet, OnOffControl, PidControl, daily_outdoor
+
+THERMOSTAT_COUNT = 50_000
+HOURS = 24
+STEP = 60.0
+DEVICE_COUNT = 10_000
+START = datetime(2026, 1, 5).timestamp()
+# Targets are lowered by this many degrees from 23:00 to 6:00.
+SETBACK_C = 3.0
+
+
+def make_fleet(count: int, seed: int = 0) -> ThermostatFleet:
+    rng = np.random.default_rng(seed)
+    return ThermostatFleet([f"{index:016x}" for index in range(count)],
+                           temperature=rng.uniform(12, 20, count), target=rng.choice([19.0, 20.0, 21.0, 22.0], count),
+                           time_constant_h=rng.uniform(4, 16, count), heating_rate_c_h=rng.uniform(2, 5, count),
+                           heater_kw=rng.uniform(3, 10, count))
+
+
+def setback_targets(fleet: ThermostatFleet, hours: float, step: float) -> np.ndarray:
+    steps = int(round(hours * 3600 / step))
+    hour = (np.arange(steps) * step / 3600) % 24
+    night = (hour >= 23) | (hour < 6)
+    return fleet.target[None, :] - SETBACK_C * night[:, None]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the thermostat fleet simulation.")
+    parser.add_argument("--thermostats", type=int, default=THERMOSTAT_COUNT)
+    parser.add_argument("--hours", type=float, default=HOURS)
+    parser.add_argument("--step", type=float, default=STEP)
+    parser.add_argument("--devices", type=int, default=DEVICE_COUNT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    set_default_sink(NullSink())
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            configure_logging(log_dir=work_dir)
+            steps = int(round(args.hours * 3600 / args.step))
+            print(f"{args.thermostats} thermostats, {args.hours:g} h in {steps} steps of {args.step:g} s")
+            for name, controller in (("on/off", OnOffControl()), ("pid", PidControl())):
+                fleet = make_fleet(args.thermostats, args.seed)
+                targets = setback_targets(fleet, args.hours, args.step)
+                started = time.perf_counter()
+                result = fleet.simulate(args.hours, controller, daily_outdoor(), args.step, START, targets)
+                elapsed = time.perf_counter() - started
+                moment, peak = result.peak_demand()
+                reached = np.count_nonzero(~np.isnan(result.reached_after_s))
+                print(f"{name:7} {elapsed:6.2f} s, {args.thermostats * steps / elapsed / 1e6:6.1f} M thermostat-steps/s, "
+                      f"{result.energy_kwh.sum():,.0f} kWh, peak {peak:,.0f} kW at {datetime.fromtimestamp(moment):%H:%M}, "
+                      f"{reached} reached target")
+
+            store_path, _ = prepare_store(work_dir, args.devices, 'json', args.seed)
+            use_store(store_path)
+            registry = get_registry(store_path)
+            fleet = ThermostatFleet.from_registry(registry)
+            fleet.simulate(args.hours, PidControl(), daily_outdoor(), args.step, START)
+            started = time.perf_counter()
+            updated = fleet.write_back(registry)
+            print(f"write back: {time.perf_counter() - started:6.2f} s for {updated} thermostats")
+            registry.storage.close()
+    finally:
+        set_default_sink(ConsoleSink())
+        configure_logging()
+
+
+if __name__ == '__main__':
+    main()
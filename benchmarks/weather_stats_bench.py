@@ -0,0 +1,93 @@
+"""
+Measures the streaming weather statistics: vectorized updates, single readings, batch
+computation over a long history, and backfilling from the telemetry store.
+
+Run from the repository root:
+    python -m benchmarks.weather_stats_bench [--stations 10000] [--steps 200] [--window 60]
+
+Every step adds one reading of every metric of every station in a single `update()` call.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from telemetry import TelemetryStore
+from weather_stats import WeatherStatsProcessor, METRICS, WINDOW, rolling_stats
+
+STATION_COUNT = 10_000
+STEPS = 200
+SINGLE_READINGS = 20_000
+HISTORY = 1_000_000
+BACKFILL_STATIONS = 1_000
+# Typical value and spread of every metric, in the order of `METRICS`.
+TYPICAL = np.array([15.0, 60.0, 1013.0, 12.0, 1.0])
+SPREAD = np.array([2.0, 5.0, 2.0, 4.0, 0.5])
+
+
+def readings(rng: np.random.Generator, stations: int) -> np.ndarray:
+    return (TYPICAL + SPREAD * rng.standard_normal((stations, len(METRICS)))).ravel()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark streaming weather statistics.")
+    parser.add_argument("--stations", type=int, default=STATION_COUNT)
+    parser.add_argument("--steps", type=int, default=STEPS)
+    parser.add_argument("--window", type=int, default=WINDOW)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+
+    station_ids = [f"{index:016x}" for index in range(args.stations)]
+    processor = WeatherStatsProcessor(args.window, station_ids)
+    streams = processor.streams(station_ids)
+    batches = [readings(rng, args.stations) for _ in range(min(args.steps, 50))]
+    started = time.perf_counter()
+    for step in range(args.steps):
+        processor.update(streams, batches[step % len(batches)])
+    elapsed = time.perf_counter() - started
+    total = args.steps * len(streams)
+    print(f"{args.stations} stations x {len(METRICS)} metrics, window {args.window}")
+    print(f"vectorized: {elapsed / args.steps * 1000:8.2f} ms/step, {total / elapsed / 1e6:6.2f} M readings/s")
+
+    started = time.perf_counter()
+    snapshot = processor.snapshot()
+    print(f"snapshot:   {(time.perf_counter() - started) * 1000:8.2f} ms, "
+          f"{np.count_nonzero(snapshot['flags'])} streams flagged on the last step")
+
+    values = readings(rng, SINGLE_READINGS // len(METRICS))
+    picks = rng.integers(0, len(streams), SINGLE_READINGS)
+    started = time.perf_counter()
+    for number in range(SINGLE_READINGS):
+        processor.update(streams[picks[number]:picks[number] + 1], values[number:number + 1])
+    elapsed = time.perf_counter() - started
+    print(f"single:     {elapsed / SINGLE_READINGS * 1e6:8.2f} us/reading")
+
+    history = TYPICAL[0] + SPREAD[0] * rng.standard_normal(HISTORY)
+    started = time.perf_counter()
+    rolling_stats(history, args.window, "temperature_c")
+    elapsed = time.perf_counter() - started
+    print(f"batch:      {elapsed:8.2f} s for {HISTORY} readings, {HISTORY / elapsed / 1e6:6.2f} M readings/s")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        store = TelemetryStore(work_dir)
+        stations = station_ids[:BACKFILL_STATIONS]
+        times = 1_700_000_000.0 + 60 * np.arange(10 * args.window)
+        for station_id in stations:
+            for column, metric in enumerate(METRICS):
+                store.append_many(station_id, metric, times, TYPICAL[column] + SPREAD[column] * rng.standard_normal(len(times)))
+        store.flush()
+        fresh = WeatherStatsProcessor(args.window, stations)
+        started = time.perf_counter()
+        replayed = fresh.backfill(TelemetryStore(work_dir))
+        print(f"backfill:   {time.perf_counter() - started:8.2f} s for {len(stations)} stations, {replayed} readings replayed")
+
+
+if __name__ == '__main__':
+    main()
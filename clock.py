@@ -0,0 +1,86 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+
+class Clock(ABC):
+    """
+    Source of the current time for the scheduler and device timestamps.
+    """
+
+    @abstractmethod
+    def time(self) -> float:
+        """
+        Returns the current time in seconds since the epoch.
+        """
+
+    def now(self) -> datetime:
+        """
+        Returns the current local time.
+        """
+        return datetime.fromtimestamp(self.time())
+
+    @abstractmethod
+    def wait_until(self, moment: float) -> None:
+        """
+        Returns once the time is `moment` or later.
+        """
+
+
+class SystemClock(Clock):
+    """
+    Wall-clock time.
+    """
+
+    def time(self) -> float:
+        return time.time()
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def wait_until(self, moment: float) -> None:
+        delay = moment - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SimulatedClock(Clock):
+    """
+    Clock that only moves when told to: `wait_until()` jumps straight to the requested time,
+    so e.g. a week of schedules runs as fast as the tasks themselves.
+
+    Args:
+        start (float | datetime | None): Initial time; the current wall-clock time if None.
+    """
+
+    def __init__(self, start: float | datetime | None = None):
+        if isinstance(start, datetime):
+            start = start.timestamp()
+        self._time = time.time() if start is None else float(start)
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._time
+
+    def wait_until(self, moment: float) -> None:
+        with self._lock:
+            if moment > self._time:
+                self._time = moment
+
+    def advance(self, seconds: float) -> None:
+        with self._lock:
+            self._time += seconds
+
+
+_clock: Clock = SystemClock()
+
+def set_clock(clock: Clock) -> None:
+    """
+    Sets the clock used by everything that is not given a clock of its own.
+    """
+    global _clock
+    _clock = clock
+
+def get_clock() -> Clock:
+    return _clock
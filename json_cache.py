@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+from typing import Any
+
+from metrics import metrics, count
+
+
+class JsonFileCache:
+    """
+    Keeps parsed JSON documents in memory, keyed by absolute file path.
+
+    A cached document is reused while the file's (mtime_ns, size, inode) signature is unchanged,
+    so a write by any process - including an atomic replace - invalidates it automatically.
+    """
+
+    def __init__(self):
+        self._entries: dict[str, tuple[tuple[int, int, int], Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def signature(file_path: str) -> tuple[int, int, int]:
+        """
+        Returns the (mtime_ns, size, inode) signature of `file_path`.
+        """
+        stat = os.stat(file_path)
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def load(self, file_path: str, copy: bool = False) -> Any:
+        """
+        Returns the parsed contents of `file_path`, parsing the file only if it changed.
+
+        Args:
+            file_path (str): Path to the JSON file.
+            copy (bool): If True, returns a deep copy the caller may modify freely.
+                Otherwise the shared cached document is returned and must be treated as read-only.
+
+        Returns:
+            Any: The parsed JSON document.
+        """
+        key = os.path.abspath(file_path)
+        signature = self.signature(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                data = entry[1]
+            else:
+                self.misses += 1
+                data = None
+
+        if data is None:
+            with open(key, 'r') as file:
+                data = json.load(file)
+            count("json_bytes_read_total", signature[1], source="cache")
+            with self._lock:
+                self._entries[key] = (signature, data)
+
+        return copy_json(data) if copy else data
+
+    def invalidate(self, file_path: str | None = None) -> None:
+        """
+        Drops the cached document for `file_path`, or every cached document if no path is given.
+        """
+        with self._lock:
+            if file_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(file_path), None)
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current hit rate.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def copy_json(data: Any) -> Any:
+    """
+    Returns a deep copy of a parsed JSON document; much cheaper than `copy.deepcopy` for plain JSON types.
+    """
+    if isinstance(data, dict):
+        return {key: copy_json(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [copy_json(value) for value in data]
+    return data
+
+
+json_cache = JsonFileCache()
+
+def _cache_gauges() -> list[tuple[str, dict, float]]:
+    stats = json_cache.stats()
+    return [
+        ("json_cache_hits", {}, stats["hits"]),
+        ("json_cache_misses", {}, stats["misses"]),
+        ("json_cache_hit_ratio", {}, stats["hit_rate"]),
+    ]
+
+metrics.add_collector(_cache_gauges)
+
+def load_json_cached(file_path: str, copy: bool = False) -> Any:
+    """
+    Loads `file_path` through the shared process-wide cache.
+
+    See `JsonFileCache.load` for the meaning of `copy`.
+    """
+    return json_cache.load(file_path, copy=copy)
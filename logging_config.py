@@ -1,5 +1,20 @@
+import atexit
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import time
+
+LOG_FILE_NAME = "app.log"
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 1.0
+
+_listener: 'BatchingQueueListener | None' = None
+# Settings of the logging module changed by `skip_caller_info`, as they were before.
+_caller_info_defaults: tuple | None = None
 
 def create_log_directory() -> str:
     """
@@ -14,11 +29,240 @@ def create_log_directory() -> str:
         os.makedirs(log_dir)
     return log_dir
 
+
+class BatchingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that flushes the file every `batch_size` records instead of after each one.
+
+    The file size is tracked in memory, so checking for rollover costs no system call.
+    A `max_bytes` of 0 never rotates.
+    """
+
+    def __init__(self, filename: str, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT,
+                 batch_size: int = BATCH_SIZE):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.batch_size = batch_size
+        self._size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        self._unflushed = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = self.format(record) + self.terminator
+            size = len(line) if line.isascii() else len(line.encode(self.encoding))
+            if self.maxBytes and self._size and self._size + size > self.maxBytes:
+                self.doRollover()
+                self._size = 0
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(line)
+            self._size += size
+            self._unflushed += 1
+            if self._unflushed >= self.batch_size:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self) -> None:
+        super().flush()
+        self._unflushed = 0
+
+
+class LogFormatter(logging.Formatter):
+    """
+    Formatter that renders the timestamp of a given second only once.
+    """
+
+    def __init__(self, fmt: str | None = None, datefmt: str | None = None):
+        super().__init__(fmt, datefmt)
+        self._second: int | None = None
+        self._second_text = ""
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str | None = None) -> str:
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime(self.default_time_format, self.converter(record.created))
+        return self.default_msec_format % (self._second_text, record.msecs)
+
+
+class JsonLinesFormatter(LogFormatter):
+    """
+    Formats every record as one JSON object per line.
+
+    Values passed with ``extra=`` are added as keys of their own, e.g.
+    ``logger.info("Power set", extra={"device_id": device_id})``.
+    """
+
+    _RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self._RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler for a listener in the same process: records are queued as they are, and
+    merging the message with its arguments is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """
+    Queue listener that lets its handlers buffer records and flushes them at least every `flush_interval` seconds.
+    """
+
+    def __init__(self, log_queue, *handlers, flush_interval: float = FLUSH_INTERVAL):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.flush_interval = flush_interval
+        self._pending_since: float | None = None
+
+    def dequeue(self, block: bool):
+        while True:
+            timeout = None
+            if self._pending_since is not None:
+                timeout = self._pending_since + self.flush_interval - time.monotonic()
+                if timeout <= 0:
+                    self.flush()
+                    continue
+            try:
+                record = self.queue.get(block, timeout)
+            except queue.Empty:
+                continue
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            return record
+
+    def flush(self) -> None:
+        for handler in self.handlers:
+            handler.flush()
+        self._pending_since = None
+
+
+def configure_logging(use_queue: bool = True, json_lines: bool = False, debug: bool = False,
+                      level: int = logging.INFO, log_dir: str | None = None,
+                      max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT,
+                      batch_size: int = BATCH_SIZE, flush_interval: float = FLUSH_INTERVAL,
+                      skip_caller_info: bool = False) -> logging.Logger:
+    """
+    (Re)configures the root logger, replacing any handlers it has.
+
+    In queue mode (the default) a logging call only puts the record on a queue; formatting and
+    writing happen on a background thread, which flushes the file every `batch_size` records or
+    `flush_interval` seconds. Otherwise records are written on the calling thread.
+
+    With `skip_caller_info`, records skip looking up the calling function, thread and process,
+    which none of the formats print. This switches the lookups off in the logging module, so
+    it applies to every logger of the process, including those of libraries; a later call
+    without it switches them back on.
+
+    Args:
+        use_queue (bool): If True, write the log on a background thread.
+        json_lines (bool): If True, write one JSON object per record instead of plain text.
+        debug (bool): If True, logs to the console as well.
+        level (int): Lowest level that is logged.
+        log_dir (str | None): Directory of the log file; defaults to `logs/` in the project directory.
+        max_bytes (int): Size at which the log file is rotated; 0 never rotates.
+        backup_count (int): Number of rotated log files kept.
+        batch_size (int): Number of records written between two flushes of the log file.
+        flush_interval (float): Longest time in seconds a queued record waits before it is flushed.
+        skip_caller_info (bool): If True, records of the whole process leave out the source file,
+            line, thread and process of the call.
+
+    Returns:
+        logging.Logger: Configured logger instance.
+    """
+    stop_logging()
+    logger = logging.getLogger()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger.setLevel(level)
+    _set_caller_info(not skip_caller_info)
+
+    if json_lines:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = LogFormatter("%(asctime)s - %(levelname)s - %(message)s")
+    log_dir = log_dir or create_log_directory()
+
+    # File handler (logs to a file)
+    file_handler = BatchingRotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE_NAME), max_bytes, backup_count, batch_size
+    )
+    file_handler.setFormatter(formatter)
+    handlers = [file_handler]
+
+    # Console handler (prints to console if debug is True)
+    if debug:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        handlers.append(console_handler)
+
+    if use_queue:
+        global _listener
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(LocalQueueHandler(log_queue))
+        _listener = BatchingQueueListener(log_queue, *handlers, flush_interval=flush_interval)
+        _listener.start()
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
+    return logger
+
+def _set_caller_info(enabled: bool) -> None:
+    """
+    Switches the logging module's caller, thread and process lookups off, or back to how they were.
+    """
+    global _caller_info_defaults
+    if not enabled and _caller_info_defaults is None:
+        _caller_info_defaults = (logging._srcfile, logging.logThreads, logging.logProcesses,
+                                 logging.logMultiprocessing)
+        logging._srcfile = None
+        logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+    elif enabled and _caller_info_defaults is not None:
+        (logging._srcfile, logging.logThreads, logging.logProcesses,
+         logging.logMultiprocessing) = _caller_info_defaults
+        _caller_info_defaults = None
+
+def stop_logging() -> None:
+    """
+    Stops the background log writer, if running, after it has written every queued record.
+    """
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+            handler.close()
+
+atexit.register(stop_logging)
+
 def get_logger(debug: bool = False) -> logging.Logger:
     """
     Returns a pre-configured logger.
     Logs messages to a file, and optionally to the console based on `debug`.
 
+    The root logger is configured with `configure_logging()` defaults on first use.
+
     Args:
         debug (bool): If True, logs to the console as well (default is False).
 
@@ -26,21 +270,6 @@ def get_logger(debug: bool = False) -> logging.Logger:
         logging.Logger: Configured logger instance.
     """
     logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-
     if not logger.hasHandlers(): # Prevent adding multiple handlers
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        log_dir = create_log_directory()
-
-        # File handler (logs to a file)
-        file_handler = logging.FileHandler(f"{log_dir}/app.log")
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-
-        # Console handler (prints to console if debug is True)
-        if debug:
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            logger.addHandler(console_handler)
-
-    return logger
\ No newline at end of file
+        configure_logging(debug=debug)
+    return logger
@@ -1,10 +1,15 @@
+import os
 import sys
 import tkinter as tk
-from ui_terminal import menu
+from ui_terminal import menu, DEVICES_PATH
 from ui_gui import update_ui, load_devices as load_devices_gui
+from device_registry import use_store
+from telemetry import start_recording
 
 
 def main():
+    use_store(DEVICES_PATH)
+    start_recording(directory=os.path.join(os.path.dirname(DEVICES_PATH), "telemetry"))
     print("SmartCode Developers")
     print("Choose interface:")
     print("1. Terminal")
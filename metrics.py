@@ -0,0 +1,334 @@
+import functools
+import os
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from contextlib import contextmanager
+from typing import Callable
+
+from logging_config import create_log_directory
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+EXPORT_INTERVAL = 15.0
+EXPORT_FILE_NAME = "metrics.prom"
+
+_enabled = False
+
+
+class Histogram:
+    """
+    Cumulative latency histogram with fixed bucket bounds, as Prometheus exposes it.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the `fraction` quantile (inf past the last bucket).
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    In-process store of counters and latency histograms, keyed by metric name and labels.
+
+    Collectors registered with `add_collector()` are called on every `snapshot()` and
+    `to_prometheus()` and report values kept elsewhere, such as cache hit rates.
+    """
+
+    def __init__(self):
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._help: dict[str, str] = {}
+        self._collectors: list[Callable[[], list[tuple[str, dict, float]]]] = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def count(self, name: str, amount: float = 1, **labels) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        self.observe_series(name, tuple(sorted(labels.items())), seconds)
+
+    def observe_series(self, name: str, key: tuple, seconds: float) -> None:
+        """
+        As `observe()`, with the labels given as a sorted tuple of (label, value) pairs.
+        """
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+    def add_collector(self, collector: Callable[[], list[tuple[str, dict, float]]]) -> None:
+        """
+        Registers a callable returning ``(name, labels, value)`` gauges to report.
+        """
+        self._collectors.append(collector)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def _gauges(self) -> list[tuple[str, dict, float]]:
+        gauges = []
+        for collector in self._collectors:
+            gauges.extend(collector())
+        return gauges
+
+    def snapshot(self) -> dict:
+        """
+        Returns every metric as plain data, e.g. for a status page or a test.
+
+        Series are keyed by their labels rendered as ``"key=value,..."`` ("" without labels).
+        """
+        with self._lock:
+            counters = {
+                name: {_label_key(key): value for key, value in series.items()}
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: {
+                    _label_key(key): {
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                        "p50": histogram.quantile(0.50),
+                        "p99": histogram.quantile(0.99),
+                    }
+                    for key, histogram in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+        gauges: dict[str, dict[str, float]] = {}
+        for name, labels, value in self._gauges():
+            gauges.setdefault(name, {})[_label_key(tuple(sorted(labels.items())))] = value
+        return {"counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                self._header(lines, name, "counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+            for name, series in sorted(self._histograms.items()):
+                self._header(lines, name, "histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(key)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(key)} {histogram.count}")
+        described = set()
+        for name, labels, value in sorted(self._gauges(), key=lambda gauge: gauge[0]):
+            if name not in described:
+                described.add(name)
+                self._header(lines, name, "gauge")
+            lines.append(f"{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _header(self, lines: list[str], name: str, metric_type: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {metric_type}")
+
+
+def _label_key(key: tuple) -> str:
+    return ",".join(f"{label}={value}" for label, value in key)
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(key: tuple) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in key) + "}"
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
+
+def enable() -> None:
+    """
+    Starts recording metrics. Until then every instrumentation call returns immediately.
+    """
+    global _enabled
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def count(name: str, amount: float = 1, **labels) -> None:
+    """
+    Adds `amount` to the counter `name`, if metrics are enabled.
+    """
+    if _enabled:
+        metrics.count(name, amount, **labels)
+
+def timed(name: str, **labels):
+    """
+    Decorator recording the latency of every call in the histogram `name`.
+
+    The qualified function name (e.g. ``Device.turn_on_off``) is added as the `operation`
+    label unless one is given. While metrics
+    are disabled the wrapper only checks a flag before calling the function.
+
+    Example:
+        @timed("device_operation_seconds")
+        def turn_on_off(self, new_state): ...
+    """
+    def decorator(func):
+        key = tuple(sorted({"operation": func.__qualname__, **labels}.items()))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe_series(name, key, perf_counter() - started)
+        return wrapper
+    return decorator
+
+@contextmanager
+def _timer(name: str, labels: dict):
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe(name, perf_counter() - started, **labels)
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+def timer(name: str, **labels):
+    """
+    Context manager recording the latency of its block in the histogram `name`.
+
+    Example:
+        with timer("device_operation_seconds", operation="bulk_power"):
+            ...
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _timer(name, labels)
+
+
+metrics.describe("device_operation_seconds", "Latency of Device and BulbNetwork operations.")
+metrics.describe("storage_operation_seconds", "Latency of device registry loads and commits.")
+metrics.describe("json_bytes_read_total", "Bytes of JSON parsed from disk.")
+metrics.describe("json_bytes_written_total", "Bytes of JSON written to disk.")
+metrics.describe("device_snapshot_cache_total", "Device snapshot reads served from (hit) or past (miss) the TTL cache.")
+metrics.describe("json_cache_hit_ratio", "Share of JSON loads served from the parse cache.")
+metrics.describe("scheduler_tasks_total", "Scheduled device tasks run, by result.")
+metrics.describe("automation_rules_total", "Automation rule firings, by result.")
+metrics.describe("telemetry_segments_written_total", "Telemetry segments written to disk.")
+metrics.describe("telemetry_bytes_written_total", "Bytes of telemetry readings written to disk.")
+metrics.describe("telemetry_queries_total", "Telemetry range queries, including the ones behind downsampling.")
+metrics.describe("energy_report_seconds", "Time to build a plug energy report.")
+metrics.describe("weather_readings_processed_total", "Weather station readings added to the streaming statistics.")
+metrics.describe("thermostat_simulation_seconds", "Time to simulate a thermostat fleet.")
+
+
+class PrometheusFileExporter:
+    """
+    Writes `metrics.to_prometheus()` to `path` every `interval` seconds on a background thread.
+
+    The file is replaced atomically, so a node exporter textfile collector or any other
+    reader never sees a partial dump.
+    """
+
+    def __init__(self, path: str, interval: float = EXPORT_INTERVAL, source: Metrics = metrics):
+        self.path = path
+        self.interval = interval
+        self.source = source
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def write(self) -> None:
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w') as file:
+            file.write(self.source.to_prometheus())
+        os.replace(temp_path, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops the thread and writes a final dump.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
+
+
+def start_exporter(path: str | None = None, interval: float = EXPORT_INTERVAL) -> PrometheusFileExporter:
+    """
+    Enables metrics and dumps them periodically in Prometheus text format.
+
+    Args:
+        path (str | None): Output file; defaults to `logs/metrics.prom` in the project directory.
+        interval (float): Seconds between two dumps.
+    """
+    if path is None:
+        path = os.path.join(create_log_directory(), EXPORT_FILE_NAME)
+    enable()
+    exporter = PrometheusFileExporter(path, interval)
+    exporter.start()
+    return exporter
@@ -0,0 +1,424 @@
+import functools
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from schedule_timers import ChangeAction, Scheduler, Task, TimerBackend, run_task
+from clock import Clock
+from json_cache import load_json_cached
+from logging_config import get_logger
+from device_network import DeviceNetwork
+from device_storage import save_json
+
+SCHEDULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schedules.json")
+# Cron expressions are searched this many days ahead (or back) before giving up, e.g. for "0 0 31 2 *".
+MAX_SEARCH_DAYS = 366 * 5
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+# Longest time, in wall-clock seconds, the next firing times of fired rules wait to be written.
+SAVE_INTERVAL = 60.0
+
+
+class Recurrence(ABC):
+    """
+    When a recurring rule fires; times are seconds since the epoch, calendar rules use local time.
+    """
+
+    @abstractmethod
+    def next_after(self, moment: float) -> float:
+        """
+        Returns the first firing strictly after `moment`.
+        """
+
+    @abstractmethod
+    def last_at_or_before(self, moment: float) -> float | None:
+        """
+        Returns the last firing at or before `moment`, or None if there is none.
+        """
+
+    @abstractmethod
+    def to_json(self) -> dict:
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def _parse_cron_field(field: str, low: int, high: int) -> tuple[int, ...]:
+    values = set()
+    for part in field.split(','):
+        expression, _, step = part.partition('/')
+        if expression == '*':
+            start, end = low, high
+        elif '-' in expression:
+            start, end = (int(value) for value in expression.split('-', 1))
+        else:
+            start = end = int(expression)
+        if not low <= start <= end <= high:
+            raise ValueError(f"Cron field {field!r} is out of range {low}-{high}.")
+        values.update(range(start, end + 1, int(step) if step else 1))
+    return tuple(sorted(values))
+
+
+class CronRecurrence(Recurrence):
+    """
+    Standard five-field cron expression: minute, hour, day of month, month, day of week
+    (0 or 7 is Sunday), each a `*`, value, range or list, with an optional `/step`,
+    e.g. ``"30 7 * * 1-5"`` for 7:30 on working days.
+
+    As in cron, when both the day of month and the day of week are restricted, a day
+    matching either one fires.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression {expression!r} must have 5 fields.")
+        self.expression = expression
+        self.minutes = _parse_cron_field(fields[0], 0, 59)
+        self.hours = _parse_cron_field(fields[1], 0, 23)
+        self.days = set(_parse_cron_field(fields[2], 1, 31))
+        self.months = set(_parse_cron_field(fields[3], 1, 12))
+        # Cron counts weekdays from Sunday, datetime.weekday() from Monday.
+        self.weekdays = {(day - 1) % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+        self._any_day = fields[2] == '*'
+        self._any_weekday = fields[4] == '*'
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        in_days = day.day in self.days
+        in_weekdays = day.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: float) -> float:
+        start = datetime.fromtimestamp(moment).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(MAX_SEARCH_DAYS):
+            if self._day_matches(day):
+                first_day = day.date() == start.date()
+                for hour in self.hours[bisect_left(self.hours, start.hour) if first_day else 0:]:
+                    from_minute = start.minute if first_day and hour == start.hour else 0
+                    index = bisect_left(self.minutes, from_minute)
+                    if index < len(self.minutes):
+                        return day.replace(hour=hour, minute=self.minutes[index]).timestamp()
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression {self.expression!r} does not fire in {MAX_SEARCH_DAYS} days.")
+
+    def last_at_or_before(self, moment: float) -> float | None:
+        end = datetime.fromtimestamp(moment).replace(second=0, microsecond=0)
+        day = end.replace(hour=0, minute=0)
+        for _ in range(MAX_SEARCH_DAYS):
+            if self._day_matches(day):
+                last_day = day.date() == end.date()
+                hours = self.hours[:bisect_right(self.hours, end.hour)] if last_day else self.hours
+                for hour in reversed(hours):
+                    to_minute = end.minute if last_day and hour == end.hour else 59
+                    index = bisect_right(self.minutes, to_minute)
+                    if index:
+                        return day.replace(hour=hour, minute=self.minutes[index - 1]).timestamp()
+            day -= timedelta(days=1)
+        return None
+
+    def to_json(self) -> dict:
+        return {"cron": self.expression}
+
+
+class WeekdayRecurrence(CronRecurrence):
+    """
+    Fires at `at` ("HH:MM") on the days of the `weekdays` mask, bit 0 being Monday,
+    e.g. ``WeekdayRecurrence(0b0011111, "07:30")`` for working days.
+    """
+
+    def __init__(self, weekdays: int, at: str):
+        if not 0 < weekdays < 1 << 7:
+            raise ValueError(f"Weekday mask {weekdays!r} selects no valid day.")
+        hour, minute = (int(value) for value in at.split(':'))
+        days = ','.join(str((day + 1) % 7) for day in range(7) if weekdays >> day & 1)
+        super().__init__(f"{minute} {hour} * * {days}")
+        self.weekday_mask = weekdays
+        self.at = at
+
+    @classmethod
+    def from_names(cls, names: list[str], at: str) -> 'WeekdayRecurrence':
+        """
+        Builds the mask from day names, e.g. ``from_names(["sat", "sun"], "09:00")``.
+        """
+        return cls(sum(1 << WEEKDAYS.index(name.lower()[:3]) for name in names), at)
+
+    def to_json(self) -> dict:
+        return {"weekdays": self.weekday_mask, "at": self.at}
+
+
+class IntervalRecurrence(Recurrence):
+    """
+    Fires every `interval` seconds from `start` on.
+    """
+
+    def __init__(self, interval: float, start: float):
+        if interval <= 0:
+            raise ValueError("The interval must be positive.")
+        self.interval = interval
+        self.start = start
+
+    def next_after(self, moment: float) -> float:
+        if moment < self.start:
+            return self.start
+        return self.start + ((moment - self.start) // self.interval + 1) * self.interval
+
+    def last_at_or_before(self, moment: float) -> float | None:
+        if moment < self.start:
+            return None
+        return self.start + (moment - self.start) // self.interval * self.interval
+
+    def to_json(self) -> dict:
+        return {"interval": self.interval, "start": self.start}
+
+
+def recurrence_from_json(data: dict) -> Recurrence:
+    if 'cron' in data:
+        return CronRecurrence(data['cron'])
+    if 'weekdays' in data:
+        return WeekdayRecurrence(data['weekdays'], data['at'])
+    if 'interval' in data:
+        return IntervalRecurrence(data['interval'], data['start'])
+    raise ValueError(f"Rule has no recurrence: {data!r}")
+
+
+class Rule:
+    """
+    Recurring `action` of one device, with its next firing time stored alongside it.
+    """
+
+    def __init__(self, rule_id: str, device_id: str, action: ChangeAction | str, recurrence: Recurrence,
+                 next_fire: float | None = None):
+        self.rule_id = rule_id
+        self.device_id = device_id
+        self.action = ChangeAction(action)
+        self.recurrence = recurrence
+        self.next_fire = next_fire
+
+    @classmethod
+    def from_json(cls, rule_id: str, data: dict) -> 'Rule':
+        return cls(rule_id, data['device_id'], data['action'], recurrence_from_json(data), data.get('next_fire'))
+
+    def to_json(self) -> dict:
+        return {
+            "device_id": self.device_id,
+            "action": self.action.value,
+            **self.recurrence.to_json(),
+            "next_fire": self.next_fire,
+        }
+
+    def __repr__(self) -> str:
+        return f"Rule({self.rule_id!r}, {self.device_id}, {self.action.name}, {self.recurrence.to_json()})"
+
+
+class RecurringScheduler:
+    """
+    Runs recurring device rules and keeps them in schedules.json next to devices.json.
+
+    Every rule is stored with its next firing time, so loading the rules only reads them:
+    rules are not expanded again at startup, except those whose next firing was missed.
+    Those are caught up per device: of all the firings a device missed while the scheduler
+    was not running, only the last one is applied, in one registry batch.
+
+    Rules firing together are run in one registry batch. Their new next firing times are
+    written at most every `save_interval` seconds and on `stop()`; if the process dies in
+    between, the next `load()` takes the unsaved firings for missed ones and applies the
+    latest action of each device again, which leaves the devices as they were.
+
+    Args:
+        network (DeviceNetwork | None): Devices the rules refer to; every device in the registry if None.
+        backend (TimerBackend | None): Timer backend of the underlying `Scheduler`, e.g. a `TimingWheel`.
+        store_path (str): File the rules are kept in.
+        clock (Clock | None): Clock of the underlying `Scheduler`; the default clock if None.
+        save_interval (float): Longest time fired rules wait to be saved, in wall-clock seconds
+            whatever the clock, since it guards against crashes.
+    """
+
+    def __init__(self, network: DeviceNetwork | None = None, backend: TimerBackend | None = None,
+                 store_path: str = SCHEDULES_PATH, clock: Clock | None = None,
+                 save_interval: float = SAVE_INTERVAL):
+        if network is None:
+            network = DeviceNetwork()
+            network.load()
+        self.network = network
+        self.store_path = store_path
+        self.scheduler = Scheduler(backend=backend, execute_batch=self._fire, clock=clock)
+        self.clock = self.scheduler.clock
+        self.save_interval = save_interval
+        self.logger = get_logger()
+        self._rules: dict[str, Rule] = {}
+        self._tasks: dict[str, Task] = {}
+        self._task_rules: dict[int, str] = {}
+        self._lock = threading.RLock()
+        self._saved_at = time.monotonic()
+        self._unsaved = False
+
+    def rules(self) -> list[Rule]:
+        with self._lock:
+            return list(self._rules.values())
+
+    def _save(self) -> None:
+        save_json({"rules": {rule_id: rule.to_json() for rule_id, rule in self._rules.items()}}, self.store_path)
+        self._saved_at = time.monotonic()
+        self._unsaved = False
+
+    def save(self) -> None:
+        """
+        Writes the rules if fired, added or removed rules have not been saved yet.
+        """
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def _arm(self, rule: Rule) -> None:
+        device = self.network.get(rule.device_id)
+        if device is None:
+            self.logger.warning(f"Rule {rule.rule_id} refers to unknown device {rule.device_id}.")
+            return
+        task = self.scheduler.add_task(rule.next_fire, rule.action, device)
+        self._tasks[rule.rule_id] = task
+        self._task_rules[task.task_id] = rule.rule_id
+
+    def load(self, now: float | None = None) -> dict[str, ChangeAction]:
+        """
+        Loads the stored rules, catches up missed firings and schedules every rule.
+
+        Returns:
+            dict[str, ChangeAction]: The action applied to every device that missed firings.
+        """
+        now = self.clock.time() if now is None else now
+        document = load_json_cached(self.store_path) if os.path.exists(self.store_path) else {}
+        rules = [Rule.from_json(rule_id, data) for rule_id, data in document.get('rules', {}).items()]
+        # device_id -> (time of the last missed firing, action)
+        missed: dict[str, tuple[float, ChangeAction]] = {}
+        for rule in rules:
+            if rule.next_fire is None or rule.next_fire > now:
+                continue
+            last = rule.recurrence.last_at_or_before(now)
+            if last is not None and last >= rule.next_fire:
+                if rule.device_id not in missed or last >= missed[rule.device_id][0]:
+                    missed[rule.device_id] = (last, rule.action)
+            rule.next_fire = None
+        with self._lock:
+            self._clear()
+            for rule in rules:
+                if rule.next_fire is None:
+                    rule.next_fire = rule.recurrence.next_after(now)
+                self._rules[rule.rule_id] = rule
+            caught_up = {}
+            with self.network.registry.batch():
+                for device_id, (_, action) in missed.items():
+                    device = self.network.get(device_id)
+                    if device is not None:
+                        device.turn_on_off(action.value)
+                        caught_up[device_id] = action
+            if missed:
+                self.logger.info(f"Caught up missed schedules of {len(caught_up)} devices.")
+                self._save()
+            for rule in self._rules.values():
+                self._arm(rule)
+        return caught_up
+
+    def _clear(self) -> None:
+        for task in self._tasks.values():
+            self.scheduler.cancel(task)
+        self._rules = {}
+        self._tasks = {}
+        self._task_rules = {}
+
+    def add_rule(self, device_id: str, action: ChangeAction | str, recurrence: Recurrence,
+                 now: float | None = None, save: bool = True) -> Rule:
+        """
+        Stores and schedules a new rule, e.g.
+        ``add_rule(plug_id, "on", WeekdayRecurrence.from_names(["mon", "fri"], "07:30"))``.
+
+        Every call rewrites the whole rules file; to add many rules, pass ``save=False`` and
+        call `save()` after the last one.
+        """
+        now = self.clock.time() if now is None else now
+        rule = Rule(uuid.uuid4().hex[:16], device_id, action, recurrence, recurrence.next_after(now))
+        with self._lock:
+            self._rules[rule.rule_id] = rule
+            self._unsaved = True
+            if save:
+                self._save()
+            self._arm(rule)
+        return rule
+
+    def remove_rule(self, rule_id: str, save: bool = True) -> bool:
+        """
+        Removes a rule. Returns False if there was no such rule.
+
+        As with `add_rule()`, ``save=False`` leaves the rules file to the next `save()`.
+        """
+        with self._lock:
+            if self._rules.pop(rule_id, None) is None:
+                return False
+            task = self._tasks.pop(rule_id, None)
+            if task is not None:
+                self._task_rules.pop(task.task_id, None)
+                self.scheduler.cancel(task)
+            self._unsaved = True
+            if save:
+                self._save()
+            return True
+
+    def _fire(self, tasks: list[Task]) -> None:
+        try:
+            with self.network.registry.batch():
+                for task in tasks:
+                    run_task(task)
+        finally:
+            with self._lock:
+                for task in tasks:
+                    rule = self._rules.get(self._task_rules.pop(task.task_id, None))
+                    if rule is not None:
+                        rule.next_fire = rule.recurrence.next_after(task.change_time)
+                        self._arm(rule)
+                self._unsaved = True
+                if time.monotonic() - self._saved_at >= self.save_interval:
+                    self._save()
+
+    def check_rules(self, now: float | None = None) -> int:
+        """
+        Fires the rules due at `now` on the calling thread; see `Scheduler.check_tasks`.
+        """
+        return self.scheduler.check_tasks(now)
+
+    def run_until(self, end: datetime | float) -> int:
+        """
+        Fires the rules due until `end` on the calling thread; see `Scheduler.run_until`.
+        """
+        fired = self.scheduler.run_until(end)
+        self.save()
+        return fired
+
+    def start(self) -> None:
+        self.scheduler.start()
+
+    def stop(self) -> None:
+        self.scheduler.stop()
+        self.save()
+
+
+if __name__ == '__main__':
+    from device_registry import use_store
+    from telemetry import start_recording
+    use_store(os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json"))
+    start_recording(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry"))
+    engine = RecurringScheduler()
+    for device_id, action in engine.load().items():
+        print(f"Caught up {device_id}: {action.value}")
+    print(f"{len(engine.rules())} rules scheduled.")
+    engine.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        engine.stop()
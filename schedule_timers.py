@@ -1,37 +1,511 @@
-import json
+import heapq
+import itertools
+import math
 import os
-from typing import Dict, Any
-
-from datetime import timedelta, datetime
-from ui_terminal import *
-import datetime
-from devices import *
+import sys
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor
+from datetime import datetime
 from enum import Enum
+from typing import Callable
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Devices"))
+from clock import Clock, get_clock
+from logging_config import get_logger
+from metrics import count
+from device import Device
+
+# The heap is rebuilt without cancelled tasks once they outnumber the pending ones
+# (and there are at least this many of them).
+COMPACT_MIN = 1024
+# Timing wheel defaults: one-second ticks, four wheels of 64 slots (64**4 ticks, about 194 days).
+WHEEL_RESOLUTION = 1.0
+WHEEL_SLOT_BITS = 6
+WHEEL_LEVELS = 4
+# Absorbs float rounding when converting times to ticks, e.g. 0.3 / 0.1 == 2.9999999999999996.
+_TICK_EPSILON = 1e-9
+
+
+class ChangeAction(Enum):
+    """
+    What a task does to its device; the value is the power state passed to `Device.turn_on_off`.
+    """
+    TURN_ON = "on"
+    TURN_OFF = "off"
+
+
+# Power states and actions to their action, for add_task().
+_ACTIONS = {key: action for action in ChangeAction for key in (action, action.value)}
+
 
 class Task:
-    def __init__(self, change_time, change_action, device):
+    """
+    One pending change of a device, due at `change_time` (seconds since the epoch).
+    """
+
+    __slots__ = ('task_id', 'change_time', 'change_action', 'device', 'cancelled', 'slot')
+
+    def __init__(self, task_id: int, change_time: float, change_action: ChangeAction, device: Device):
+        self.task_id = task_id
         self.change_time = change_time
-        self.change_action = Enum("Change action", [("turn on", 0), ("turn off", 1)])
+        self.change_action = change_action
         self.device = device
+        self.cancelled = False
+        # Where the timer backend keeps the task, for removing it in O(1).
+        self.slot = None
+
+    def __repr__(self) -> str:
+        when = datetime.fromtimestamp(self.change_time).strftime("%Y-%m-%d %H:%M:%S")
+        return f"Task({self.task_id}, {when}, {self.change_action.name}, {self.device.device_id})"
+
+
+def run_task(task: Task) -> None:
+    """
+    Default executor: sets the device's power to the state of the task's action.
+    """
+    task.device.turn_on_off(task.change_action.value)
+
+
+def run_tasks(tasks: list[Task]) -> None:
+    """
+    Batch executor: runs `run_task` for every task inside one registry batch, so all the
+    power changes due together are saved with a single commit.
+    """
+    if not tasks:
+        return
+    with tasks[0].device.registry.batch():
+        for task in tasks:
+            run_task(task)
+
+
+def _to_timestamp(change_time: datetime | float) -> float:
+    if isinstance(change_time, datetime):
+        return change_time.timestamp()
+    return float(change_time)
+
+
+class TimerBackend(ABC):
+    """
+    Holds the pending tasks of a `Scheduler` ordered by change time.
+
+    The scheduler keeps the backend behind its lock; backends are not thread-safe on their own.
+    """
+
+    @abstractmethod
+    def push(self, task: Task) -> None:
+        pass
+
+    @abstractmethod
+    def remove(self, task: Task) -> None:
+        """
+        Removes a pending task; the scheduler has already marked it cancelled.
+        """
+
+    @abstractmethod
+    def pop_due(self, now: float) -> list[Task]:
+        """
+        Removes and returns every task due at `now`.
+        """
+
+    @abstractmethod
+    def next_time(self) -> float | None:
+        """
+        Returns when `pop_due()` may next return tasks, or None if there are no tasks.
+        """
+
+
+class TaskHeap(TimerBackend):
+    """
+    Min-heap of tasks keyed by change time: O(log n) push and pop, exact firing times.
+
+    Removing a task leaves it in the heap until it comes up; the heap is rebuilt once such
+    tasks outnumber the pending ones.
+    """
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, Task]] = []
+        self._cancelled = 0
+
+    def push(self, task: Task) -> None:
+        heapq.heappush(self._heap, (task.change_time, task.task_id, task))
+
+    def remove(self, task: Task) -> None:
+        self._cancelled += 1
+        if self._cancelled >= COMPACT_MIN and self._cancelled * 2 > len(self._heap):
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def pop_due(self, now: float) -> list[Task]:
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            task = heapq.heappop(heap)[2]
+            if task.cancelled:
+                self._cancelled -= 1
+            else:
+                due.append(task)
+        return due
+
+    def next_time(self) -> float | None:
+        heap = self._heap
+        while heap and heap[0][2].cancelled:
+            heapq.heappop(heap)
+            self._cancelled -= 1
+        return heap[0][0] if heap else None
+
+
+class _Bucket(dict):
+    """
+    Slot of a `TimingWheel`: tasks by `task_id`, and the wheel the slot belongs to.
+    """
+    __slots__ = ('level',)
+
+    def __init__(self, level: int):
+        super().__init__()
+        self.level = level
+
+
+class TimingWheel(TimerBackend):
+    """
+    Hashed hierarchical timing wheel: O(1) push, remove and tick, at the cost of firing
+    times rounded up to the next multiple of `resolution` seconds.
+
+    Wheel 0 has one slot per tick; every slot of wheel n spans a full turn of wheel n - 1.
+    A task goes to the lowest wheel whose turn reaches its tick, and is moved down a wheel
+    ("cascaded") when the wheel below starts the turn it is due in. Tasks past the last
+    wheel wait in an overflow slot that is cascaded whenever the last wheel starts a turn.
+
+    All tasks due in the same tick come out of one slot in a single `pop_due()` call, in the
+    order they were pushed, and can be run as one batch. Runs of empty ticks are skipped
+    rather than stepped through.
+
+    Args:
+        resolution (float): Seconds per tick, e.g. 60 for minute schedules.
+        slot_bits (int): log2 of the number of slots per wheel.
+        levels (int): Number of wheels.
+        start (float | None): Time of the first tick, in seconds since the epoch; now if None.
+    """
+
+    def __init__(self, resolution: float = WHEEL_RESOLUTION, slot_bits: int = WHEEL_SLOT_BITS,
+                 levels: int = WHEEL_LEVELS, start: float | None = None):
+        self.resolution = resolution
+        self._bits = slot_bits
+        self._size = 1 << slot_bits
+        self._mask = self._size - 1
+        self._levels = levels
+        self._wheels = [[_Bucket(level) for _ in range(self._size)] for level in range(levels)]
+        self._overflow = _Bucket(levels)
+        # Number of tasks per wheel, the overflow slot last.
+        self._counts = [0] * (levels + 1)
+        # Next tick to process; every earlier tick has been fired.
+        start = get_clock().time() if start is None else start
+        self._tick = math.floor(start / resolution + _TICK_EPSILON)
+
+    def __len__(self) -> int:
+        return sum(self._counts)
+
+    def push(self, task: Task) -> None:
+        tick = math.ceil(task.change_time / self.resolution - _TICK_EPSILON)
+        delta = tick - self._tick
+        if delta < self._size:
+            bucket = self._wheels[0][(tick if delta >= 0 else self._tick) & self._mask]
+        else:
+            level = (delta.bit_length() - 1) // self._bits
+            if level < self._levels:
+                bucket = self._wheels[level][(tick >> (self._bits * level)) & self._mask]
+            else:
+                bucket = self._overflow
+        bucket[task.task_id] = task
+        task.slot = bucket
+        self._counts[bucket.level] += 1
+
+    def remove(self, task: Task) -> None:
+        bucket = task.slot
+        del bucket[task.task_id]
+        self._counts[bucket.level] -= 1
+        task.slot = None
+
+    def _cascade(self, level: int) -> None:
+        if level == self._levels:
+            bucket = self._overflow
+        else:
+            bucket = self._wheels[level][(self._tick >> (self._bits * level)) & self._mask]
+        if not bucket:
+            return
+        tasks = list(bucket.values())
+        bucket.clear()
+        self._counts[level] -= len(tasks)
+        for task in tasks:
+            self.push(task)
+
+    def _lowest_level(self) -> int | None:
+        for level, count in enumerate(self._counts):
+            if count:
+                return level
+        return None
+
+    def _boundary(self, level: int) -> int:
+        """
+        Returns the first tick from the current one at which wheel `level` is cascaded.
+        """
+        step = 1 << (self._bits * level)
+        return -(-self._tick // step) * step
+
+    def pop_due(self, now: float) -> list[Task]:
+        target = math.floor(now / self.resolution + _TICK_EPSILON)
+        due: list[Task] = []
+        bits = self._bits
+        wheel = self._wheels[0]
+        while self._tick <= target:
+            level = self._lowest_level()
+            if level is None:
+                self._tick = target + 1
+                break
+            if level:
+                # Nothing on the lower wheels: jump to the next tick that cascades `level`.
+                boundary = self._boundary(level)
+                if boundary > target:
+                    self._tick = target + 1
+                    break
+                self._tick = boundary
+            tick = self._tick
+            for level in range(1, self._levels + 1):
+                if tick & ((1 << (bits * level)) - 1):
+                    break
+                self._cascade(level)
+            bucket = wheel[tick & self._mask]
+            if bucket:
+                self._counts[0] -= len(bucket)
+                due.extend(bucket.values())
+                bucket.clear()
+            self._tick = tick + 1
+        return due
+
+    def next_time(self) -> float | None:
+        level = self._lowest_level()
+        if level is None:
+            return None
+        next_tick = None
+        if level == 0:
+            wheel, tick = self._wheels[0], self._tick
+            for offset in range(self._size):
+                if wheel[(tick + offset) & self._mask]:
+                    next_tick = tick + offset
+                    break
+            level = next((level for level in range(1, self._levels + 1) if self._counts[level]), None)
+        if level is not None:
+            boundary = self._boundary(level)
+            next_tick = boundary if next_tick is None else min(next_tick, boundary)
+        return next_tick * self.resolution
+
+
+class Scheduler:
+    """
+    Runs device tasks at their change time.
+
+    Pending tasks are kept in a timer backend: a `TaskHeap` by default, where adding a task and
+    taking the next due one cost O(log n) whatever the number of pending tasks, or a
+    `TimingWheel` for very large recurring schedules, where both cost O(1).
+
+    After `start()` a worker thread sleeps until the earliest change time and wakes up early
+    only when a task with an earlier time is added, so pending tasks cost no CPU while idle.
+    Without the thread, `check_tasks()` runs the due tasks on the calling thread and
+    `run_until()` runs them up to a given time, which with a `SimulatedClock` takes no longer
+    than running the tasks. The worker thread sleeps in wall-clock time, so it is meant for
+    the system clock only.
+
+    Args:
+        execute (Callable[[Task], None]): Called for every due task; `run_task` by default.
+        executor (Executor | None): Pool the due tasks are submitted to, so a slow device does not
+            delay the following tasks; if None they run one after another on the worker thread.
+        backend (TimerBackend | None): Holds the pending tasks; a new `TaskHeap` if None.
+        execute_batch (Callable[[list[Task]], None] | None): If given, called once with all the
+            tasks due together instead of `execute` per task, e.g. `run_tasks`.
+        clock (Clock | None): Source of the current time; the clock set with `clock.set_clock()` if None.
+    """
+
+    def __init__(self, execute: Callable[[Task], None] = run_task, executor: Executor | None = None,
+                 backend: TimerBackend | None = None,
+                 execute_batch: Callable[[list[Task]], None] | None = None, clock: Clock | None = None):
+        self.execute = execute
+        self.executor = executor
+        self.backend = backend if backend is not None else TaskHeap()
+        self.execute_batch = execute_batch
+        self.clock = clock if clock is not None else get_clock()
+        self.logger = get_logger()
+        self._tasks: dict[int, Task] = {}
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        # Time the worker sleeps until; adding an earlier task wakes it up.
+        self._wake_time = math.inf
+        self._thread: threading.Thread | None = None
+        self._running = False
+
+    def add_task(self, change_time: datetime | float, change_action: ChangeAction | str, device: Device) -> Task:
+        """
+        Schedules `change_action` ("on"/"off" in any case, or a `ChangeAction`) of `device` at `change_time`.
+
+        Args:
+            change_time (datetime | float): When to run the task, as a datetime or seconds since the epoch.
+
+        Returns:
+            Task: The scheduled task, e.g. to cancel it later.
+        """
+        if isinstance(change_action, str):
+            change_action = change_action.lower()
+        action = _ACTIONS.get(change_action) or ChangeAction(change_action)
+        task = Task(next(self._ids), _to_timestamp(change_time), action, device)
+        with self._condition:
+            self._tasks[task.task_id] = task
+            self.backend.push(task)
+            if task.change_time < self._wake_time:
+                self._condition.notify()
+        return task
+
+    def cancel(self, task: Task | int) -> bool:
+        """
+        Cancels a pending task, given as a `Task` or its `task_id`.
+
+        Returns:
+            bool: False if the task already ran or was cancelled.
+        """
+        task_id = task if isinstance(task, int) else task.task_id
+        with self._condition:
+            task = self._tasks.pop(task_id, None)
+            if task is None:
+                return False
+            task.cancelled = True
+            self.backend.remove(task)
+            return True
+
+    remove_task = cancel
+
+    def tasks(self) -> list[Task]:
+        """
+        Returns the pending tasks, the earliest first.
+        """
+        with self._condition:
+            return sorted(self._tasks.values(), key=lambda task: (task.change_time, task.task_id))
+
+    def show_tasks(self) -> None:
+        for task in self.tasks():
+            print(task)
+
+    def next_fire_time(self) -> float | None:
+        """
+        Returns when the earliest pending task is due, or None if there is none.
+
+        With a `TimingWheel` this is a tick time, which may come before the earliest task.
+        """
+        with self._condition:
+            return self.backend.next_time()
+
+    def _pop_due(self, now: float) -> list[Task]:
+        due = self.backend.pop_due(now)
+        tasks = self._tasks
+        for task in due:
+            del tasks[task.task_id]
+        return due
+
+    def check_tasks(self, now: datetime | float | None = None) -> int:
+        """
+        Runs every task due at `now` (the current time by default) on the calling thread.
+
+        Returns:
+            int: The number of tasks run.
+        """
+        with self._condition:
+            due = self._pop_due(self.clock.time() if now is None else _to_timestamp(now))
+        if due:
+            self._run(due)
+        return len(due)
+
+    def run_until(self, end: datetime | float) -> int:
+        """
+        Runs on the calling thread every task due until `end`, waiting on the clock for each
+        change time, and returns once the clock reaches `end`.
+
+        With a `SimulatedClock` the clock jumps from one change time to the next, e.g.
+        ``scheduler.run_until(clock.time() + 7 * 24 * 3600)`` simulates a week.
 
-class Scheduler(Task):
-    def __init__(self, change_time, change_action, device, tasks_list):
-        super().__init__(change_time, change_action, device)
+        Returns:
+            int: The number of tasks run.
+        """
+        end = _to_timestamp(end)
+        run = 0
+        while True:
+            next_time = self.next_fire_time()
+            if next_time is None or next_time > end:
+                break
+            self.clock.wait_until(next_time)
+            run += self.check_tasks()
+        self.clock.wait_until(end)
+        return run
 
-        self.tasks_list = tasks_list
+    def _run(self, due: list[Task]) -> None:
+        if self.execute_batch is not None:
+            try:
+                self.execute_batch(due)
+                count("scheduler_tasks_total", len(due), result="done")
+            except Exception:
+                count("scheduler_tasks_total", len(due), result="failed")
+                self.logger.exception(f"Batch of {len(due)} scheduled tasks failed.")
+            return
+        for task in due:
+            try:
+                self.execute(task)
+                count("scheduler_tasks_total", result="done")
+            except Exception:
+                count("scheduler_tasks_total", result="failed")
+                self.logger.exception(f"Scheduled task {task!r} failed.")
 
-    def add_task(self, change_time, change_action, device):
-        self.tasks_list.append(Task(change_time, change_action, device))
+    def _dispatch(self, due: list[Task]) -> None:
+        if self.executor is None:
+            self._run(due)
+        elif self.execute_batch is not None:
+            self.executor.submit(self._run, due)
+        else:
+            for task in due:
+                self.executor.submit(self._run, [task])
 
-    def remove_task(self, index):
-        del self.tasks_list[index]
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                now = self.clock.time()
+                due = self._pop_due(now)
+                if not due:
+                    next_time = self.backend.next_time()
+                    self._wake_time = math.inf if next_time is None else next_time
+                    self._condition.wait(None if next_time is None else next_time - now)
+                    continue
+            self._dispatch(due)
 
-    def show_tasks(self):
-        for task in self.tasks_list:
-            print(task.change_time, task.change_action, task.device)
+    def start(self) -> None:
+        """
+        Starts the worker thread running tasks when they are due.
+        """
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._work, name="scheduler", daemon=True)
+        self._thread.start()
 
-    def check_tasks(self, change_time, change_action, device):
-        for task in self.tasks_list:
-            if task.change_time < datetime.now():
-                change_action(device)
+    def stop(self) -> None:
+        """
+        Stops the worker thread; pending tasks stay scheduled.
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._wake_time = math.inf
 
+    def __len__(self) -> int:
+        return len(self._tasks)
@@ -0,0 +1,54 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "Devices"))
+from clock import SystemClock, set_clock
+from device_events import NullSink, ConsoleSink, set_default_sink
+from logging_config import configure_logging, stop_logging
+
+
+@pytest.fixture(autouse=True, scope="session")
+def quiet_output(tmp_path_factory):
+    """
+    Keeps device events off the console and the log out of the project's `logs/`.
+    """
+    set_default_sink(NullSink())
+    configure_logging(use_queue=False, log_dir=str(tmp_path_factory.mktemp("logs")))
+    yield
+    stop_logging()
+    set_default_sink(ConsoleSink())
+
+
+@pytest.fixture(autouse=True)
+def system_clock():
+    yield
+    set_clock(SystemClock())
+
+
+def make_device(device_id: str, device_type: str = "plug", location: str = "Kitchen", **status) -> dict:
+    return {
+        "device_id": device_id,
+        "name": f"Device {device_id}",
+        "type": device_type,
+        "location": location,
+        "status": {"power": "off", **status},
+        "connected": True,
+        "last_updated": "2025-01-01 00:00:00",
+    }
+
+
+@pytest.fixture
+def devices_file(tmp_path):
+    """
+    Path of a devices.json holding four plugs and a bulb.
+    """
+    path = tmp_path / "devices.json"
+    devices = [make_device(f"plug{number}", current_power_w=10.0 * number) for number in range(4)]
+    devices.append(make_device("bulb0", "bulb", "Living Room", brightness=80))
+    path.write_text(json.dumps({"devices": devices}, indent=4))
+    return str(path)
@@ -0,0 +1,107 @@
+import pytest
+
+from automation import AutomationEngine, AutomationRule, Trigger, ABOVE
+from clock import SimulatedClock
+from device_registry import DeviceRegistry
+
+BRIGHTNESS = "status.brightness"
+TURN_ON_PLUG = [{"device_id": "plug0", "set": {"status.power": "on"}}]
+
+
+@pytest.fixture
+def registry(devices_file):
+    return DeviceRegistry(devices_file)
+
+
+@pytest.fixture
+def clock():
+    return SimulatedClock(1_000_000.0)
+
+
+def make_engine(registry, clock, tmp_path, hysteresis=0.0, debounce=0.0) -> AutomationEngine:
+    engine = AutomationEngine(registry, clock, str(tmp_path / "automations.json"))
+    engine.add_rule(AutomationRule("bright", Trigger("bulb", BRIGHTNESS, ABOVE, 50, hysteresis), TURN_ON_PLUG, debounce))
+    return engine
+
+
+def set_brightness(registry, value) -> None:
+    registry.update("bulb0", {BRIGHTNESS: value})
+
+
+def test_rule_fires_once_until_rearmed(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path, hysteresis=10)
+
+    set_brightness(registry, 60)
+    set_brightness(registry, 70)
+    assert engine.run_pending() == 1
+    assert registry.get("plug0").get_path("status.power") == "on"
+
+    # Inside the hysteresis band: not re-armed yet.
+    set_brightness(registry, 45)
+    set_brightness(registry, 60)
+    assert engine.run_pending() == 0
+
+    set_brightness(registry, 39)
+    set_brightness(registry, 60)
+    assert engine.run_pending() == 1
+
+
+def test_other_fields_and_devices_are_ignored(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path)
+
+    registry.update("bulb0", {"status.color_temp": 90})
+    registry.update("plug1", {BRIGHTNESS: 90})
+
+    assert engine.run_pending() == 0
+
+
+def test_debounce_drops_firings_without_arming(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path, debounce=60)
+
+    set_brightness(registry, 60)
+    assert engine.run_pending() == 1
+    set_brightness(registry, 10)
+    clock.advance(30)
+    set_brightness(registry, 60)
+    assert engine.run_pending() == 0
+
+    # The debounced firing did not arm the trigger, so the next match fires.
+    clock.advance(40)
+    set_brightness(registry, 70)
+    assert engine.run_pending() == 1
+
+
+def test_firings_in_a_batch_wait_for_the_commit(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path)
+
+    with registry.batch():
+        set_brightness(registry, 60)
+        assert engine.run_pending() == 0
+
+    assert engine.run_pending() == 1
+
+
+def test_firings_in_a_rolled_back_batch_are_dropped(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path)
+
+    with pytest.raises(RuntimeError):
+        with registry.batch():
+            set_brightness(registry, 60)
+            raise RuntimeError("abort")
+
+    assert engine.run_pending() == 0
+    assert registry.get("plug0").get_path("status.power") == "off"
+    # The trigger is armed again, as before the batch.
+    set_brightness(registry, 60)
+    assert engine.run_pending() == 1
+
+
+def test_rules_survive_save_and_load(registry, clock, tmp_path):
+    engine = make_engine(registry, clock, tmp_path, hysteresis=5, debounce=30)
+    engine.save()
+    engine.close()
+
+    loaded = AutomationEngine(registry, clock, str(tmp_path / "automations.json"))
+    loaded.load()
+
+    assert [rule.to_json() for rule in loaded.rules()] == [rule.to_json() for rule in engine.rules()]
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from BulbNetwork import CHANGED, NOT_FOUND, UNCHANGED, BulbNetwork
+from bulb import Bulb
+from clock import SimulatedClock, set_clock
+from conftest import make_device
+from device_registry import DeviceRegistry
+
+
+@pytest.fixture
+def network(tmp_path):
+    """
+    Network of five bulbs: two on and one off in the kitchen, one on and one off in the hall,
+    plus a bulb that is not in the registry.
+    """
+    bulbs = [
+        make_device("k0", "bulb", "Kitchen", power="on"),
+        make_device("k1", "bulb", "Kitchen", power="on"),
+        make_device("k2", "bulb", "Kitchen"),
+        make_device("h0", "bulb", "Hall", power="ON"),
+        make_device("h1", "bulb", "Hall"),
+        make_device("plug0"),
+    ]
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps({"devices": bulbs}))
+    network = BulbNetwork(DeviceRegistry(str(path)))
+    network.load()
+    network.add(Bulb("ghost", "Bulb", network.registry))
+    return network
+
+
+def stored_power(network: BulbNetwork) -> dict:
+    fresh = DeviceRegistry(network.registry.storage.file_path)
+    return {record.device_id: record.get_path("status.power") for record in fresh.find(type="bulb")}
+
+
+def test_set_power_reports_every_bulb_and_commits_once(network):
+    set_clock(SimulatedClock(datetime(2026, 1, 1).timestamp()))
+
+    results = network.turn_all_on_off("ON")
+
+    assert results == {"k0": UNCHANGED, "k1": UNCHANGED, "k2": CHANGED, "h0": UNCHANGED, "h1": CHANGED,
+                       "ghost": NOT_FOUND}
+    assert network.registry.storage.journal.record_count == 1
+    assert stored_power(network) == {"k0": "on", "k1": "on", "k2": "ON", "h0": "ON", "h1": "ON"}
+    stamps = {network.registry.get(device_id).get_path("last_updated") for device_id in ("k2", "h1")}
+    assert stamps == {"2026-01-01 00:00:00"}
+
+
+def test_set_power_filters(network):
+    results = network.set_power("off", location="Kitchen", power="ON")
+
+    assert results == {"k0": CHANGED, "k1": CHANGED}
+    assert [bulb.device_id for bulb in network.select(location="Kitchen", power="on")] == []
+    assert [bulb.device_id for bulb in network.select(power="on")] == ["h0"]
+    with pytest.raises(ValueError):
+        network.set_power("dim")
+
+
+def test_set_power_changes_nothing_if_the_commit_fails(network, monkeypatch):
+    def fail(ops):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(network.registry.storage, "commit", fail)
+    with pytest.raises(OSError):
+        network.set_power("off")
+
+    assert network.registry.get("k0").get_path("status.power") == "on"
+    assert sorted(bulb.device_id for bulb in network.select(power="on")) == ["h0", "k0", "k1"]
+
+
+def test_fan_out_bounds_threads_and_returns_errors(network):
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def action(bulb):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.01)
+        with lock:
+            running -= 1
+        if bulb.device_id == "h1":
+            raise ConnectionError("no answer")
+        return bulb.device_id.upper()
+
+    results = network.fan_out(action, max_workers=2)
+
+    assert set(results) == {"k0", "k1", "k2", "h0", "h1", "ghost"}
+    assert isinstance(results.pop("h1"), ConnectionError)
+    assert results == {"k0": "K0", "k1": "K1", "k2": "K2", "h0": "H0", "ghost": "GHOST"}
+    assert peak == 2
+    assert network.fan_out(action, network.select(location="Kitchen")) == {"k0": "K0", "k1": "K1", "k2": "K2"}
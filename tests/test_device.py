@@ -0,0 +1,39 @@
+import pytest
+
+from bulb import Bulb
+from device_registry import DeviceRegistry
+from plug import Plug
+
+
+def power(registry: DeviceRegistry, device_id: str) -> str:
+    return registry.get(device_id).get_path("status.power")
+
+
+def test_transaction_uses_the_device_registry(devices_file):
+    registry = DeviceRegistry(devices_file)
+    bulb = Bulb("bulb0", "bulb", registry)
+    plug = Plug("plug0", "plug", registry)
+
+    with bulb.transaction():
+        bulb.turn_on_off("on")
+        plug.turn_on_off("on")
+        assert registry.in_batch
+
+    assert registry.storage.journal.record_count == 1
+    fresh = DeviceRegistry(devices_file)
+    assert power(fresh, "bulb0") == power(fresh, "plug0") == "on"
+
+
+def test_failed_transaction_is_rolled_back(devices_file):
+    registry = DeviceRegistry(devices_file)
+    bulb = Bulb("bulb0", "bulb", registry)
+    plug = Plug("plug0", "plug", registry)
+
+    with pytest.raises(RuntimeError):
+        with plug.transaction():
+            bulb.turn_on_off("on")
+            plug.turn_on_off("on")
+            raise RuntimeError("plug unreachable")
+
+    assert power(registry, "bulb0") == power(registry, "plug0") == "off"
+    assert registry.storage.journal.size() == 0
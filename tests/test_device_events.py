@@ -0,0 +1,36 @@
+import dataclasses
+import inspect
+
+import pytest
+
+import device_events
+from device_events import DeviceEvent, BufferSink
+
+
+def concrete_events() -> list[type[DeviceEvent]]:
+    return [cls for _, cls in inspect.getmembers(device_events, inspect.isclass)
+            if issubclass(cls, DeviceEvent) and not inspect.isabstract(cls)]
+
+
+def test_base_event_cannot_be_created():
+    with pytest.raises(TypeError):
+        DeviceEvent("plug0")
+
+
+@pytest.mark.parametrize("event_type", concrete_events(), ids=lambda cls: cls.__name__)
+def test_every_event_renders_a_message(event_type):
+    values = {field.name: "x" for field in dataclasses.fields(event_type)}
+    event = event_type(**{**values, "device_id": "plug0"})
+
+    assert isinstance(event.message(), str) and event.message()
+
+
+def test_buffer_sink_drops_oldest_events():
+    sink = BufferSink(max_events=2)
+    events = [device_events.Connecting("plug0"), device_events.Connected("plug0"), device_events.Disconnecting("plug0")]
+
+    for event in events:
+        sink.emit(event)
+
+    assert sink.clear() == events[1:]
+    assert not sink.events
@@ -0,0 +1,117 @@
+import json
+
+from clock import SimulatedClock, set_clock
+from device_journal import DeviceJournal
+from device_storage import JsonFileStorage
+
+
+def names(storage: JsonFileStorage) -> dict:
+    return {record.device_id: record.get_path('name') for record in storage.load()}
+
+
+def test_replay_returns_ops_in_order(devices_file):
+    journal = DeviceJournal(devices_file)
+    journal.append([["plug0", "name", "A"]])
+    journal.append([["plug0", "name", "B"], ["plug1", "status.power", "on"]])
+
+    ops = DeviceJournal(devices_file).replay()
+
+    assert ops == [["plug0", "name", "A"], ["plug0", "name", "B"], ["plug1", "status.power", "on"]]
+
+
+def test_replay_skips_torn_and_garbled_lines(devices_file):
+    journal = DeviceJournal(devices_file)
+    journal.append([["plug0", "name", "A"]])
+    with open(journal.path, 'a') as file:
+        file.write('{"ts":"2025-01-01 00:00:00","ops":[["plug1"')
+    # The next record starts on a line of its own, after the torn one.
+    journal.append([["plug1", "name", "B"]])
+    with open(journal.path, 'a') as file:
+        file.write("not json\n")
+    journal.append([["plug2", "name", "C"]])
+
+    reader = DeviceJournal(devices_file)
+    ops = reader.replay()
+
+    assert ops == [["plug0", "name", "A"], ["plug1", "name", "B"], ["plug2", "name", "C"]]
+    assert reader.record_count == 3
+
+
+def test_replay_leaves_unfinished_last_line_for_the_tail(devices_file):
+    journal = DeviceJournal(devices_file)
+    journal.append([["plug0", "name", "A"]])
+    line = json.dumps({"ts": "2025-01-01 00:00:00", "ops": [["plug1", "name", "B"]]}) + "\n"
+    with open(journal.path, 'a') as file:
+        file.write(line[:10])
+
+    reader = DeviceJournal(devices_file)
+    assert reader.replay() == [["plug0", "name", "A"]]
+    with open(journal.path, 'a') as file:
+        file.write(line[10:])
+    assert reader.replay_tail() == [["plug1", "name", "B"]]
+
+
+def test_append_uses_the_clock(devices_file):
+    set_clock(SimulatedClock(1_700_000_000.0))
+    journal = DeviceJournal(devices_file)
+    journal.append([["plug0", "name", "A"]])
+
+    with open(journal.path) as file:
+        record = json.loads(file.readline())
+    assert record["ts"] == SimulatedClock(1_700_000_000.0).now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_storage_applies_journal_on_load(devices_file):
+    JsonFileStorage(devices_file).commit([["plug0", "name", "Kettle"]])
+
+    assert names(JsonFileStorage(devices_file))["plug0"] == "Kettle"
+
+
+def test_compact_folds_journal_into_snapshot(devices_file):
+    storage = JsonFileStorage(devices_file)
+    storage.load()
+    storage.commit([["plug0", "name", "Kettle"]])
+    storage.commit([["plug1", "status.power", "on"]])
+
+    storage.compact()
+
+    with open(devices_file) as file:
+        devices = {device["device_id"]: device for device in json.load(file)["devices"]}
+    assert devices["plug0"]["name"] == "Kettle"
+    assert devices["plug1"]["status"]["power"] == "on"
+    assert storage.journal.size() == 0
+    assert not storage.changed()
+
+
+def test_compact_keeps_commits_of_other_processes(devices_file):
+    first = JsonFileStorage(devices_file)
+    second = JsonFileStorage(devices_file)
+    first.load()
+    second.load()
+
+    second.commit([["plug0", "name", "Renamed"]])
+    assert first.changed()
+    first.commit([["plug1", "name", "Toaster"]])
+    first.compact()
+
+    fresh = names(JsonFileStorage(devices_file))
+    assert fresh["plug0"] == "Renamed"
+    assert fresh["plug1"] == "Toaster"
+    assert second.changed()
+
+
+def test_compact_after_another_process_compacted(devices_file):
+    first = JsonFileStorage(devices_file)
+    second = JsonFileStorage(devices_file)
+    first.load()
+    second.load()
+
+    second.commit([["plug0", "name", "Renamed"]])
+    second.compact()
+    first.commit([["plug1", "name", "Toaster"]])
+    first.compact()
+
+    fresh = names(JsonFileStorage(devices_file))
+    assert fresh["plug0"] == "Renamed"
+    assert fresh["plug1"] == "Toaster"
+    assert first.changed()
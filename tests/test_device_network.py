@@ -0,0 +1,25 @@
+from device_network import DeviceNetwork
+from device_registry import DeviceRegistry
+
+
+def test_loaded_devices_use_the_network_registry(devices_file):
+    registry = DeviceRegistry(devices_file)
+    network = DeviceNetwork(registry)
+    network.load()
+
+    bulb = network.get("bulb0")
+
+    assert bulb.registry is registry
+    assert bulb.get_power() == "off"
+
+
+def test_find_follows_registry_changes(devices_file):
+    registry = DeviceRegistry(devices_file)
+    network = DeviceNetwork(registry)
+    network.load()
+
+    registry.update("plug1", {"status.power": "on", "location": "Garage"})
+
+    assert [device.device_id for device in network.find(type="plug", power="on")] == ["plug1"]
+    assert network.count(type="plug", location="Kitchen") == 3
+    assert sorted(network.locations()) == ["Garage", "Kitchen", "Living Room"]
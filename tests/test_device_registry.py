@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from bulb import Bulb
+from device_registry import DeviceRegistry
+from device_storage import JsonFileStorage
+
+
+def test_document_includes_journal_records(devices_file):
+    JsonFileStorage(devices_file).commit([["plug0", "name", "Kettle"]])
+
+    document = DeviceRegistry(devices_file).document()
+
+    assert document["devices"][0]["name"] == "Kettle"
+
+
+def test_document_is_a_private_copy(devices_file):
+    registry = DeviceRegistry(devices_file)
+    document = registry.document()
+    document["devices"][0]["name"] = "Changed"
+
+    assert registry.get("plug0").get_path("name") == "Device plug0"
+
+
+def test_replaced_document_is_not_undone_by_the_journal(devices_file):
+    registry = DeviceRegistry(devices_file)
+    registry.update("plug0", {"name": "Kettle"})
+    registry.save()
+    document = registry.document()
+    document["devices"][0]["name"] = "Toaster"
+    document["devices"].pop()
+
+    registry.replace_document(document)
+
+    fresh = DeviceRegistry(devices_file)
+    assert fresh.get("plug0").get_path("name") == "Toaster"
+    assert "bulb0" not in fresh
+    assert registry.get("plug0").get_path("name") == "Toaster"
+    with open(devices_file) as file:
+        assert len(json.load(file)["devices"]) == 4
+
+
+def test_batch_commits_once(devices_file):
+    registry = DeviceRegistry(devices_file)
+    with registry.batch():
+        registry.update("plug0", {"status.power": "on"})
+        registry.save()
+        with registry.batch():
+            registry.update("plug1", {"status.power": "on"})
+        assert registry.storage.journal.size() == 0
+
+    assert registry.storage.journal.record_count == 1
+    fresh = DeviceRegistry(devices_file)
+    assert [device.device_id for device in fresh.find(power="on")] == ["plug0", "plug1"]
+
+
+def test_failed_batch_is_rolled_back(devices_file):
+    registry = DeviceRegistry(devices_file)
+    outcomes = []
+    registry.subscribe_batches(outcomes.append)
+
+    with pytest.raises(RuntimeError):
+        with registry.batch():
+            registry.update("plug0", {"status.power": "on", "status.timer": 30})
+            raise RuntimeError("device unreachable")
+
+    plug = registry.get("plug0")
+    assert plug.get_path("status.power") == "off"
+    assert plug.get_path("status.timer") is None
+    assert registry.storage.journal.size() == 0
+    assert outcomes == [False]
+
+
+def test_batch_is_rolled_back_if_it_cannot_be_saved(devices_file, monkeypatch):
+    registry = DeviceRegistry(devices_file)
+
+    def fail(ops):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(registry.storage, "commit", fail)
+    with pytest.raises(OSError):
+        with registry.batch():
+            registry.update("plug0", {"status.power": "on"})
+
+    assert registry.get("plug0").get_path("status.power") == "off"
+    monkeypatch.undo()
+    registry.save()
+    assert registry.storage.journal.size() == 0
+
+
+def test_reads_pick_up_other_writers(devices_file):
+    reader = DeviceRegistry(devices_file, refresh_interval=0)
+    bulb = Bulb("bulb0", "bulb", reader)
+    assert bulb.get_name() == "Device bulb0"
+
+    writer = DeviceRegistry(devices_file)
+    writer.update("bulb0", {"name": "Hall Light"})
+    writer.save()
+
+    assert bulb.get_name() == "Hall Light"
+    assert [device.get_path("name") for device in reader.find(type="bulb")] == ["Hall Light"]
+
+
+def test_streamed_reads_pick_up_other_writers(devices_file):
+    reader = DeviceRegistry(JsonFileStorage(devices_file, stream_threshold=0), refresh_interval=0)
+    assert reader.get("plug1").get_path("status.power") == "off"
+
+    JsonFileStorage(devices_file).commit([["plug1", "status.power", "on"]])
+    reader.refresh_interval = 3600
+    # A streamed read in between must not hide the change from the next check.
+    reader.get("plug2")
+    reader.refresh_interval = 0
+
+    assert reader.get("plug1").get_path("status.power") == "on"
+
+
+def test_staged_changes_are_not_dropped_by_a_reload(devices_file):
+    reader = DeviceRegistry(devices_file, refresh_interval=0)
+    reader.update("plug0", {"name": "Kettle"})
+
+    JsonFileStorage(devices_file).commit([["plug1", "name", "Toaster"]])
+
+    assert reader.get("plug0").get_path("name") == "Kettle"
+    reader.save()
+    assert reader.get("plug1").get_path("name") == "Toaster"
+    assert reader.get("plug0").get_path("name") == "Kettle"
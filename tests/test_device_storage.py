@@ -0,0 +1,89 @@
+import pytest
+
+from device_storage import JsonFileStorage, SqliteStorage, open_storage
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, devices_file, tmp_path):
+    """
+    Each backend, holding the devices of `devices_file`.
+    """
+    if request.param == "json":
+        backend = JsonFileStorage(devices_file)
+    else:
+        backend = SqliteStorage(str(tmp_path / "devices.db"))
+        backend.import_records(JsonFileStorage(devices_file).load())
+    yield backend
+    backend.close()
+
+
+def reopen(backend):
+    return open_storage(backend.file_path if isinstance(backend, JsonFileStorage) else backend.db_path)
+
+
+def test_open_storage_picks_the_backend_by_suffix(tmp_path):
+    assert isinstance(open_storage(str(tmp_path / "devices.sqlite3")), SqliteStorage)
+    assert isinstance(open_storage(str(tmp_path / "devices.json")), JsonFileStorage)
+
+
+def test_lookups(storage):
+    assert [record.device_id for record in storage.load()] == ["plug0", "plug1", "plug2", "plug3", "bulb0"]
+    assert storage.get("bulb0").get_path("status.brightness") == 80
+    assert storage.get("missing") is None
+    assert [record.device_id for record in storage.find(type="bulb", location="Living Room")] == ["bulb0"]
+    with pytest.raises(ValueError):
+        storage.find(colour="red")
+
+
+def test_commits_are_persisted(storage):
+    storage.commit([["plug2", "status.power", "on"], ["plug2", "status.timer", 30], ["bulb0", "location", "Hall"]])
+
+    fresh = reopen(storage)
+    assert [record.device_id for record in fresh.find(power="on")] == ["plug2"]
+    assert fresh.get("plug2").get_path("status.timer") == 30
+    assert [record.device_id for record in fresh.find(location="Hall")] == ["bulb0"]
+    fresh.close()
+
+
+def test_replace_document(storage):
+    document = storage.document()
+    document["devices"] = [device for device in document["devices"] if device["type"] == "bulb"]
+
+    storage.replace_document(document)
+
+    fresh = reopen(storage)
+    assert [record.device_id for record in fresh.load()] == ["bulb0"]
+    fresh.close()
+
+
+def test_import_skips_stored_devices(devices_file, tmp_path):
+    backend = SqliteStorage(str(tmp_path / "devices.db"))
+    records = JsonFileStorage(devices_file).load()
+
+    assert backend.import_records(records) == 5
+    assert backend.import_records(records) == 0
+    backend.close()
+
+
+def test_replacing_a_subtree_updates_the_filter_columns(storage):
+    status = storage.get("plug0").to_json()["status"]
+    storage.commit([["plug0", "status", {**status, "power": "on"}], ["bulb0", "status.power", "on"]])
+
+    fresh = reopen(storage)
+    assert [record.device_id for record in fresh.find(power="on")] == ["plug0", "bulb0"]
+    assert [record.device_id for record in fresh.find(power="off")] == ["plug1", "plug2", "plug3"]
+    fresh.close()
+
+
+def test_changed_notices_other_writers(storage):
+    storage.load()
+    assert not storage.changed()
+
+    other = reopen(storage)
+    other.commit([["plug0", "name", "Kettle"]])
+    other.close()
+
+    assert storage.changed()
+    storage.reload()
+    assert storage.get("plug0").get_path("name") == "Kettle"
+    assert not storage.changed()
@@ -0,0 +1,29 @@
+import json
+
+from device_storage import JsonFileStorage
+from device_stream import find_device, iter_devices
+
+
+def test_small_chunks_read_the_same_devices(devices_file):
+    with open(devices_file) as file:
+        expected = json.load(file)["devices"]
+
+    assert list(iter_devices(devices_file, chunk_size=7)) == expected
+
+
+def test_other_keys_are_skipped(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text(json.dumps({"version": 2, "meta": {"devices": [1.5e3]}, "devices": [{"device_id": "a"}],
+                                "after": [1, 2]}))
+
+    assert list(iter_devices(str(path), chunk_size=3)) == [{"device_id": "a"}]
+    assert find_device(str(path), "a", chunk_size=3) == {"device_id": "a"}
+    assert find_device(str(path), "b") is None
+
+
+def test_streamed_storage_applies_the_journal(devices_file):
+    JsonFileStorage(devices_file).commit([["plug3", "status.power", "on"]])
+    storage = JsonFileStorage(devices_file, stream_threshold=0)
+
+    assert storage.get("plug3").get_path("status.power") == "on"
+    assert [record.get_path("status.power") for record in storage.iter_devices()] == ["off", "off", "off", "on", "off"]
@@ -0,0 +1,53 @@
+import pytest
+
+from device_registry import DeviceRegistry
+from energy import POWER_METRIC, UNASSIGNED, build_energy_report
+from telemetry import TelemetryStore
+
+START = 1_700_000_000.0
+HOUR = 3600
+TO_KWH = 1 / 3_600_000
+
+
+@pytest.fixture
+def report(tmp_path, devices_file):
+    store = TelemetryStore(str(tmp_path / "telemetry"))
+    # plug0: the reading 5 min before the start counts for the 10 min after it, the
+    # reading at +10 min until +25 min (the 15 min gap limit), the last one for 15 min.
+    store.append_many("plug0", POWER_METRIC, [START - 300, START + 600, START + 1800], [100.0, 200.0, 1000.0])
+    # plug1: the reading before the start ended (gap limit) before it; the one at +1 h is
+    # cut at 15 min; the reading at the end of the report is not in it.
+    store.append_many("plug1", POWER_METRIC, [START - 1000, START + HOUR, START + 2 * HOUR], [500.0, 50.0, 999.0])
+    store.flush()
+    return build_energy_report(START, START + 2 * HOUR, DeviceRegistry(devices_file), store, owners={"plug0": "Ala"})
+
+
+def test_energy_per_plug_and_hour(report):
+    plug0 = (100 * 600 + 200 * 900 + 1000 * 900) * TO_KWH
+    plug1 = 50 * 900 * TO_KWH
+
+    assert report.totals()["plug0"] == pytest.approx(plug0)
+    assert report.totals()["plug1"] == pytest.approx(plug1)
+    assert report.totals()["plug2"] == 0
+    assert report.hourly[0].tolist() == pytest.approx([plug0, 0])
+    assert report.hourly[1].tolist() == pytest.approx([0, plug1])
+
+
+def test_energy_by_location_and_owner(report):
+    by_location = report.by_location("hour")
+    by_owner = report.by_owner("day")
+
+    assert list(by_location.columns) == ["Kitchen"]
+    assert by_location["Kitchen"].sum() == pytest.approx(report.totals().sum())
+    assert by_owner.loc[:, "Ala"].sum() == pytest.approx(report.totals()["plug0"])
+    assert by_owner.loc[:, UNASSIGNED].sum() == pytest.approx(report.totals()["plug1"])
+
+
+def test_peak_window(report):
+    started, ended, kilowatts = report.peak_windows(window=15 * 60, count=1)[0]
+
+    # Energy goes to the minute of its reading: the 1000 W reading at +30 min held for 15 min
+    # makes 1 kW on average over any 15-minute window containing that minute.
+    assert started.timestamp() <= START + 1800 < ended.timestamp()
+    assert (ended - started).total_seconds() == 15 * 60
+    assert kilowatts == pytest.approx(1.0)
@@ -0,0 +1,43 @@
+import logging
+import os
+
+from logging_config import BatchingRotatingFileHandler, configure_logging
+
+
+def test_file_size_is_counted_in_bytes(tmp_path):
+    path = str(tmp_path / "app.log")
+    handler = BatchingRotatingFileHandler(path, max_bytes=0, batch_size=100)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for message in ("plain", "Łazienka – żarówka", "温度"):
+        handler.emit(logging.makeLogRecord({"msg": message}))
+    handler.flush()
+
+    assert handler._size == os.path.getsize(path)
+    handler.close()
+
+
+def test_rotates_before_exceeding_max_bytes(tmp_path):
+    path = str(tmp_path / "app.log")
+    handler = BatchingRotatingFileHandler(path, max_bytes=100, backup_count=2, batch_size=1)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    for _ in range(10):
+        handler.emit(logging.makeLogRecord({"msg": "ż" * 20}))
+    handler.close()
+
+    assert os.path.exists(path + ".1")
+    assert os.path.getsize(path) <= 100
+
+
+def test_caller_info_is_only_skipped_on_request(tmp_path):
+    srcfile, log_threads = logging._srcfile, logging.logThreads
+    try:
+        configure_logging(use_queue=False, log_dir=str(tmp_path))
+        assert (logging._srcfile, logging.logThreads) == (srcfile, log_threads)
+
+        configure_logging(use_queue=False, log_dir=str(tmp_path), skip_caller_info=True)
+        assert logging._srcfile is None and not logging.logThreads
+
+        configure_logging(use_queue=False, log_dir=str(tmp_path))
+        assert (logging._srcfile, logging.logThreads) == (srcfile, log_threads)
+    finally:
+        configure_logging(use_queue=False, log_dir=str(tmp_path))
@@ -0,0 +1,98 @@
+import pytest
+
+import metrics
+from metrics import Metrics, PrometheusFileExporter
+
+
+@pytest.fixture
+def recording():
+    """
+    The global metrics, enabled and empty for the duration of a test.
+    """
+    metrics.metrics.reset()
+    metrics.enable()
+    yield metrics.metrics
+    metrics.disable()
+    metrics.metrics.reset()
+
+
+def test_histogram_buckets_are_cumulative():
+    store = Metrics()
+    for seconds in (0.000005, 0.001, 0.003, 10.0):
+        store.observe("load_seconds", seconds, backend="json")
+
+    lines = store.to_prometheus().splitlines()
+
+    assert lines[0] == "# TYPE load_seconds histogram"
+    assert 'load_seconds_bucket{backend="json",le="1e-05"} 1' in lines
+    # A value on a bucket bound falls in that bucket.
+    assert 'load_seconds_bucket{backend="json",le="0.001"} 2' in lines
+    assert 'load_seconds_bucket{backend="json",le="0.0025"} 2' in lines
+    assert 'load_seconds_bucket{backend="json",le="0.005"} 3' in lines
+    assert 'load_seconds_bucket{backend="json",le="5.0"} 3' in lines
+    assert 'load_seconds_bucket{backend="json",le="+Inf"} 4' in lines
+    assert f'load_seconds_sum{{backend="json"}} {0.000005 + 0.001 + 0.003 + 10.0!r}' in lines
+    assert 'load_seconds_count{backend="json"} 4' in lines
+    histogram = store.snapshot()["histograms"]["load_seconds"]["backend=json"]
+    assert (histogram["count"], histogram["p50"], histogram["p99"]) == (4, 0.001, float("inf"))
+
+
+def test_exposition_text_renders_labels_and_help():
+    store = Metrics()
+    store.describe("tasks_total", "Tasks run, by result.")
+    store.count("tasks_total", result="ok", device="plug0")
+    store.count("tasks_total", 2, result="ok", device="plug0")
+    store.count("tasks_total", device='say "hi"\\\n')
+    store.add_collector(lambda: [("cache_hit_ratio", {"cache": "json"}, 0.75)])
+
+    assert store.to_prometheus() == (
+        "# HELP tasks_total Tasks run, by result.\n"
+        "# TYPE tasks_total counter\n"
+        'tasks_total{device="plug0",result="ok"} 3\n'
+        'tasks_total{device="say \\"hi\\"\\\\\\n"} 1\n'
+        "# TYPE cache_hit_ratio gauge\n"
+        'cache_hit_ratio{cache="json"} 0.75\n'
+    )
+
+
+def test_timed_records_calls_that_raise(recording):
+    @metrics.timed("operation_seconds", kind="test")
+    def fail():
+        raise RuntimeError("boom")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            fail()
+    with metrics.timer("operation_seconds", operation="block"):
+        pass
+
+    series = recording.snapshot()["histograms"]["operation_seconds"]
+    key = f"kind=test,operation={fail.__qualname__}"
+    assert series[key]["count"] == 2
+    assert series["operation=block"]["count"] == 1
+
+
+def test_nothing_is_recorded_while_disabled():
+    metrics.metrics.reset()
+
+    @metrics.timed("operation_seconds")
+    def succeed():
+        return 1
+
+    assert succeed() == 1
+    metrics.count("tasks_total")
+    with metrics.timer("operation_seconds"):
+        pass
+
+    assert metrics.metrics.snapshot()["histograms"] == {}
+    assert metrics.metrics.snapshot()["counters"] == {}
+
+
+def test_exporter_writes_the_exposition_text(tmp_path):
+    store = Metrics()
+    store.count("tasks_total")
+    path = tmp_path / "metrics.prom"
+
+    PrometheusFileExporter(str(path), source=store).write()
+
+    assert path.read_text() == store.to_prometheus()
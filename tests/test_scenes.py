@@ -0,0 +1,61 @@
+import pytest
+
+from device_registry import DeviceRegistry
+from scenes import Scene, SceneEngine, SceneNotFound
+
+EVENING = Scene("evening", [
+    {"type": "plug", "location": "Kitchen", "set": {"status.power": "on"}},
+    {"device_id": "plug0", "set": {"status.power": "off"}},
+    {"device_id": "bulb0", "set": {"status.power": "on", "status.brightness": 80}},
+    {"device_id": "missing", "set": {"status.power": "on"}},
+])
+
+
+@pytest.fixture
+def engine(devices_file, tmp_path):
+    return SceneEngine(DeviceRegistry(devices_file), str(tmp_path / "scenes.json"))
+
+
+def test_diff_holds_only_differing_values(engine):
+    assert engine.diff(EVENING) == {
+        "plug1": {"status.power": "on"},
+        "plug2": {"status.power": "on"},
+        "plug3": {"status.power": "on"},
+        "bulb0": {"status.power": "on"},
+    }
+
+
+def test_activate_commits_once(engine, devices_file):
+    changes = engine.activate(EVENING)
+
+    assert set(changes) == {"plug1", "plug2", "plug3", "bulb0"}
+    assert engine.registry.storage.journal.record_count == 1
+    fresh = DeviceRegistry(devices_file)
+    assert [device.device_id for device in fresh.find(power="on")] == ["plug1", "plug2", "plug3", "bulb0"]
+    stamps = {fresh.get(device_id).get_path("last_updated") for device_id in changes}
+    assert len(stamps) == 1
+    assert fresh.get("plug0").get_path("last_updated") == "2025-01-01 00:00:00"
+
+
+def test_activating_a_matching_scene_writes_nothing(engine):
+    engine.activate(EVENING)
+    size = engine.registry.storage.journal.size()
+
+    assert engine.activate(EVENING) == {}
+    assert engine.registry.storage.journal.size() == size
+
+
+def test_stored_scenes(engine):
+    scene = engine.capture("reading", ["bulb0", "missing"], ["status.brightness", "status.colour"])
+    engine.save_scene(scene)
+
+    assert engine.get("reading").to_json() == {"targets": [{"device_id": "bulb0", "set": {"status.brightness": 80}}]}
+    assert engine.delete_scene("reading")
+    assert not engine.delete_scene("reading")
+    with pytest.raises(SceneNotFound):
+        engine.activate("reading")
+
+
+def test_unknown_filters_are_rejected():
+    with pytest.raises(ValueError):
+        Scene("bad", [{"colour": "red", "set": {"status.power": "on"}}])
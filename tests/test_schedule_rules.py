@@ -0,0 +1,131 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from clock import SimulatedClock
+from device_network import DeviceNetwork
+from device_registry import DeviceRegistry
+from schedule_rules import (CronRecurrence, IntervalRecurrence, RecurringScheduler, WeekdayRecurrence,
+                            recurrence_from_json)
+
+# A Friday.
+FRIDAY = datetime(2026, 1, 9, 8, 0)
+
+
+def at(*args) -> float:
+    return datetime(*args).timestamp()
+
+
+def test_cron_skips_to_the_next_matching_day():
+    working_days = CronRecurrence("30 7 * * 1-5")
+
+    assert working_days.next_after(FRIDAY.timestamp()) == at(2026, 1, 12, 7, 30)
+    assert working_days.last_at_or_before(FRIDAY.timestamp()) == at(2026, 1, 9, 7, 30)
+    # Firings are strictly after the given moment.
+    assert working_days.next_after(at(2026, 1, 12, 7, 30)) == at(2026, 1, 13, 7, 30)
+
+
+def test_cron_day_of_month_or_weekday():
+    thirteenth_or_friday = CronRecurrence("0 0 13 * 5")
+
+    assert thirteenth_or_friday.next_after(at(2026, 1, 10)) == at(2026, 1, 13)
+    assert thirteenth_or_friday.next_after(at(2026, 1, 13)) == at(2026, 1, 16)
+
+
+def test_cron_rejects_bad_expressions():
+    with pytest.raises(ValueError):
+        CronRecurrence("0 24 * * *")
+    with pytest.raises(ValueError):
+        CronRecurrence("0 0 * *")
+    with pytest.raises(ValueError):
+        CronRecurrence("0 0 31 2 *").next_after(FRIDAY.timestamp())
+
+
+def test_weekday_rule_matches_its_cron_expression():
+    weekend = WeekdayRecurrence.from_names(["sat", "sun"], "09:00")
+    cron = CronRecurrence("0 9 * * 6,0")
+
+    moment = FRIDAY.timestamp()
+    for _ in range(5):
+        moment = weekend.next_after(moment)
+        assert moment == cron.next_after(moment - 1)
+        assert datetime.fromtimestamp(moment).weekday() in (5, 6)
+    assert recurrence_from_json(weekend.to_json()).to_json() == {"weekdays": 0b1100000, "at": "09:00"}
+
+
+def test_interval_rule():
+    every_hour = IntervalRecurrence(3600, at(2026, 1, 9))
+
+    assert every_hour.next_after(at(2026, 1, 8)) == at(2026, 1, 9)
+    assert every_hour.next_after(at(2026, 1, 9, 1, 30)) == at(2026, 1, 9, 2)
+    assert every_hour.last_at_or_before(at(2026, 1, 9, 2)) == at(2026, 1, 9, 2)
+    assert every_hour.last_at_or_before(at(2026, 1, 8)) is None
+
+
+def make_engine(devices_file, store_path, now: float) -> RecurringScheduler:
+    network = DeviceNetwork(DeviceRegistry(devices_file))
+    network.load()
+    return RecurringScheduler(network, store_path=store_path, clock=SimulatedClock(now))
+
+
+def power(engine: RecurringScheduler, device_id: str) -> str:
+    return engine.network.registry.get(device_id).get_path('status.power')
+
+
+def test_load_applies_only_the_last_missed_firing_per_device(devices_file, tmp_path):
+    store_path = str(tmp_path / "schedules.json")
+    rules = {
+        "on": {"device_id": "plug0", "action": "on", "cron": "0 8 * * *", "next_fire": at(2026, 1, 5, 8)},
+        "off": {"device_id": "plug0", "action": "off", "cron": "0 7 * * *", "next_fire": at(2026, 1, 5, 7)},
+        "later": {"device_id": "plug1", "action": "on", "cron": "0 10 * * *", "next_fire": at(2026, 1, 9, 10)},
+    }
+    with open(store_path, 'w') as file:
+        json.dump({"rules": rules}, file)
+
+    engine = make_engine(devices_file, store_path, FRIDAY.timestamp())
+    caught_up = engine.load()
+
+    assert {device_id: action.value for device_id, action in caught_up.items()} == {"plug0": "on"}
+    assert power(engine, "plug0") == "on"
+    assert power(engine, "plug1") == "off"
+    with open(store_path) as file:
+        stored = json.load(file)["rules"]
+    assert stored["on"]["next_fire"] == at(2026, 1, 10, 8)
+    assert stored["off"]["next_fire"] == at(2026, 1, 10, 7)
+    assert stored["later"]["next_fire"] == at(2026, 1, 9, 10)
+
+
+def test_run_until_fires_rules_and_stores_their_next_firing(devices_file, tmp_path):
+    store_path = str(tmp_path / "schedules.json")
+    engine = make_engine(devices_file, store_path, FRIDAY.timestamp())
+    engine.load()
+    rule = engine.add_rule("plug2", "on", WeekdayRecurrence.from_names(["mon"], "06:00"))
+
+    assert engine.run_until(at(2026, 1, 12, 12)) == 1
+
+    assert power(engine, "plug2") == "on"
+    with open(store_path) as file:
+        assert json.load(file)["rules"][rule.rule_id]["next_fire"] == at(2026, 1, 19, 6)
+
+
+def test_bulk_changes_are_written_once(devices_file, tmp_path, monkeypatch):
+    store_path = str(tmp_path / "schedules.json")
+    engine = make_engine(devices_file, store_path, FRIDAY.timestamp())
+    engine.load()
+    writes = []
+    save = engine._save
+    monkeypatch.setattr(engine, "_save", lambda: writes.append(save()))
+
+    rules = [engine.add_rule(f"plug{number % 4}", "on", IntervalRecurrence(3600 * (number + 1), at(2026, 1, 9)),
+                             save=False) for number in range(50)]
+    assert engine.remove_rule(rules[0].rule_id, save=False)
+    assert writes == []
+    engine.save()
+    engine.save()
+
+    assert len(writes) == 1
+    with open(store_path) as file:
+        stored = json.load(file)["rules"]
+    assert sorted(stored) == sorted(rule.rule_id for rule in rules[1:])
+    assert len(engine.scheduler) == 49
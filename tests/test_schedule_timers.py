@@ -0,0 +1,110 @@
+import math
+import random
+
+import pytest
+
+from clock import SimulatedClock
+from schedule_timers import ChangeAction, Scheduler, Task, TaskHeap, TimingWheel
+
+START = 1_767_225_600.0
+
+
+def make_tasks(times: list[float]) -> list[Task]:
+    return [Task(number, change_time, ChangeAction.TURN_ON, None) for number, change_time in enumerate(times, 1)]
+
+
+def test_heap_pops_due_tasks_in_time_order():
+    rng = random.Random(1)
+    tasks = make_tasks([START + rng.uniform(0, 3600) for _ in range(200)])
+    heap = TaskHeap()
+    for task in tasks:
+        heap.push(task)
+    for task in tasks[::3]:
+        task.cancelled = True
+        heap.remove(task)
+
+    fired = heap.pop_due(START + 1800) + heap.pop_due(START + 3600)
+
+    expected = sorted((task for task in tasks if not task.cancelled), key=lambda task: task.change_time)
+    assert fired == expected
+    assert heap.next_time() is None
+
+
+def test_scheduler_runs_tasks_at_their_time():
+    clock = SimulatedClock(START)
+    fired = []
+    scheduler = Scheduler(execute=lambda task: fired.append((task.device, clock.time())), clock=clock)
+    scheduler.add_task(START + 600, "on", "kettle")
+    scheduler.add_task(START + 60, ChangeAction.TURN_OFF, "lamp")
+    cancelled = scheduler.add_task(START + 120, "on", "heater")
+
+    assert scheduler.cancel(cancelled)
+    assert not scheduler.cancel(cancelled)
+    assert scheduler.next_fire_time() == START + 60
+    assert scheduler.run_until(START + 3600) == 2
+    assert fired == [("lamp", START + 60), ("kettle", START + 600)]
+    assert clock.time() == START + 3600
+    assert len(scheduler) == 0
+
+
+def test_power_states_are_case_insensitive():
+    scheduler = Scheduler(execute=lambda task: None, clock=SimulatedClock(START))
+
+    assert scheduler.add_task(START + 60, "ON", "lamp").change_action is ChangeAction.TURN_ON
+    assert scheduler.add_task(START + 60, "Off", "lamp").change_action is ChangeAction.TURN_OFF
+    with pytest.raises(ValueError):
+        scheduler.add_task(START + 60, "dim", "lamp")
+
+
+def test_tasks_due_together_run_as_one_batch():
+    batches = []
+    scheduler = Scheduler(execute_batch=batches.append, clock=SimulatedClock(START))
+    for device in ("a", "b", "c"):
+        scheduler.add_task(START + 60, "on", device)
+    scheduler.add_task(START + 120, "off", "a")
+
+    assert scheduler.check_tasks(START + 90) == 3
+
+    assert [[task.device for task in batch] for batch in batches] == [["a", "b", "c"]]
+
+
+def test_wheel_fires_like_the_heap_rounded_up_to_its_resolution():
+    rng = random.Random(2)
+    resolution = 60.0
+    # Small wheels, so tasks spread over every wheel and the overflow slot.
+    wheel = TimingWheel(resolution, slot_bits=3, levels=2, start=START)
+    heap = TaskHeap()
+    times = [START + rng.choice([rng.uniform(-120, 600), rng.uniform(0, 86400)]) for _ in range(500)]
+    times += [START + 8 * resolution, START + 64 * resolution]
+    tasks = make_tasks(times)
+    for task in tasks:
+        wheel.push(task)
+        heap.push(Task(task.task_id, math.ceil(task.change_time / resolution) * resolution, task.change_action, None))
+    for task in tasks[::5]:
+        task.cancelled = True
+        wheel.remove(task)
+    cancelled = {task.task_id for task in tasks if task.cancelled}
+
+    now = START
+    while now < START + 86400 + resolution:
+        now += rng.uniform(0, 40 * resolution)
+        fired = sorted(task.task_id for task in wheel.pop_due(now))
+        expected = sorted(task.task_id for task in heap.pop_due(now) if task.task_id not in cancelled)
+        assert fired == expected
+    assert len(wheel) == 0
+    assert wheel.next_time() is None
+
+
+def test_wheel_next_time_is_the_next_due_tick():
+    wheel = TimingWheel(60.0, slot_bits=3, levels=2, start=START)
+    far, near = make_tasks([START + 5000, START + 130])
+    wheel.push(far)
+    wheel.push(near)
+
+    assert wheel.next_time() <= START + 180
+    assert wheel.pop_due(START + 179) == []
+    assert wheel.pop_due(START + 180) == [near]
+    # Cascading times only bring the far task closer; it never fires early.
+    while (next_time := wheel.next_time()) < START + 5040:
+        assert wheel.pop_due(next_time) == []
+    assert wheel.pop_due(START + 5040) == [far]
@@ -0,0 +1,93 @@
+import json
+import sys
+import threading
+
+from device_registry import DeviceRegistry
+from device_storage import JsonFileStorage
+from plug import Plug
+from state_table import StateTable
+
+
+def test_values_written_through_are_shared(devices_file):
+    first = DeviceRegistry(devices_file)
+    second = DeviceRegistry(devices_file)
+    first.attach_state_table(StateTable.for_store(devices_file))
+    second.attach_state_table(StateTable.for_store(devices_file))
+    second.get("bulb0")
+
+    first.update("bulb0", {"status.brightness": 42})
+
+    assert second.state_table.read("bulb0", "status.brightness") == 42
+
+
+def test_slots_are_reseeded_on_reload(devices_file):
+    registry = DeviceRegistry(devices_file)
+    registry.attach_state_table(StateTable.for_store(devices_file))
+    plug = Plug("plug1", "plug", registry)
+    assert plug.get_field("status.power") == "off"
+
+    # Another process replaces the file without going through a state table.
+    with open(devices_file) as file:
+        document = json.load(file)
+    document["devices"][1]["status"]["power"] = "on"
+    JsonFileStorage(devices_file).replace_document(document)
+    assert registry.refresh()
+
+    assert plug.get_field("status.power") == "on"
+    assert registry.state_table.read("plug1", "status.power") == "on"
+
+
+def test_unstorable_values_fall_back_to_the_record(devices_file):
+    registry = DeviceRegistry(devices_file)
+    registry.attach_state_table(StateTable.for_store(devices_file))
+    plug = Plug("plug1", "plug", registry)
+
+    registry.update("plug1", {"status.power": "standby"})
+
+    assert plug.get_field("status.power") == "standby"
+
+
+def test_ints_and_floats_keep_their_type(devices_file):
+    registry = DeviceRegistry(devices_file)
+    registry.attach_state_table(StateTable.for_store(devices_file))
+    table = registry.state_table
+
+    registry.update("plug0", {"status.target_temperature_c": 22})
+    registry.update("plug1", {"status.target_temperature_c": 21.5})
+
+    value = table.read("plug0", "status.target_temperature_c")
+    assert value == 22 and isinstance(value, int)
+    assert table.read("plug1", "status.target_temperature_c") == 21.5
+    registry.update("plug0", {"status.target_temperature_c": 22.5})
+    assert table.read("plug0", "status.target_temperature_c") == 22.5
+
+
+def test_reads_race_growing_the_table(tmp_path):
+    errors = []
+    interval = sys.getswitchinterval()
+    # Switch threads as often as possible, so reads land while the table is remapped.
+    sys.setswitchinterval(1e-6)
+    try:
+        for round_number in range(20):
+            table = StateTable(str(tmp_path / f"devices{round_number}.json.state"), initial_capacity=1)
+            table.write("first", "status.brightness", 7)
+            done = threading.Event()
+
+            def read():
+                try:
+                    while not done.is_set():
+                        assert table.read("first", "status.brightness") == 7
+                except Exception as error:
+                    errors.append(error)
+
+            thread = threading.Thread(target=read)
+            thread.start()
+            for number in range(2048):
+                table.add(f"device{number}")
+            done.set()
+            thread.join()
+            table.close()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert errors == []
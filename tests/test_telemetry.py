@@ -0,0 +1,118 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+import device_registry
+import telemetry
+from clock import SimulatedClock
+from device_registry import DeviceRegistry
+from telemetry import TelemetryStore, get_telemetry, start_recording
+
+DAY = 24 * 3600
+
+
+def test_range_covers_buffered_and_flushed_readings(tmp_path):
+    store = TelemetryStore(str(tmp_path), segment_size=4)
+    for moment in range(10):
+        store.append("plug0", "current_power_w", float(moment), moment * 10.0)
+    store.append("plug0", "current_power_w", 10.5, 1.0)
+
+    times, values = store.range("plug0", "current_power_w", 3, 8)
+    assert times.tolist() == [3, 4, 5, 6, 7]
+    assert values.tolist() == [30, 40, 50, 60, 70]
+
+    store.flush()
+    reopened = TelemetryStore(str(tmp_path), segment_size=4)
+    times, values = reopened.range("plug0", "current_power_w")
+    assert times.tolist() == [*range(10), 10.5]
+    assert reopened.devices() == ["plug0"]
+    assert reopened.metrics("plug0") == ["current_power_w"]
+
+
+def test_flush_merges_small_writes_into_one_segment(tmp_path):
+    store = TelemetryStore(str(tmp_path), segment_size=100)
+    for moment in range(5):
+        store.append("plug0", "current_power_w", float(moment), 1.0)
+        store.flush()
+
+    segments = os.listdir(tmp_path / "plug0" / "current_power_w")
+    assert len(segments) == 1
+    assert len(store.range("plug0", "current_power_w")[0]) == 5
+
+
+def test_out_of_order_readings_come_back_sorted(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.append_many("plug0", "current_power_w", [5.0, 1.0, 3.0], [50.0, 10.0, 30.0])
+    store.flush()
+
+    times, values = store.range("plug0", "current_power_w")
+    assert times.tolist() == [1, 3, 5]
+    assert values.tolist() == [10, 30, 50]
+
+
+def test_retention_drops_old_readings(tmp_path):
+    store = TelemetryStore(str(tmp_path), segment_size=10, retention=2 * DAY)
+    times = np.arange(0, 5 * DAY, 3600.0)
+    store.append_many("plug0", "current_power_w", times, np.ones_like(times))
+    store.flush()
+
+    assert store.apply_retention(now=5 * DAY) > 0
+
+    kept = TelemetryStore(str(tmp_path)).range("plug0", "current_power_w")[0]
+    assert kept[0] == 3 * DAY
+    assert len(kept) == 2 * 24
+
+
+def test_registry_changes_are_recorded(tmp_path, devices_file):
+    registry = DeviceRegistry(devices_file)
+    store = TelemetryStore(str(tmp_path / "telemetry"), clock=SimulatedClock(1000.0))
+    store.record_changes(registry)
+
+    registry.update("plug1", {"status.energy_consumption.current_power_w": 60.5})
+    registry.update("plug1", {"status.power": "on"})
+    store.close()
+
+    times, values = store.range("plug1", "current_power_w")
+    assert times.tolist() == [1000.0]
+    assert values.tolist() == [60.5]
+
+
+def test_recording_starts_at_startup_not_at_the_first_read(tmp_path, devices_file, monkeypatch):
+    devices_dir = tmp_path / "Devices"
+    devices_dir.mkdir()
+    monkeypatch.chdir(devices_dir)
+    monkeypatch.setattr(telemetry, "_stores", {})
+    monkeypatch.setattr(device_registry, "_registries", {})
+
+    started = start_recording()
+    assert start_recording() is started
+    registry = device_registry.get_registry()
+    registry.update("plug2", {"status.energy_consumption.current_power_w": 7.0})
+    registry.update("plug2", {"status.energy_consumption.current_power_w": 9.0})
+
+    store = get_telemetry()
+    assert store is started
+    assert store.range("plug2", "current_power_w")[1].tolist() == [7.0, 9.0]
+    store.close()
+
+
+def test_reading_does_not_start_recording(tmp_path, devices_file, monkeypatch):
+    devices_dir = tmp_path / "Devices"
+    devices_dir.mkdir()
+    monkeypatch.chdir(devices_dir)
+    monkeypatch.setattr(telemetry, "_stores", {})
+    monkeypatch.setattr(device_registry, "_registries", {})
+
+    store = get_telemetry()
+    device_registry.get_registry().update("plug2", {"status.energy_consumption.current_power_w": 7.0})
+
+    assert store.range("plug2", "current_power_w")[1].tolist() == []
+
+
+def test_devices_do_not_import_numpy():
+    code = "import sys, device; print('numpy' in sys.modules)"
+    devices_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Devices")
+    result = subprocess.run([sys.executable, "-c", code], cwd=devices_dir, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
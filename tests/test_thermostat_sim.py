@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from device_registry import DeviceRegistry
+from thermostat_sim import (
+    ThermostatFleet, OnOffControl, PidControl, HEATER_KW, HEATING_RATE_C_H, TIME_CONSTANT_H,
+)
+
+START = 1_700_000_000.0
+OUTDOOR = 5.0
+TARGET = 21.0
+# Heater output that holds the target: the heat loss at the target equals the heating.
+HOLDING_OUTPUT = (TARGET - OUTDOOR) / (HEATING_RATE_C_H * TIME_CONSTANT_H)
+
+
+def make_fleet(count: int = 3, temperature: float = 15.0) -> ThermostatFleet:
+    return ThermostatFleet([f"t{number}" for number in range(count)], temperature, TARGET)
+
+
+def test_unheated_rooms_follow_the_thermal_model():
+    fleet = ThermostatFleet(["t0"], 20.0, TARGET, enabled=False)
+
+    result = fleet.simulate(TIME_CONSTANT_H, outdoor=OUTDOOR, start=START)
+
+    expected = OUTDOOR + (20.0 - OUTDOOR) * math.exp(-1)
+    assert fleet.temperature[0] == pytest.approx(expected)
+    assert result.energy_kwh[0] == 0
+
+
+@pytest.mark.parametrize("controller, tolerance", [(OnOffControl(0.5), 0.6), (PidControl(), 0.05)],
+                         ids=["on/off", "pid"])
+def test_fleet_settles_at_the_target(controller, tolerance):
+    fleet = make_fleet()
+
+    result = fleet.simulate(48, controller, outdoor=OUTDOOR, start=START)
+
+    assert np.all(np.abs(fleet.temperature - TARGET) <= tolerance)
+    assert np.all(result.reached_after_s < 6 * 3600)
+    # Over the last day the heaters deliver just the heat the rooms lose.
+    last_day = result.demand_kw[-24 * 60:].mean()
+    assert last_day == pytest.approx(len(fleet) * HOLDING_OUTPUT * HEATER_KW, rel=0.05)
+
+
+def test_targets_per_step_and_samples():
+    fleet = make_fleet(2, temperature=TARGET)
+    steps = 120
+    targets = np.full((steps, 1), TARGET)
+    targets[60:] = TARGET - 3
+
+    result = fleet.simulate(2, PidControl(), outdoor=OUTDOOR, start=START, targets=targets, sample_every=30)
+
+    assert result.temperatures.shape == (4, 2)
+    assert result.sample_times.tolist() == [START + 60 * number for number in (0, 30, 60, 90)]
+    # No heating once the target drops, so the rooms cool down.
+    assert np.all(fleet.temperature < TARGET)
+    assert result.demand_kw[-1] == 0
+
+
+def test_simulation_needs_at_least_one_step():
+    with pytest.raises(ValueError):
+        make_fleet().simulate(0)
+
+
+def test_write_back_stores_temperatures_in_one_commit(tmp_path):
+    path = tmp_path / "devices.json"
+    path.write_text('{"devices": [{"device_id": "t0", "type": "thermostat", "location": "Hall", '
+                    '"status": {"power": "on", "target_temperature_c": 20, "current_temperature_c": 18}}]}')
+    registry = DeviceRegistry(str(path))
+    fleet = ThermostatFleet.from_registry(registry)
+    fleet.simulate(1, outdoor=OUTDOOR, start=START)
+
+    assert fleet.write_back(registry) == 1
+    stored = DeviceRegistry(str(path)).get("t0").get_path("status.current_temperature_c")
+    assert stored == round(float(fleet.temperature[0]), 1)
+    assert registry.storage.journal.record_count == 1
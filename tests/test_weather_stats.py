@@ -0,0 +1,112 @@
+import json
+
+import numpy as np
+import pytest
+
+from device_registry import DeviceRegistry
+from telemetry import TelemetryStore
+from weather_stats import (FLAG_OUT_OF_RANGE, FLAG_OUTLIER, FLAG_SPIKE, METRICS, WeatherStatsProcessor,
+                           rolling_stats)
+from conftest import make_device
+
+WINDOW = 12
+
+
+def readings(steps: int = 60, seed: int = 0) -> np.ndarray:
+    """
+    Random walks of every metric for three stations, (steps x stations x metrics), with a
+    spike, an outlier and an impossible value in them.
+    """
+    rng = np.random.default_rng(seed)
+    base = np.array([15.0, 60.0, 1010.0, 10.0, 1.0])
+    values = base + np.cumsum(rng.normal(0, 0.3, (steps, 3, len(METRICS))), axis=0)
+    values[20, 0, 0] += 12.0
+    values[30, 1, 2] += 4.0
+    values[40, 2, 1] = 140.0
+    return values
+
+
+def test_streaming_stats_match_rolling_stats():
+    values = readings()
+    processor = WeatherStatsProcessor(WINDOW, ["a", "b", "c"])
+    streams = processor.streams(["a", "b", "c"])
+    flags = np.array([processor.update(streams, step.ravel()) for step in values])
+    snapshot = processor.snapshot()
+
+    for row in range(3):
+        for column, metric in enumerate(METRICS):
+            expected = rolling_stats(values[:, row, column], WINDOW, metric)
+            assert flags[:, row * len(METRICS) + column].tolist() == expected["flags"].tolist()
+            for key in ("mean", "std", "min", "max"):
+                assert snapshot[key][row, column] == pytest.approx(expected[key][-1])
+    assert flags[20, 0] == FLAG_SPIKE | FLAG_OUTLIER
+    assert flags[30, 1 * len(METRICS) + 2] & FLAG_OUTLIER
+    assert flags[40, 2 * len(METRICS) + 1] & FLAG_OUT_OF_RANGE
+
+
+def test_every_step_matches_rolling_stats():
+    series = readings()[:40, 0, 0]
+    processor = WeatherStatsProcessor(WINDOW)
+    stream = processor.streams(["a"], "temperature_c")
+    expected = rolling_stats(series, WINDOW, "temperature_c")
+
+    for step, value in enumerate(series):
+        processor.update(stream, [value])
+        stats = processor.station("a")["temperature_c"]
+        assert stats["count"] == min(step + 1, WINDOW)
+        for key in ("mean", "std", "min", "max"):
+            assert stats[key] == pytest.approx(expected[key][step])
+
+
+def test_backfill_replays_stored_readings(tmp_path):
+    values = readings()[:30]
+    store = TelemetryStore(str(tmp_path))
+    for step in range(len(values)):
+        for row, station_id in enumerate(["a", "b"]):
+            # Station b missed its first ten readings.
+            if station_id == "b" and step < 10:
+                continue
+            for column, metric in enumerate(METRICS):
+                store.append(station_id, metric, float(step), values[step, row, column])
+
+    live = WeatherStatsProcessor(WINDOW, ["a", "b"])
+    for step in range(len(values)):
+        for row, station_id in enumerate(["a", "b"]):
+            if station_id != "b" or step >= 10:
+                live.update(live.streams([station_id]), values[step, row])
+    rebuilt = WeatherStatsProcessor(WINDOW, ["a", "b"])
+
+    assert rebuilt.backfill(store) == (WINDOW * len(METRICS)) * 2
+    for key in ("mean", "std", "min", "max", "last"):
+        np.testing.assert_allclose(rebuilt.snapshot()[key], live.snapshot()[key])
+
+
+def test_registry_changes_are_processed(tmp_path):
+    path = tmp_path / "devices.json"
+    station = make_device("ws0", "weather_station", "Garden", temperature_c=10.0, humidity_percent=50.0)
+    path.write_text(json.dumps({"devices": [station]}))
+    registry = DeviceRegistry(str(path))
+    processor = WeatherStatsProcessor(WINDOW)
+    processor.record_changes(registry)
+
+    registry.update("ws0", {"status.temperature_c": 11.0})
+    registry.update("ws0", {"status": {**registry.get("ws0").get_path("status"), "temperature_c": 30.0}})
+    processor.close()
+    registry.update("ws0", {"status.temperature_c": 12.0})
+
+    stats = processor.station("ws0")
+    assert stats["temperature_c"]["count"] == 2
+    assert stats["temperature_c"]["last"] == 30.0
+    assert stats["temperature_c"]["flags"] == FLAG_SPIKE
+    assert stats["humidity_percent"]["count"] == 1
+
+
+def test_short_windows_still_flag_outliers():
+    series = [10.0, 10.2, 9.9, 10.1, 10.0, 10.1, 14.0]
+    processor = WeatherStatsProcessor(window=5)
+    stream = processor.streams(["a"], "temperature_c")
+
+    flags = [processor.update(stream, [value])[0] for value in series]
+
+    assert flags[-1] == FLAG_OUTLIER
+    assert flags == rolling_stats(series, 5, "temperature_c")["flags"].tolist()
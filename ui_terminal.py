@@ -1,18 +1,21 @@
 import json
 import os
+import sys
 from typing import Dict, Any
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Devices"))
+from device_registry import get_registry
+
+DEVICES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "devices.json")
+
 
 def save_devices(devices: Dict[str, Any]) -> None:
-    file_path = os.path.join(os.path.dirname(__file__), "devices.json")
-    with open(file_path, "w") as file:
-        json.dump(devices, file, indent=4)
+    get_registry(DEVICES_PATH).replace_document(devices)
 
 
 def load_devices() -> Dict[str, Any]:
     try:
-        with open(os.path.join(os.path.dirname(__file__), "devices.json"), "r") as file:
-            return json.load(file)
+        return get_registry(DEVICES_PATH).document()
     except FileNotFoundError:
         print("File not found.")
         return {"devices": []}
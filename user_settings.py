@@ -1,4 +1,10 @@
 import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "Devices"))
+from json_cache import load_json_cached
+from device_registry import get_registry
 
 FILE_PATH_USERS = "../users.json"
 FILE_PATH_DEVICES = "../devices.json"
@@ -10,10 +16,8 @@ class UserSettings:
         self.controlled_devices_ids = controlled_devices_ids
 
     def load_json_user_file(self):
-        # Opening users file
-        with open(FILE_PATH_USERS, 'r') as file:
-            data = json.load(file)
-            return data
+        # Opening users file (parsed again only when the file changes)
+        return load_json_cached(FILE_PATH_USERS, copy=True)
 
     def save_json_user_file(self, data) -> None:
         # Saving users file.
@@ -21,15 +25,12 @@ class UserSettings:
             json.dump(data, file, indent=4)
 
     def load_json_devices_file(self):
-        # Opening devices file
-        with open(FILE_PATH_DEVICES, 'r') as file:
-            data = json.load(file)
-            return data
+        # Opening devices file through the registry, so changes still in its journal are included
+        return get_registry(FILE_PATH_DEVICES).document()
 
     def save_json_devices_file(self, data) -> None:
-        # Saving devices file
-        with open(FILE_PATH_DEVICES, 'w') as file:
-            json.dump(data, file, indent=4)
+        # Saving devices file; replaces the journal too, so replaying it cannot undo the save
+        get_registry(FILE_PATH_DEVICES).replace_document(data)
 
     def get_users_list(self):
         users = self.load_json_user_file()